@@ -0,0 +1,97 @@
+import random
+from itertools import count
+from pathlib import Path
+from typing import Any, Dict, List
+
+from spec_course.benchmarks.common import latency_results, measure, throughput_result
+from spec_course.database.db import (
+    create_database,
+    get_model_id,
+    get_sd_setup_id,
+    insert_dataset,
+    insert_load_test_performance,
+    insert_load_test_server_metrics,
+    insert_model,
+    insert_quantization,
+    insert_sd_performance,
+    insert_sd_request_acceptance,
+    insert_sd_setup,
+)
+
+
+def bench_db(
+    work_dir: Path,
+    num_models: int = 1000,
+    num_calls: int = 200,
+    num_bulk_rows: int = 100_000,
+    repeat: int = 3,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Latency of single-row inserts and lookups of `db.py` on a database that
+    already holds `num_models` models, and throughput of its bulk inserts.
+    """
+    rng = random.Random(seed)
+    db_name = str(work_dir / "db_bench.db")
+    create_database(db_name)
+    for i in range(num_models):
+        insert_model(db_name, f"model_{i}")
+    quantization_id = insert_quantization(db_name, "FP16")
+    dataset_id = insert_dataset(db_name, "chat")
+    sd_setup_id = insert_sd_setup(db_name, 1, quantization_id, 2, quantization_id, 1)
+    new_models = count(num_models)
+
+    calls = {
+        "insert_model": lambda: insert_model(db_name, f"model_{next(new_models)}"),
+        "get_model_id": lambda: get_model_id(
+            db_name, f"model_{rng.randrange(num_models)}"
+        ),
+        "get_sd_setup_id": lambda: get_sd_setup_id(
+            db_name, 1, quantization_id, 2, quantization_id, dataset_id
+        ),
+        "insert_sd_performance": lambda: insert_sd_performance(
+            db_name, sd_setup_id, 2.5, "2025-01-01 00:00:00", 10.0, [0.5] * 5
+        ),
+        "insert_load_test_performance": lambda: insert_load_test_performance(
+            db_name, sd_setup_id, 8, 1000.0, 3, "2025-01-01_00:00:00"
+        ),
+    }
+    results = []
+    for name, call in calls.items():
+        times = measure(call, repeat=num_calls, warmup=10)
+        results.extend(latency_results(f"db.{name}", times, num_models=num_models))
+
+    sd_performance_id = insert_sd_performance(
+        db_name, sd_setup_id, 2.5, "2025-01-01 00:00:00", 10.0, [0.5] * 5
+    )
+    ld_performance_id = insert_load_test_performance(
+        db_name, sd_setup_id, 8, 1000.0, 3, "2025-01-01_00:00:00"
+    )
+    bulk_inserts = {
+        "insert_sd_request_acceptance": lambda: insert_sd_request_acceptance(
+            db_name,
+            sd_performance_id,
+            (
+                {"prompt_index": i, "num_steps": 100, "mean_acceptance_length": 2.5}
+                for i in range(num_bulk_rows)
+            ),
+        ),
+        "insert_load_test_server_metrics": lambda: insert_load_test_server_metrics(
+            db_name,
+            ld_performance_id,
+            (
+                {
+                    "offset_s": i * 0.1,
+                    "replica": 0,
+                    "source": "prometheus",
+                    "metric_name": "running",
+                    "value": 1.0,
+                }
+                for i in range(num_bulk_rows)
+            ),
+        ),
+    }
+    for name, call in bulk_inserts.items():
+        times = measure(call, repeat=repeat, warmup=0)
+        results.append(throughput_result(f"db.{name}", times, num_bulk_rows, "rows/s"))
+    return results
@@ -0,0 +1,60 @@
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from spec_course.benchmarks.common import throughput_result
+from spec_course.database.db import create_database
+from spec_course.database.run import get_etl_class_and_file_pattern, process_files
+from spec_course.scripts.synthetic_results import generate_archive
+
+# ETL class -> folder of the synthetic archive it ingests
+ETL_DATA_DIRS = {
+    "accuracy": "gsm8k",
+    "sd_metrics": "sd_experiments",
+    "load_test_metrics": "load_test",
+}
+
+
+def bench_etl(
+    work_dir: Path,
+    num_files: int,
+    repeat: int = 3,
+    seed: int = 0,
+    num_prompts: int = 100,
+    raw_output: bool = False,
+) -> List[Dict[str, Any]]:
+    """Files per second that `process_files` ingests into a new database"""
+    # Every processed file is logged at info level, which is not what is measured
+    logging.getLogger("etl_process").setLevel(logging.WARNING)
+    generate_archive(
+        work_dir,
+        seed,
+        num_accuracy=num_files,
+        num_sd=num_files,
+        num_load_tests=num_files,
+        num_prompts=num_prompts,
+        raw_output=raw_output,
+        server_metrics=True,
+    )
+    results = []
+    for etl_name, data_dir in ETL_DATA_DIRS.items():
+        etl_class, file_pattern = get_etl_class_and_file_pattern(etl_name)
+        times = []
+        for run in range(repeat):
+            db_name = str(work_dir / f"{etl_name}_{run}.db")
+            create_database(db_name)
+            start = time.perf_counter()
+            process_files(etl_class, work_dir / data_dir, db_name, file_pattern)
+            times.append(time.perf_counter() - start)
+        results.append(
+            throughput_result(
+                f"etl.{etl_name}",
+                times,
+                num_files,
+                "files/s",
+                num_prompts=num_prompts,
+                raw_output=raw_output,
+            )
+        )
+    return results
@@ -0,0 +1,122 @@
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from spec_course.benchmarks.common import benchmark_result
+from spec_course.database.etl.load_test_metrics import (
+    get_achieved_rps,
+    is_saturated_run,
+)
+
+STUB_PORT = 8200
+RATES = [50, 100, 200, 400, 800]
+STARTUP_TIMEOUT = 10
+
+
+def _wait_for_port(port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_load_client(
+    endpoint_url: str, rps: int, duration: str, results_dir: Path
+) -> Dict[str, Any]:
+    """Run scripts/load_test.py at a constant rate and read its k6 summary"""
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "spec_course.scripts.load_test",
+            "--model-name",
+            "stub",
+            "--endpoint-url",
+            endpoint_url,
+            "--rps",
+            str(rps),
+            "--duration",
+            duration,
+            "--input-tokens-distribution",
+            "100,10",
+            "--output-tokens-distribution",
+            "16,2",
+            "--max-vus",
+            str(max(500, rps * 2)),
+            "--results-dir",
+            str(results_dir),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    with open(results_dir / "metrics.json", "r") as f:
+        return json.load(f).get("metrics", {})
+
+
+def bench_load_client(
+    work_dir: Path, rates: List[int] = RATES, duration: str = "10s"
+) -> List[Dict[str, Any]]:
+    """
+    Highest constant request rate the k6 load test client sustains against a
+    zero-latency stub server, i.e. the overhead ceiling of the load generator.
+    """
+    missing = [tool for tool in ["k6", "node"] if shutil.which(tool) is None]
+    if missing:
+        return [
+            benchmark_result(
+                "load_client.sustained_rps",
+                None,
+                "req/s",
+                True,
+                skipped=f"not installed: {', '.join(missing)}",
+            )
+        ]
+
+    stub = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "spec_course.scripts.stub_server",
+            "--port",
+            str(STUB_PORT),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    sustained_rps = 0.0
+    achieved = []
+    try:
+        if not _wait_for_port(STUB_PORT, STARTUP_TIMEOUT):
+            raise RuntimeError(f"Stub server did not start on port {STUB_PORT}")
+        for rps in rates:
+            metrics = run_load_client(
+                f"http://127.0.0.1:{STUB_PORT}", rps, duration, work_dir / f"rps_{rps}"
+            )
+            achieved_rps = get_achieved_rps(metrics.get("iterations", {}), duration)
+            achieved.append(achieved_rps)
+            dropped = metrics.get("dropped_iterations", {}).get("count", 0)
+            if is_saturated_run(rps, achieved_rps, dropped):
+                break
+            sustained_rps = rps
+    finally:
+        stub.terminate()
+        stub.wait()
+    return [
+        benchmark_result(
+            "load_client.sustained_rps",
+            sustained_rps,
+            "req/s",
+            True,
+            achieved,
+            rates=rates[: len(achieved)],
+            duration=duration,
+        )
+    ]
@@ -0,0 +1,342 @@
+import random
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from spec_course.benchmarks.common import latency_results, measure
+from spec_course.database.db import connect, create_database
+from spec_course.database.migrate import migrate_database
+from spec_course.database.queries import (
+    fetch_rows,
+    get_latency_vs_rps,
+    get_prompt_acceptance_drop,
+    get_saturation_points,
+    get_sd_speed_comparison,
+    get_server_metric_series,
+    get_throughput_latency_curve,
+)
+
+NUM_MODELS = 20
+QUANTIZATIONS = ["FP16", "FP8", "W8A8", "W4A16"]
+DATASETS = ["chat", "code", "math"]
+SERVER_METRICS = ["running", "waiting", "gpu_cache_usage", "draft_acceptance_rate"]
+BATCH_SIZE = 10_000
+
+# Queries of notebook.ipynb, run through the same connection pandas uses
+NOTEBOOK_QUERIES = {
+    "gsm8k_scores": """
+    SELECT m.model_name, q.quantization_type, a.gsm8k_score, a.date
+    FROM accuracy a
+    JOIN models m ON a.model_id = m.model_id
+    JOIN quantizations q ON a.quantization_id = q.quantization_id
+    ORDER BY m.model_name, q.quantization_type
+    """,
+    "sd_metrics": """
+    SELECT
+        sp.date,
+        tm.model_name as target_model,
+        tq.quantization_type as target_quantization,
+        dm.model_name as draft_model,
+        dq.quantization_type as draft_quantization,
+        d.dataset_type,
+        sp.mean_acceptance_length,
+        sp.time_taken,
+        sp.rate_at_1position,
+        sp.rate_at_2position,
+        sp.rate_at_3position,
+        sp.rate_at_4position,
+        sp.rate_at_5position
+    FROM sd_performances sp
+    JOIN sd_setups ss ON sp.sd_setup_id = ss.sd_setup_id
+    JOIN models tm ON ss.target_model_id = tm.model_id
+    JOIN quantizations tq ON ss.target_quantization_id = tq.quantization_id
+    JOIN models dm ON ss.draft_model_id = dm.model_id
+    JOIN quantizations dq ON ss.draft_quantization_id = dq.quantization_id
+    JOIN datasets d ON ss.dataset_id = d.dataset_id
+    ORDER BY sp.date DESC
+    """,
+    "lt_performances": """
+    SELECT
+        ld.end_to_end_latency,
+        ld.rps,
+        ld.num_spec_tokens,
+        ld.sd_setup_id,
+        tm.model_name AS target_model_name,
+        tq.quantization_type AS target_quantization_type,
+        dm.model_name AS draft_model_name,
+        dq.quantization_type AS draft_quantization_type
+    FROM ld_performances ld
+    JOIN sd_setups ss ON ld.sd_setup_id = ss.sd_setup_id
+    JOIN models tm ON ss.target_model_id = tm.model_id
+    JOIN quantizations tq ON ss.target_quantization_id = tq.quantization_id
+    JOIN models dm ON ss.draft_model_id = dm.model_id
+    JOIN quantizations dq ON ss.draft_quantization_id = dq.quantization_id
+    """,
+}
+
+
+def _insert_rows(
+    conn: Any, table: str, columns: List[str], rows: Iterator[Tuple]
+) -> None:
+    query = f"""INSERT INTO {table} ({", ".join(columns)})
+        VALUES ({", ".join(["?"] * len(columns))})"""
+    while batch := list(islice(rows, BATCH_SIZE)):
+        conn.executemany(query, batch)
+
+
+def populate_database(
+    db_name: str,
+    num_setups: int,
+    runs_per_setup: int,
+    requests_per_run: int,
+    metric_rows_per_run: int,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """
+    Fill a new database with random runs directly, bypassing the ETL so that
+    large databases are built quickly. Returns the number of rows per table.
+    """
+    rng = random.Random(seed)
+    create_database(db_name)
+    num_runs = num_setups * runs_per_setup
+    conn = connect(db_name)
+    try:
+        _insert_rows(
+            conn,
+            "models",
+            ["model_name"],
+            ((f"draft_{i}" if i % 2 else f"target_{i}",) for i in range(NUM_MODELS)),
+        )
+        _insert_rows(
+            conn, "quantizations", ["quantization_type"], ((q,) for q in QUANTIZATIONS)
+        )
+        _insert_rows(conn, "datasets", ["dataset_type"], ((d,) for d in DATASETS))
+        _insert_rows(
+            conn,
+            "sd_setups",
+            [
+                "target_model_id",
+                "target_quantization_id",
+                "draft_model_id",
+                "draft_quantization_id",
+                "dataset_id",
+            ],
+            # Every draft comes in all quantizations, as in a quantization sweep
+            (
+                (
+                    target_id,
+                    target_quantization_id,
+                    draft_id,
+                    quantization_id,
+                    dataset_id,
+                )
+                for _ in range(0, num_setups, len(QUANTIZATIONS))
+                for target_id, target_quantization_id, draft_id, dataset_id in [
+                    (
+                        rng.randrange(1, NUM_MODELS + 1, 2),
+                        rng.randint(1, len(QUANTIZATIONS)),
+                        rng.randrange(2, NUM_MODELS + 1, 2),
+                        rng.randint(1, len(DATASETS)),
+                    )
+                ]
+                for quantization_id in range(1, len(QUANTIZATIONS) + 1)
+            ),
+        )
+        _insert_rows(
+            conn,
+            "accuracy",
+            ["model_id", "quantization_id", "gsm8k_score", "date"],
+            (
+                (
+                    rng.randint(1, NUM_MODELS),
+                    rng.randint(1, len(QUANTIZATIONS)),
+                    rng.random(),
+                    f"2025-{rng.randint(1, 12):02d}-01 00:00:00",
+                )
+                for _ in range(num_runs)
+            ),
+        )
+        _insert_rows(
+            conn,
+            "sd_performances",
+            [
+                "sd_setup_id",
+                "date",
+                "mean_acceptance_length",
+                "time_taken",
+                "rate_at_1position",
+                "rate_at_2position",
+                "rate_at_3position",
+                "rate_at_4position",
+                "rate_at_5position",
+                "num_repetitions",
+                "time_std",
+                "time_min",
+                "tokens_per_second",
+                "tokens_per_second_std",
+                "tokens_per_second_min",
+            ],
+            (
+                (
+                    run % num_setups + 1,
+                    f"2025-{rng.randint(1, 12):02d}-01 00:00:00",
+                    rng.uniform(1, 6),
+                    rng.uniform(10, 100),
+                    *sorted((rng.random() for _ in range(5)), reverse=True),
+                    3,
+                    rng.random(),
+                    rng.uniform(10, 100),
+                    rng.uniform(50, 500),
+                    rng.random(),
+                    rng.uniform(50, 500),
+                )
+                for run in range(num_runs)
+            ),
+        )
+        _insert_rows(
+            conn,
+            "sd_request_acceptance",
+            [
+                "sd_performance_id",
+                "prompt_index",
+                "num_steps",
+                "mean_acceptance_length",
+            ],
+            (
+                (run + 1, prompt, rng.randint(10, 500), rng.uniform(1, 6))
+                for run in range(num_runs)
+                for prompt in range(requests_per_run)
+            ),
+        )
+        _insert_rows(
+            conn,
+            "ld_performances",
+            [
+                "sd_setup_id",
+                "rps",
+                "end_to_end_latency",
+                "latency_p90",
+                "latency_p95",
+                "achieved_rps",
+                "failed_rate",
+                "is_saturated",
+                "concurrency",
+                "num_spec_tokens",
+                "date",
+            ],
+            (
+                (
+                    run % num_setups + 1,
+                    rps,
+                    rng.uniform(500, 5000),
+                    rng.uniform(500, 5000),
+                    rng.uniform(500, 5000),
+                    rps * rng.uniform(0.8, 1.0),
+                    0.0,
+                    rps > 16,
+                    rng.choice([1, 2, 4, 8, 16]) if run % 2 else None,
+                    rng.randint(0, 5),
+                    "2025-01-01_00:00:00",
+                )
+                for run in range(num_runs)
+                for rps in [rng.randint(1, 32)]
+            ),
+        )
+        _insert_rows(
+            conn,
+            "ld_server_metrics",
+            [
+                "ld_performance_id",
+                "offset_s",
+                "replica",
+                "source",
+                "metric_name",
+                "value",
+            ],
+            (
+                (
+                    run + 1,
+                    row // len(SERVER_METRICS) * 5.0,
+                    0,
+                    "prometheus",
+                    SERVER_METRICS[row % len(SERVER_METRICS)],
+                    rng.random(),
+                )
+                for run in range(num_runs)
+                for row in range(metric_rows_per_run)
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return {
+        "setups": num_setups,
+        "runs": num_runs,
+        "request_rows": num_runs * requests_per_run,
+        "server_metric_rows": num_runs * metric_rows_per_run,
+    }
+
+
+def bench_queries(
+    work_dir: Path,
+    num_setups: int = 500,
+    runs_per_setup: int = 20,
+    requests_per_run: int = 100,
+    metric_rows_per_run: int = 100,
+    repeat: int = 5,
+    seed: int = 0,
+    engines: List[str] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Latency of the notebook and `queries.py` analytics on a large database.
+    The DuckDB database is a migrated copy of the SQLite one.
+    """
+    sqlite_db_name = str(work_dir / "queries_bench.db")
+    sizes = populate_database(
+        sqlite_db_name,
+        num_setups,
+        runs_per_setup,
+        requests_per_run,
+        metric_rows_per_run,
+        seed,
+    )
+    results = []
+    for engine in engines or ["sqlite"]:
+        if engine == "sqlite":
+            db_name, prefix = sqlite_db_name, "queries"
+        elif engine == "duckdb":
+            db_name, prefix = str(work_dir / "queries_bench.duckdb"), "queries.duckdb"
+            Path(db_name).unlink(missing_ok=True)
+            migrate_database(sqlite_db_name, db_name)
+        else:
+            raise ValueError(f"Unknown engine: {engine}. Available: sqlite, duckdb")
+        results.extend(bench_database_queries(db_name, prefix, sizes, repeat))
+    return results
+
+
+def bench_database_queries(
+    db_name: str, prefix: str, sizes: Dict[str, int], repeat: int
+) -> List[Dict[str, Any]]:
+    queries: Dict[str, Callable[[], Any]] = {
+        f"notebook.{name}": (lambda query=query: fetch_rows(db_name, query))
+        for name, query in NOTEBOOK_QUERIES.items()
+    }
+    queries.update(
+        {
+            "get_latency_vs_rps": lambda: get_latency_vs_rps(db_name),
+            "get_saturation_points": lambda: get_saturation_points(db_name),
+            "get_throughput_latency_curve": lambda: get_throughput_latency_curve(
+                db_name
+            ),
+            "get_server_metric_series": lambda: get_server_metric_series(db_name, 1),
+            "get_prompt_acceptance_drop": lambda: get_prompt_acceptance_drop(
+                db_name, "draft_1", "W4A16"
+            ),
+            "get_sd_speed_comparison": lambda: get_sd_speed_comparison(db_name),
+        }
+    )
+    results = []
+    for name, query in queries.items():
+        times = measure(query, repeat=repeat)
+        results.extend(latency_results(f"{prefix}.{name}", times, **sizes))
+    return results
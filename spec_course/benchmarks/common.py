@@ -0,0 +1,140 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# Relative change of a benchmark value that is reported as a regression
+REGRESSION_THRESHOLD = 0.1
+
+
+def measure(
+    function: Callable[[], Any], repeat: int = 5, warmup: int = 1
+) -> List[float]:
+    """Wall time of every call of the function in seconds, after warm-up calls"""
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile, q in [0, 100]"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def benchmark_result(
+    name: str,
+    value: float,
+    unit: str,
+    higher_is_better: bool,
+    samples: List[float] | None = None,
+    **params: Any,
+) -> Dict[str, Any]:
+    """A single benchmark value with its unit, raw samples and parameters"""
+    return {
+        "name": name,
+        "value": value,
+        "unit": unit,
+        "higher_is_better": higher_is_better,
+        "samples": samples or [],
+        "params": params,
+    }
+
+
+def throughput_result(
+    name: str, times: List[float], num_items: int, unit: str, **params: Any
+) -> Dict[str, Any]:
+    """Items per second of the median run"""
+    rates = [num_items / t for t in times]
+    return benchmark_result(
+        name, statistics.median(rates), unit, True, rates, num_items=num_items, **params
+    )
+
+
+def latency_results(name: str, times: List[float], **params: Any) -> List[Dict]:
+    """Median and p95 latency in milliseconds"""
+    millis = [t * 1000 for t in times]
+    return [
+        benchmark_result(
+            f"{name}.p50", statistics.median(millis), "ms", False, **params
+        ),
+        benchmark_result(f"{name}.p95", percentile(millis, 95), "ms", False, **params),
+    ]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info() -> Dict[str, Any]:
+    """Where and when the benchmarks ran, so results of different commits can be told apart"""
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def save_results(results: Dict[str, Any], output_path: Path) -> None:
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+def load_results(results_path: Path | str) -> Dict[str, Any]:
+    with open(results_path, "r") as f:
+        return json.load(f)
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = REGRESSION_THRESHOLD,
+) -> List[Dict[str, Any]]:
+    """
+    Relative change of every benchmark present in both result files. A change
+    is a regression when the value got worse by more than the threshold.
+    """
+    baseline_values = {
+        result["name"]: result["value"] for result in baseline["benchmarks"]
+    }
+    comparison = []
+    for result in current["benchmarks"]:
+        old = baseline_values.get(result["name"])
+        if old is None or result["value"] is None or not old:
+            continue
+        change = (result["value"] - old) / old
+        worse = -change if result["higher_is_better"] else change
+        comparison.append(
+            {
+                "name": result["name"],
+                "unit": result["unit"],
+                "baseline": old,
+                "current": result["value"],
+                "change": change,
+                "regression": worse > threshold,
+            }
+        )
+    return comparison
@@ -0,0 +1,153 @@
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+from spec_course.benchmarks.bench_db import bench_db
+from spec_course.benchmarks.bench_etl import bench_etl
+from spec_course.benchmarks.bench_load_client import bench_load_client
+from spec_course.benchmarks.bench_queries import bench_queries
+from spec_course.benchmarks.common import (
+    REGRESSION_THRESHOLD,
+    compare_results,
+    environment_info,
+    load_results,
+    save_results,
+)
+
+SUITES = ["etl", "db", "queries", "load_client"]
+
+
+def run_suites(args: argparse.Namespace, work_dir: Path):
+    suites = {
+        "etl": lambda: bench_etl(
+            work_dir / "etl",
+            args.num_files,
+            args.repeat,
+            args.seed,
+            raw_output=args.raw_output,
+        ),
+        "db": lambda: bench_db(work_dir, repeat=args.repeat, seed=args.seed),
+        "queries": lambda: bench_queries(
+            work_dir,
+            num_setups=args.num_setups,
+            runs_per_setup=args.runs_per_setup,
+            repeat=args.repeat,
+            seed=args.seed,
+            engines=args.query_engines.split(","),
+        ),
+        "load_client": lambda: bench_load_client(
+            work_dir / "load_client", duration=args.load_duration
+        ),
+    }
+    results = []
+    for suite in args.suites.split(","):
+        if suite not in suites:
+            raise ValueError(f"Unknown suite: {suite}. Available: {SUITES}")
+        print(f"Running {suite} benchmarks")
+        results.extend(suites[suite]())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ETL, database, analytics and load client on CPU"
+    )
+    parser.add_argument(
+        "--suites",
+        type=str,
+        default=",".join(SUITES),
+        help=f"Comma-separated benchmark suites from {SUITES}",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="benchmark_results.json",
+        help="JSON file for the results",
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="Results JSON of another commit to compare against",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Relative worsening reported as a regression by --compare",
+    )
+    parser.add_argument(
+        "--num_files", type=int, default=1000, help="Result files per ETL class"
+    )
+    parser.add_argument(
+        "--raw_output",
+        action="store_true",
+        help="Include per-request k6 samples in the synthetic load tests",
+    )
+    parser.add_argument(
+        "--num_setups",
+        type=int,
+        default=500,
+        help="Setups in the synthetic analytics database",
+    )
+    parser.add_argument(
+        "--runs_per_setup",
+        type=int,
+        default=20,
+        help="Runs per setup in the synthetic analytics database",
+    )
+    parser.add_argument(
+        "--query_engines",
+        type=str,
+        default="sqlite",
+        help="Comma-separated databases of the analytics benchmark (sqlite,duckdb)",
+    )
+    parser.add_argument(
+        "--load_duration",
+        type=str,
+        default="10s",
+        help="Duration of every load client rate step",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of synthetic data")
+    parser.add_argument(
+        "--work_dir",
+        type=str,
+        default=None,
+        help="Folder for synthetic data (defaults to a temporary folder)",
+    )
+
+    args = parser.parse_args()
+    if args.work_dir:
+        work_dir = Path(args.work_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        benchmarks = run_suites(args, work_dir)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            benchmarks = run_suites(args, Path(temp_dir))
+
+    results = {**environment_info(), "args": vars(args), "benchmarks": benchmarks}
+    save_results(results, Path(args.output))
+    for result in benchmarks:
+        value = "skipped" if result["value"] is None else f"{result['value']:.3f}"
+        print(f"{result['name']:<50} {value:>14} {result['unit']}")
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        comparison = compare_results(
+            load_results(args.compare), results, args.threshold
+        )
+        for row in comparison:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['name']:<50} {row['baseline']:>12.3f} -> "
+                f"{row['current']:>12.3f} {row['unit']:<8} "
+                f"{row['change']:+8.1%} {flag}"
+            )
+        if any(row["regression"] for row in comparison):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import importlib
+import sys
+from typing import List
+
+# Subcommand -> module with a `main(argv)` and its description. Modules are
+# imported only when their subcommand runs, so that torch, vLLM and
+# llmcompressor are not loaded by commands that do not need them
+COMMANDS = {
+    "quantize": (
+        "spec_course.scripts.quantize",
+        "Quantize models with llmcompressor recipes",
+    ),
+    "eval": (
+        "spec_course.scripts.evaluate_accuracy",
+        "Evaluate model accuracy with lm-eval",
+    ),
+    "sd": ("spec_course.scripts.run_sd", "Run offline speculative decoding setups"),
+    "replay": (
+        "spec_course.scripts.drafter_replay",
+        "Replay n-gram drafters on the saved tokens of SD runs on CPU",
+    ),
+    "load-test": (
+        "spec_course.scripts.run_load_test",
+        "Load test vLLM servers over a sweep of request rates or concurrency",
+    ),
+    "ingest": ("spec_course.database.run", "Ingest result files into the database"),
+    "analyze": ("spec_course.database.analyze", "Run analytics queries on results"),
+    "migrate": (
+        "spec_course.database.migrate",
+        "Copy a SQLite database into a new DuckDB database",
+    ),
+    "check": (
+        "spec_course.database.check",
+        "Check the latest runs against their history for regressions",
+    ),
+}
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="spec-course",
+        description="Speculative decoding experiments. "
+        "Run `spec-course <command> --help` for the options of a command; "
+        "every command but analyze and check accepts --dry-run to validate and expand "
+        "its config without running anything.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, description) in COMMANDS.items():
+        subparsers.add_parser(name, help=description, add_help=False)
+    args, command_argv = parser.parse_known_args(argv)
+
+    # The usage of the command parser is then shown as `spec-course <command>`
+    sys.argv[0] = f"{parser.prog} {args.command}"
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.main(command_argv)
+
+
+if __name__ == "__main__":
+    main()
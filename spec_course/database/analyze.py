@@ -0,0 +1,152 @@
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from spec_course.database.db import create_database, db_path
+from spec_course.database.queries import (
+    LATENCY_COLUMNS,
+    get_latency_vs_rps,
+    get_prompt_acceptance_drop,
+    get_saturation_points,
+    get_sd_speed_comparison,
+    get_server_metric_series,
+    get_throughput_latency_curve,
+)
+
+QUERIES = [
+    "latency_vs_rps",
+    "saturation_points",
+    "throughput_latency_curve",
+    "server_metric_series",
+    "prompt_acceptance_drop",
+    "sd_speed_comparison",
+]
+
+
+def run_query(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Run the analytics query selected on the command line"""
+    if args.query == "latency_vs_rps":
+        return get_latency_vs_rps(
+            args.db_name, args.percentile, not args.exclude_saturated
+        )
+    if args.query == "saturation_points":
+        return get_saturation_points(args.db_name)
+    if args.query == "throughput_latency_curve":
+        return get_throughput_latency_curve(args.db_name, args.percentile)
+    if args.query == "server_metric_series":
+        if args.ld_performance_id is None:
+            raise ValueError("--ld_performance_id is required for server_metric_series")
+        metric_names = args.metric_names.split(",") if args.metric_names else None
+        return get_server_metric_series(
+            args.db_name, args.ld_performance_id, metric_names
+        )
+    if args.query == "prompt_acceptance_drop":
+        if not args.draft_model or not args.quantization:
+            raise ValueError(
+                "--draft_model and --quantization are required for prompt_acceptance_drop"
+            )
+        return get_prompt_acceptance_drop(
+            args.db_name,
+            args.draft_model,
+            args.quantization,
+            args.baseline_quantization,
+            args.limit,
+        )
+    return get_sd_speed_comparison(args.db_name)
+
+
+def write_rows(rows: List[Dict[str, Any]], output: str | None) -> None:
+    """Write rows as CSV or JSON (by file extension), or as CSV to stdout"""
+    if output and Path(output).suffix == ".json":
+        with open(output, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+    if not rows:
+        return
+    f = open(output, "w", newline="") if output else sys.stdout
+    try:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if output:
+            f.close()
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Run analytics queries on results")
+    parser.add_argument(
+        "--db_name",
+        type=str,
+        required=True,
+        help="SQLite database name, a .duckdb file or duckdb:// URI selects DuckDB",
+    )
+    parser.add_argument(
+        "--query", type=str, required=True, choices=QUERIES, help="Query to run"
+    )
+    parser.add_argument(
+        "--percentile",
+        type=str,
+        choices=list(LATENCY_COLUMNS),
+        default="p90",
+        help="Latency percentile of the load test curves",
+    )
+    parser.add_argument(
+        "--exclude_saturated",
+        action="store_true",
+        help="Drop saturated runs from latency_vs_rps",
+    )
+    parser.add_argument(
+        "--ld_performance_id",
+        type=int,
+        default=None,
+        help="Load test run of server_metric_series",
+    )
+    parser.add_argument(
+        "--metric_names",
+        type=str,
+        default=None,
+        help="Comma-separated server metrics of server_metric_series (default: all)",
+    )
+    parser.add_argument(
+        "--draft_model", type=str, default=None, help="Draft model of the drop query"
+    )
+    parser.add_argument(
+        "--quantization",
+        type=str,
+        default=None,
+        help="Draft quantization compared to the baseline in the drop query",
+    )
+    parser.add_argument(
+        "--baseline_quantization",
+        type=str,
+        default="FP16",
+        help="Baseline draft quantization of the drop query",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=20, help="Number of prompts in the drop query"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="CSV or JSON file for the rows (default: CSV to stdout)",
+    )
+    args = parser.parse_args(argv)
+
+    if not Path(db_path(args.db_name)).exists():
+        parser.error(f"Database does not exist: {args.db_name}")
+    # The queries read columns that databases of older runs may lack
+    create_database(args.db_name)
+    try:
+        rows = run_query(args)
+    except ValueError as e:
+        parser.error(str(e))
+    write_rows(rows, args.output)
+
+
+if __name__ == "__main__":
+    main()
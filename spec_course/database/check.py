@@ -0,0 +1,302 @@
+import argparse
+import json
+import math
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from spec_course.database.db import create_database, db_path
+from spec_course.database.queries import (
+    get_ld_bucket_samples,
+    get_ld_run_history,
+    get_sd_request_samples,
+    get_sd_run_history,
+)
+
+# Checked metric -> whether higher is better
+SD_METRICS = {"tokens_per_second": True, "mean_acceptance_length": True}
+LD_METRICS = {"achieved_rps": True, "latency_avg": False, "latency_p90": False}
+# Metrics tested on per-request samples: the acceptance length of every prompt
+# and the mean latency of every load test request bucket. Bucket means do not
+# follow the tail, so p90 latency is tested on the p90 of the previous runs.
+SD_SAMPLE_METRIC = "mean_acceptance_length"
+LD_SAMPLE_METRIC = "latency_avg"
+# Columns that identify a setup, besides its names
+SD_GROUP_COLUMNS = [
+    "sd_setup_id",
+    "num_spec_tokens",
+    "backend",
+    "sampling",
+    "num_prompts",
+]
+LD_GROUP_COLUMNS = ["sd_setup_id", "num_spec_tokens", "rps", "concurrency"]
+
+TOLERANCE = 0.05
+ALPHA = 0.05
+BASELINE_RUNS = 5
+MIN_BASELINE_RUNS = 2
+BOOTSTRAP_SAMPLES = 10_000
+
+
+def average_ranks(values: np.ndarray) -> np.ndarray:
+    """Ranks from 1, tied values getting the mean of their ranks"""
+    order = np.argsort(values, kind="mergesort")
+    sorted_values = values[order]
+    ranks = np.empty(len(values))
+    start = 0
+    for end in range(1, len(values) + 1):
+        if end == len(values) or sorted_values[end] != sorted_values[start]:
+            ranks[order[start:end]] = (start + end + 1) / 2
+            start = end
+    return ranks
+
+
+def mann_whitney_p_value(
+    baseline: List[float], current: List[float], higher_is_better: bool
+) -> float:
+    """
+    One-sided Mann-Whitney U test that the current samples are worse than the
+    baseline samples, with the normal approximation corrected for ties
+    """
+    n1, n2 = len(current), len(baseline)
+    values = np.array(current + baseline, dtype=float)
+    ranks = average_ranks(values)
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    _, tie_counts = np.unique(values, return_counts=True)
+    n = n1 + n2
+    tie_term = (tie_counts**3 - tie_counts).sum() / (n * (n - 1))
+    variance = n1 * n2 / 12 * (n + 1 - tie_term)
+    if variance <= 0:
+        return 1.0
+    # Worse means lower current values when higher is better
+    z = (u - n1 * n2 / 2) / math.sqrt(variance)
+    if higher_is_better:
+        z = -z
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def bootstrap_p_value(
+    baseline: List[float],
+    current: float,
+    higher_is_better: bool,
+    num_samples: int,
+    rng: np.random.Generator,
+) -> float:
+    """
+    Probability that a run drawn from the baseline is as bad as the current
+    one. Baseline runs are resampled with Gaussian noise of the Silverman
+    bandwidth, so that a handful of runs still gives a smooth tail.
+    """
+    values = np.array(baseline, dtype=float)
+    bandwidth = 1.06 * values.std(ddof=1) * len(values) ** -0.2
+    samples = rng.choice(values, size=num_samples) + rng.normal(
+        0, bandwidth, num_samples
+    )
+    worse = samples <= current if higher_is_better else samples >= current
+    return float(worse.mean())
+
+
+def group_runs(
+    rows: List[Dict[str, Any]], group_columns: List[str]
+) -> Dict[Tuple, List[Dict[str, Any]]]:
+    """Runs of every setup, newest first"""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(row[column] for column in group_columns)].append(row)
+    for runs in groups.values():
+        runs.sort(key=lambda row: row["run_rank"])
+    return groups
+
+
+def group_samples(
+    rows: List[Dict[str, Any]], id_column: str, value_column: str
+) -> Dict[int, List[float]]:
+    samples = defaultdict(list)
+    for row in rows:
+        if row[value_column] is not None:
+            samples[row[id_column]].append(row[value_column])
+    return samples
+
+
+def setup_name(run: Dict[str, Any]) -> str:
+    name = f"{run['target_model']} ({run['target_quantization']})"
+    if run["draft_model"]:
+        name += (
+            f" + {run['draft_model']} ({run['draft_quantization']})"
+            f" k={run['num_spec_tokens']}"
+        )
+    if run.get("dataset_type"):
+        name += f" {run['dataset_type']}"
+    if run.get("backend"):
+        name += f" {run['backend']} {run['num_prompts']} prompts ({run['sampling']})"
+    if run.get("rps") is not None:
+        name += f" rps={run['rps']:g}"
+    if run.get("concurrency") is not None:
+        name += f" concurrency={run['concurrency']}"
+    return name
+
+
+def check_runs(
+    groups: Dict[Tuple, List[Dict[str, Any]]],
+    metrics: Dict[str, bool],
+    id_column: str,
+    samples: Dict[str, Dict[int, List[float]]],
+    args: argparse.Namespace,
+    rng: np.random.Generator,
+) -> List[Dict[str, Any]]:
+    """
+    Compare the latest run of every setup with its previous runs. A metric
+    regresses when it got worse than the baseline median by more than the
+    tolerance and the test on per-request samples (Mann-Whitney) or on the
+    baseline runs (bootstrap) rejects that the run comes from the baseline.
+    """
+    results = []
+    for runs in groups.values():
+        latest, history = runs[0], runs[1:]
+        for metric, higher_is_better in metrics.items():
+            current = latest[metric]
+            baseline = [run[metric] for run in history if run[metric] is not None]
+            if current is None or len(baseline) < args.min_baseline_runs:
+                continue
+            median = float(np.median(baseline))
+            if not median:
+                continue
+            change = (current - median) / median
+            worse = -change if higher_is_better else change
+
+            metric_samples = samples.get(metric, {})
+            current_samples = metric_samples.get(latest[id_column], [])
+            baseline_samples = [
+                value
+                for run in history
+                for value in metric_samples.get(run[id_column], [])
+            ]
+            if current_samples and baseline_samples:
+                test = "mann-whitney"
+                p_value = mann_whitney_p_value(
+                    baseline_samples, current_samples, higher_is_better
+                )
+            else:
+                test = "bootstrap"
+                p_value = bootstrap_p_value(
+                    baseline, current, higher_is_better, args.bootstrap_samples, rng
+                )
+            results.append(
+                {
+                    "setup": setup_name(latest),
+                    id_column: latest[id_column],
+                    "date": latest["date"],
+                    "metric": metric,
+                    "baseline": median,
+                    "current": current,
+                    "change": change,
+                    "baseline_runs": len(baseline),
+                    "test": test,
+                    "p_value": p_value,
+                    "regression": worse > args.tolerance and p_value < args.alpha,
+                }
+            )
+    return results
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Compare the latest SD and load test runs of every setup with "
+        "their previous runs and exit with 1 on regressions"
+    )
+    parser.add_argument(
+        "--db_name",
+        type=str,
+        required=True,
+        help="SQLite database name, a .duckdb file or duckdb:// URI selects DuckDB",
+    )
+    parser.add_argument(
+        "--baseline_runs",
+        type=int,
+        default=BASELINE_RUNS,
+        help="Previous runs of a setup that form its baseline",
+    )
+    parser.add_argument(
+        "--min_baseline_runs",
+        type=int,
+        default=MIN_BASELINE_RUNS,
+        help="Setups with fewer previous runs are not checked",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="Relative degradation from the baseline median that is tolerated",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=ALPHA,
+        help="Significance level of the regression tests",
+    )
+    parser.add_argument(
+        "--bootstrap_samples",
+        type=int,
+        default=BOOTSTRAP_SAMPLES,
+        help="Resamples of the bootstrap test",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the bootstrap")
+    parser.add_argument(
+        "--output", type=str, default=None, help="JSON file for the report"
+    )
+    args = parser.parse_args(argv)
+
+    if not Path(db_path(args.db_name)).exists():
+        parser.error(f"Database does not exist: {args.db_name}")
+    # The queries read columns that databases of older runs may lack
+    create_database(args.db_name)
+
+    rng = np.random.default_rng(args.seed)
+    num_runs = args.baseline_runs + 1
+    sd_samples = group_samples(
+        get_sd_request_samples(args.db_name, num_runs),
+        "sd_performance_id",
+        "mean_acceptance_length",
+    )
+    ld_samples = group_samples(
+        get_ld_bucket_samples(args.db_name, num_runs),
+        "ld_performance_id",
+        "latency_avg",
+    )
+    results = check_runs(
+        group_runs(get_sd_run_history(args.db_name, num_runs), SD_GROUP_COLUMNS),
+        SD_METRICS,
+        "sd_performance_id",
+        {SD_SAMPLE_METRIC: sd_samples},
+        args,
+        rng,
+    ) + check_runs(
+        group_runs(get_ld_run_history(args.db_name, num_runs), LD_GROUP_COLUMNS),
+        LD_METRICS,
+        "ld_performance_id",
+        {LD_SAMPLE_METRIC: ld_samples},
+        args,
+        rng,
+    )
+
+    for row in results:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['setup']:<70} {row['metric']:<24} {row['baseline']:>12.3f} -> "
+            f"{row['current']:>12.3f} {row['change']:+8.1%} "
+            f"p={row['p_value']:.3f} ({row['test']}) {flag}"
+        )
+    num_regressions = sum(row["regression"] for row in results)
+    print(f"Checked {len(results)} metrics, {num_regressions} regressions")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if num_regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,271 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Type
 
 from spec_course.scripts.utils import load_config
 
+DUCKDB_PREFIX = "duckdb://"
+SQLITE_PREFIX = "sqlite://"
+DUCKDB_EXTENSIONS = (".duckdb", ".ddb")
+# tables.yaml is written for SQLite. DuckDB FLOAT is single precision and the
+# dates are free-form strings (run timestamps, folder names), so both keep
+# their SQLite meaning
+DUCKDB_COLUMN_TYPES = {
+    "FLOAT": "DOUBLE",
+    "DATETIME DEFAULT CURRENT_TIMESTAMP": "VARCHAR DEFAULT CAST(CURRENT_TIMESTAMP AS VARCHAR)",
+}
+AUTOINCREMENT = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+# Connections of the `batch_connection` blocks running in every thread
+_batch = threading.local()
+
+
+def is_duckdb(db_name: str) -> bool:
+    """A `duckdb://` URI or a .duckdb / .ddb file is a DuckDB database"""
+    return db_name.startswith(DUCKDB_PREFIX) or db_name.endswith(DUCKDB_EXTENSIONS)
+
+
+def db_path(db_name: str) -> str:
+    """Database file of a database name, without the URI scheme"""
+    return db_name.removeprefix(DUCKDB_PREFIX).removeprefix(SQLITE_PREFIX)
+
+
+class BatchConnection:
+    """Connection of a `batch_connection` block, never committed or closed inside"""
+
+    def __init__(self, conn: Any) -> None:
+        self.conn = conn
+
+    def execute(self, *args: Any) -> Any:
+        return self.conn.execute(*args)
+
+    def executemany(self, *args: Any) -> Any:
+        return self.conn.executemany(*args)
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def connect(db_name: str) -> Any:
+    """
+    Connect to the database, DuckDB or SQLite depending on the name. Both
+    connections follow the DB-API (`execute`, `executemany`, `commit`).
+    Inside a `batch_connection` block, its connection is returned.
+    """
+    batch_conn = getattr(_batch, "connections", {}).get(db_name)
+    if batch_conn is not None:
+        return batch_conn
+    if is_duckdb(db_name):
+        import duckdb
+
+        return duckdb.connect(db_path(db_name))
+    return sqlite3.connect(db_path(db_name))
+
+
+@contextmanager
+def batch_connection(db_name: str) -> Iterator[None]:
+    """
+    Run the functions of this module called by the current thread in the block
+    on one connection and one transaction, committed at the end of the block
+    and rolled back on error
+    """
+    conn = connect(db_name)
+    conn.execute("BEGIN TRANSACTION")
+    if not hasattr(_batch, "connections"):
+        _batch.connections = {}
+    _batch.connections[db_name] = BatchConnection(conn)
+    try:
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        del _batch.connections[db_name]
+        conn.close()
+
+
+def database_error(db_name: str) -> Type[Exception]:
+    if is_duckdb(db_name):
+        import duckdb
+
+        return duckdb.Error
+    return sqlite3.Error
+
+
+def insert_returning_id(conn: Any, query: str, params: Tuple, id_column: str) -> int:
+    """Insert a row and return its generated ID"""
+    if isinstance(conn, BatchConnection):
+        conn = conn.conn
+    if isinstance(conn, sqlite3.Connection):
+        return conn.execute(query, params).lastrowid
+    return conn.execute(f"{query} RETURNING {id_column}", params).fetchone()[0]
 
-def create_database(db_name: str) -> None:
-    """Create SQLite database and initialize tables from YAML definitions"""
-    conn = sqlite3.connect(db_name)
-    conn.execute("PRAGMA foreign_keys = ON")
 
+def begin_bulk_insert(conn: Any) -> None:
+    """Insert the batches in one transaction, DuckDB commits every row otherwise"""
+    if not isinstance(conn, BatchConnection):
+        conn.execute("BEGIN TRANSACTION")
+
+
+def _bulk_insert(
+    conn: Any,
+    table_name: str,
+    columns: List[str],
+    rows: Iterable[Tuple],
+    batch_size: int = 1000,
+) -> int:
+    """Insert rows in batches in one transaction and return their number"""
+    query = f"""INSERT INTO {table_name} ({", ".join(columns)})
+        VALUES ({", ".join(["?"] * len(columns))})"""
+    rows = iter(rows)
+    num_rows = 0
+    begin_bulk_insert(conn)
+    while batch := list(islice(rows, batch_size)):
+        conn.executemany(query, batch)
+        num_rows += len(batch)
+    return num_rows
+
+
+def sequence_name(table_name: str) -> str:
+    return f"{table_name}_id_seq"
+
+
+def table_definitions() -> Dict[str, Dict[str, Any]]:
+    """Tables of tables.yaml, in creation order"""
     current_dir = Path(__file__).parent
-    tables = load_config(current_dir / "tables.yaml").get("database_tables", {})
+    return load_config(current_dir / "tables.yaml").get("database_tables", {})
+
+
+def column_definition(
+    table_name: str, col_name: str, col_type: str, duckdb: bool
+) -> str:
+    if not duckdb:
+        return f"{col_name} {col_type}"
+    if col_type == AUTOINCREMENT:
+        return (
+            f"{col_name} INTEGER PRIMARY KEY "
+            f"DEFAULT nextval('{sequence_name(table_name)}')"
+        )
+    return f"{col_name} {DUCKDB_COLUMN_TYPES.get(col_type, col_type)}"
+
+
+def table_columns(conn: Any, db_name: str, table_name: str) -> List[str] | None:
+    """Columns of a table, None when the table does not exist"""
     try:
-        for table_name, values in tables.items():
-            columns = values["columns"]
-            dependent_columns = values.get("dependent_columns", {})
+        cursor = conn.execute(f"SELECT * FROM {table_name} LIMIT 0")
+    except database_error(db_name):
+        return None
+    return [column[0] for column in cursor.description]
 
-            column_defs = [
-                f"{col_name} {col_type}" for col_name, col_type in columns.items()
-            ]
-            dependent_column_defs = [
-                f" FOREIGN KEY ({col_name}) REFERENCES {col_base_table}"
-                for col_name, col_base_table in dependent_columns.items()
-            ]
 
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                {", ".join(column_defs + dependent_column_defs)}
-            )
-            """
+def create_table(
+    conn: Any, table_name: str, values: Dict[str, Any], duckdb: bool
+) -> None:
+    columns = values["columns"]
+    dependent_columns = values.get("dependent_columns", {})
+
+    if duckdb and AUTOINCREMENT in columns.values():
+        conn.execute(
+            f"CREATE SEQUENCE IF NOT EXISTS {sequence_name(table_name)} START 1"
+        )
+    column_defs = [
+        column_definition(table_name, col_name, col_type, duckdb)
+        for col_name, col_type in columns.items()
+    ]
+    dependent_column_defs = [
+        f" FOREIGN KEY ({col_name}) REFERENCES {col_base_table}"
+        for col_name, col_base_table in dependent_columns.items()
+    ]
+
+    create_table_sql = f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        {", ".join(column_defs + dependent_column_defs)}
+    )
+    """
+
+    conn.execute(create_table_sql)
+
+
+def upgrade_table(
+    conn: Any,
+    table_name: str,
+    values: Dict[str, Any],
+    existing_columns: List[str],
+    duckdb: bool,
+) -> List[str]:
+    """
+    Add the columns of tables.yaml missing from a table created with an older
+    schema. A missing ID column cannot be added in place, so the table is then
+    rebuilt with its rows numbered in insertion order. Returns the added columns.
+    """
+    columns = values["columns"]
+    missing = [col_name for col_name in columns if col_name not in existing_columns]
+    if not missing:
+        return []
+
+    if any(columns[col_name] == AUTOINCREMENT for col_name in missing):
+        old_table = f"{table_name}_old"
+        if not duckdb:
+            # Keep the references of other tables on the new table, and copy
+            # rows that reference setups the old schema did not check
+            conn.execute("PRAGMA legacy_alter_table = ON")
+            conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute(f"ALTER TABLE {table_name} RENAME TO {old_table}")
+        create_table(conn, table_name, values, duckdb)
+        column_list = ", ".join(
+            col_name for col_name in columns if col_name in existing_columns
+        )
+        conn.execute(
+            f"INSERT INTO {table_name} ({column_list}) "
+            f"SELECT {column_list} FROM {old_table} ORDER BY rowid"
+        )
+        conn.execute(f"DROP TABLE {old_table}")
+        conn.commit()
+        if not duckdb:
+            conn.execute("PRAGMA legacy_alter_table = OFF")
+            conn.execute("PRAGMA foreign_keys = ON")
+        return missing
+
+    for col_name in missing:
+        col_type = column_definition(table_name, col_name, columns[col_name], duckdb)
+        # SQLite only adds columns with constant defaults
+        if not duckdb:
+            col_type = col_type.replace(" DEFAULT CURRENT_TIMESTAMP", "")
+        conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {col_type}")
+    return missing
 
-            conn.execute(create_table_sql)
+
+def create_database(db_name: str) -> None:
+    """
+    Create SQLite or DuckDB database and initialize tables from YAML
+    definitions. Tables of an existing database are upgraded to the current
+    definitions, so that it can be opened by every version of the ETL.
+    """
+    duckdb = is_duckdb(db_name)
+    conn = connect(db_name)
+    if not duckdb:
+        conn.execute("PRAGMA foreign_keys = ON")
+
+    tables = table_definitions()
+    try:
+        for table_name, values in tables.items():
+            existing_columns = table_columns(conn, db_name, table_name)
+            if existing_columns is None:
+                create_table(conn, table_name, values, duckdb)
+                continue
+            added = upgrade_table(conn, table_name, values, existing_columns, duckdb)
+            if added:
+                print(f"Upgraded table {table_name}: added {', '.join(added)}")
 
         conn.commit()
-    except sqlite3.Error as e:
+    except database_error(db_name) as e:
         print(f"Error creating tables: {e}")
     finally:
         conn.close()
@@ -42,12 +273,14 @@ def create_database(db_name: str) -> None:
 
 def insert_model(db_name: str, model_name: str) -> int:
     """Insert a row into models table"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
-        cursor = conn.execute(
-            "INSERT INTO models (model_name) VALUES (?)", (model_name,)
+        model_id = insert_returning_id(
+            conn,
+            "INSERT INTO models (model_name) VALUES (?)",
+            (model_name,),
+            "model_id",
         )
-        model_id = cursor.lastrowid
         conn.commit()
         return model_id
     finally:
@@ -56,13 +289,14 @@ def insert_model(db_name: str, model_name: str) -> int:
 
 def insert_quantization(db_name: str, quantization_type: str) -> int:
     """Insert a row into quantizations table"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
-        cursor = conn.execute(
+        quantization_id = insert_returning_id(
+            conn,
             "INSERT INTO quantizations (quantization_type) VALUES (?)",
             (quantization_type,),
+            "quantization_id",
         )
-        quantization_id = cursor.lastrowid
         conn.commit()
         return quantization_id
     finally:
@@ -71,13 +305,14 @@ def insert_quantization(db_name: str, quantization_type: str) -> int:
 
 def insert_dataset(db_name: str, dataset_type: str) -> int:
     """Insert a row into datasets table"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
-        cursor = conn.execute(
+        dataset_id = insert_returning_id(
+            conn,
             "INSERT INTO datasets (dataset_type) VALUES (?)",
             (dataset_type,),
+            "dataset_id",
         )
-        dataset_id = cursor.lastrowid
         conn.commit()
         return dataset_id
     finally:
@@ -93,9 +328,10 @@ def insert_sd_setup(
     dataset_id: int,
 ) -> int:
     """Insert a row into sd_setups table"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
-        cursor = conn.execute(
+        sd_setup_id = insert_returning_id(
+            conn,
             """INSERT INTO sd_setups
             (target_model_id, target_quantization_id, draft_model_id, draft_quantization_id, dataset_id)
             VALUES (?, ?, ?, ?, ?)""",
@@ -106,8 +342,8 @@ def insert_sd_setup(
                 draft_quantization_id,
                 dataset_id,
             ),
+            "sd_setup_id",
         )
-        sd_setup_id = cursor.lastrowid
         conn.commit()
         return sd_setup_id
     finally:
@@ -118,7 +354,7 @@ def insert_accuracy(
     db_name: str, model_id: int, quantization_id: int, gsm8k_score: float, date: str
 ) -> None:
     """Insert a row into accuracy table"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
         conn.execute(
             "INSERT INTO accuracy (model_id, quantization_id, gsm8k_score, date) VALUES (?, ?, ?, ?)",
@@ -129,60 +365,326 @@ def insert_accuracy(
         conn.close()
 
 
+def insert_quantization_screen(
+    db_name: str,
+    model_id: int,
+    quantization_id: int,
+    screen: Dict[str, Any],
+    date: str,
+) -> None:
+    """Insert a row into quantization_screens table"""
+    conn = connect(db_name)
+    try:
+        conn.execute(
+            "INSERT INTO quantization_screens (model_id, quantization_id, perplexity, baseline_perplexity, top1_agreement, num_tokens, passed, date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                model_id,
+                quantization_id,
+                screen["perplexity"],
+                screen["baseline_perplexity"],
+                screen["top1_agreement"],
+                screen["num_tokens"],
+                screen["passed"],
+                date,
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _update_row(
+    conn: Any, table_name: str, id_column: str, row_id: int, values: Dict[str, Any]
+) -> None:
+    """Set the given column values of one row"""
+    assignments = ", ".join(f"{column} = ?" for column in values)
+    conn.execute(
+        f"UPDATE {table_name} SET {assignments} WHERE {id_column} = ?",
+        (*values.values(), row_id),
+    )
+
+
+def load_test_performance_values(
+    sd_setup_id: int,
+    rps: float | None,
+    latency: float | None,
+    num_spec_tokens: int,
+    date: str,
+    latency_stats: Dict[str, float] | None = None,
+    failed_rate: float | None = None,
+    achieved_rps: float | None = None,
+    dropped_iterations: int | None = None,
+    is_saturated: bool | None = None,
+    concurrency: int | None = None,
+    server_summary: Dict[str, float] | None = None,
+) -> Dict[str, Any]:
+    """Column values of an ld_performances row"""
+    latency_stats = latency_stats or {}
+    server_summary = server_summary or {}
+    return {
+        "sd_setup_id": sd_setup_id,
+        "rps": rps,
+        "end_to_end_latency": latency,
+        **{
+            f"latency_{stat}": latency_stats.get(stat)
+            for stat in ["avg", "min", "max", "p90", "p95", "p99"]
+        },
+        "failed_rate": failed_rate,
+        "achieved_rps": achieved_rps,
+        "dropped_iterations": dropped_iterations,
+        "is_saturated": is_saturated,
+        "concurrency": concurrency,
+        **{
+            column: server_summary.get(column)
+            for column in [
+                "spec_acceptance_rate",
+                "mean_acceptance_length",
+                "mean_ttft",
+                "mean_queue_time",
+                "mean_tpot",
+                "max_num_waiting",
+                "max_gpu_cache_usage",
+            ]
+        },
+        "num_spec_tokens": num_spec_tokens,
+        "date": date,
+    }
+
+
 def insert_load_test_performance(
     db_name: str,
     sd_setup_id: int,
-    rps: int,
-    latency: float,
+    rps: float | None,
+    latency: float | None,
     num_spec_tokens: int,
     date: str,
-) -> None:
+    latency_stats: Dict[str, float] | None = None,
+    failed_rate: float | None = None,
+    achieved_rps: float | None = None,
+    dropped_iterations: int | None = None,
+    is_saturated: bool | None = None,
+    concurrency: int | None = None,
+    server_summary: Dict[str, float] | None = None,
+) -> int:
     """Insert a row into ld_performances table"""
-    conn = sqlite3.connect(db_name)
+    values = load_test_performance_values(
+        sd_setup_id,
+        rps,
+        latency,
+        num_spec_tokens,
+        date,
+        latency_stats=latency_stats,
+        failed_rate=failed_rate,
+        achieved_rps=achieved_rps,
+        dropped_iterations=dropped_iterations,
+        is_saturated=is_saturated,
+        concurrency=concurrency,
+        server_summary=server_summary,
+    )
+    conn = connect(db_name)
     try:
-        conn.execute(
-            "INSERT INTO ld_performances (sd_setup_id, rps, end_to_end_latency, num_spec_tokens, date) VALUES (?, ?, ?, ?, ?)",
-            (sd_setup_id, rps, latency, num_spec_tokens, date),
+        ld_performance_id = insert_returning_id(
+            conn,
+            f"""INSERT INTO ld_performances ({", ".join(values)})
+            VALUES ({", ".join(["?"] * len(values))})""",
+            tuple(values.values()),
+            "ld_performance_id",
+        )
+        conn.commit()
+        return ld_performance_id
+    finally:
+        conn.close()
+
+
+def update_load_test_performance(
+    db_name: str, ld_performance_id: int, values: Dict[str, Any]
+) -> None:
+    """Overwrite columns of an ld_performances row, see `load_test_performance_values`"""
+    conn = connect(db_name)
+    try:
+        _update_row(
+            conn, "ld_performances", "ld_performance_id", ld_performance_id, values
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def insert_load_test_buckets(
+    db_name: str,
+    ld_performance_id: int,
+    buckets: Iterable[Dict[str, Any]],
+    batch_size: int = 1000,
+) -> int:
+    """Bulk insert per-bucket request aggregates of a load test run"""
+    columns = [
+        "bucket_start",
+        "bucket_seconds",
+        "num_requests",
+        "num_failed",
+        "latency_avg",
+        "latency_min",
+        "latency_max",
+        "prompt_tokens",
+        "completion_tokens",
+    ]
+    rows = (
+        (ld_performance_id, *(bucket[col] for col in columns)) for bucket in buckets
+    )
+    conn = connect(db_name)
+    try:
+        num_rows = _bulk_insert(
+            conn,
+            "ld_request_buckets",
+            ["ld_performance_id", *columns],
+            rows,
+            batch_size,
         )
         conn.commit()
+        return num_rows
     finally:
         conn.close()
 
 
+def insert_load_test_server_metrics(
+    db_name: str,
+    ld_performance_id: int,
+    metrics: Iterable[Dict[str, Any]],
+    batch_size: int = 1000,
+) -> int:
+    """Bulk insert server-side metric samples of a load test run"""
+    columns = ["offset_s", "replica", "source", "metric_name", "value"]
+    rows = (
+        (ld_performance_id, *(metric[col] for col in columns)) for metric in metrics
+    )
+    conn = connect(db_name)
+    try:
+        num_rows = _bulk_insert(
+            conn, "ld_server_metrics", ["ld_performance_id", *columns], rows, batch_size
+        )
+        conn.commit()
+        return num_rows
+    finally:
+        conn.close()
+
+
+def sd_performance_values(
+    sd_setup_id: int,
+    mean_acceptance_length: float | None,
+    date: str,
+    time_taken: float | None,
+    acceptance_rates: List[float | None],
+    timing_stats: Dict[str, float] | None = None,
+    num_spec_tokens: int | None = None,
+    run_config: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """Column values of an sd_performances row"""
+    timing_stats = timing_stats or {}
+    run_config = run_config or {}
+    ar_1, ar_2, ar_3, ar_4, ar_5 = acceptance_rates
+    return {
+        "date": date,
+        "sd_setup_id": sd_setup_id,
+        "mean_acceptance_length": mean_acceptance_length,
+        "time_taken": time_taken,
+        "rate_at_1position": ar_1,
+        "rate_at_2position": ar_2,
+        "rate_at_3position": ar_3,
+        "rate_at_4position": ar_4,
+        "rate_at_5position": ar_5,
+        "num_repetitions": timing_stats.get("repetitions"),
+        "time_std": timing_stats.get("time_std"),
+        "time_min": timing_stats.get("time_min"),
+        "tokens_per_second": timing_stats.get("tokens_per_second_mean"),
+        "tokens_per_second_std": timing_stats.get("tokens_per_second_std"),
+        "tokens_per_second_min": timing_stats.get("tokens_per_second_min"),
+        "num_spec_tokens": num_spec_tokens,
+        "backend": run_config.get("backend"),
+        "sampling": run_config.get("sampling"),
+        "num_prompts": run_config.get("num_prompts"),
+    }
+
+
 def insert_sd_performance(
     db_name: str,
     sd_setup_id: int,
-    mean_acceptance_length: float,
+    mean_acceptance_length: float | None,
     date: str,
-    time_taken: float,
-    acceptance_rates: List[float],
-) -> None:
+    time_taken: float | None,
+    acceptance_rates: List[float | None],
+    timing_stats: Dict[str, float] | None = None,
+    num_spec_tokens: int | None = None,
+    run_config: Dict[str, Any] | None = None,
+) -> int:
     """Insert a row into sd_performances table"""
-    conn = sqlite3.connect(db_name)
+    values = sd_performance_values(
+        sd_setup_id,
+        mean_acceptance_length,
+        date,
+        time_taken,
+        acceptance_rates,
+        timing_stats=timing_stats,
+        num_spec_tokens=num_spec_tokens,
+        run_config=run_config,
+    )
+    conn = connect(db_name)
     try:
-        ar_1, ar_2, ar_3, ar_4, ar_5 = acceptance_rates
-        conn.execute(
-            "INSERT INTO sd_performances (date, sd_setup_id, mean_acceptance_length, time_taken, rate_at_1position, rate_at_2position, rate_at_3position, rate_at_4position, rate_at_5position) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                date,
-                sd_setup_id,
-                mean_acceptance_length,
-                time_taken,
-                ar_1,
-                ar_2,
-                ar_3,
-                ar_4,
-                ar_5,
-            ),
+        sd_performance_id = insert_returning_id(
+            conn,
+            f"""INSERT INTO sd_performances ({", ".join(values)})
+            VALUES ({", ".join(["?"] * len(values))})""",
+            tuple(values.values()),
+            "sd_performance_id",
+        )
+        conn.commit()
+        return sd_performance_id
+    finally:
+        conn.close()
+
+
+def update_sd_performance(
+    db_name: str, sd_performance_id: int, values: Dict[str, Any]
+) -> None:
+    """Overwrite columns of an sd_performances row, see `sd_performance_values`"""
+    conn = connect(db_name)
+    try:
+        _update_row(
+            conn, "sd_performances", "sd_performance_id", sd_performance_id, values
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def insert_sd_request_acceptance(
+    db_name: str,
+    sd_performance_id: int,
+    requests: Iterable[Dict[str, Any]],
+    batch_size: int = 1000,
+) -> int:
+    """Bulk insert per-request acceptance of a speculative decoding run"""
+    columns = ["prompt_index", "num_steps", "mean_acceptance_length"]
+    rows = (
+        (sd_performance_id, *(request[col] for col in columns)) for request in requests
+    )
+    conn = connect(db_name)
+    try:
+        num_rows = _bulk_insert(
+            conn,
+            "sd_request_acceptance",
+            ["sd_performance_id", *columns],
+            rows,
+            batch_size,
         )
         conn.commit()
+        return num_rows
     finally:
         conn.close()
 
 
 def get_model_id(db_name: str, model_name: str) -> int | None:
     """Search for model by name and return its ID if exists"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
         cursor = conn.execute(
             "SELECT model_id FROM models WHERE model_name = ?", (model_name,)
@@ -195,7 +697,7 @@ def get_model_id(db_name: str, model_name: str) -> int | None:
 
 def get_quantization_id(db_name: str, quantization_type: str) -> int | None:
     """Search for quantization by type and return its ID if exists"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
         cursor = conn.execute(
             "SELECT quantization_id FROM quantizations WHERE quantization_type = ?",
@@ -209,7 +711,7 @@ def get_quantization_id(db_name: str, quantization_type: str) -> int | None:
 
 def get_dataset_id(db_name: str, dataset_type: str) -> int | None:
     """Search for dataset by type and return its ID if exists"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
         cursor = conn.execute(
             "SELECT dataset_id FROM datasets WHERE dataset_type = ?",
@@ -230,7 +732,7 @@ def get_sd_setup_id(
     dataset_id: int,
 ) -> int | None:
     """Search for SD setup by IDs and return its ID if exists"""
-    conn = sqlite3.connect(db_name)
+    conn = connect(db_name)
     try:
         cursor = conn.execute(
             """SELECT sd_setup_id FROM sd_setups
@@ -1,6 +1,17 @@
 from pathlib import Path
 from typing import Any, Dict, Tuple
 
+from spec_course.database.db import (
+    get_dataset_id,
+    get_model_id,
+    get_quantization_id,
+    get_sd_setup_id,
+    insert_dataset,
+    insert_model,
+    insert_quantization,
+    insert_sd_setup,
+)
+
 
 def parse_model_name(full_name: str) -> Tuple[str, str]:
     """Parse the model name and quantization type from a full model name."""
@@ -31,12 +42,97 @@ class ETLBase:
         """
         raise NotImplementedError("Subclasses should implement this method.")
 
-    def _load(self, data: Dict[Any, Any]) -> None:
+    def _load(self, data: Dict[Any, Any]) -> Any:
         """
         Load the transformed data into the target.
         """
         raise NotImplementedError("Subclasses should implement this method.")
 
+    def _load_sd_setup(self, data: Dict[Any, Any]) -> int:
+        """
+        Get or insert the models, quantizations, dataset and SD setup of a
+        transformed record and return the SD setup ID.
+        """
+        target_model_id = get_model_id(self.db_name, data["target_model"])
+        if target_model_id is None:
+            target_model_id = insert_model(self.db_name, data["target_model"])
+
+        draft_model_id = get_model_id(self.db_name, data["draft_model"])
+        if draft_model_id is None:
+            draft_model_id = insert_model(self.db_name, data["draft_model"])
+
+        target_quantization_id = get_quantization_id(
+            self.db_name, data["target_quantization"]
+        )
+        if target_quantization_id is None:
+            target_quantization_id = insert_quantization(
+                self.db_name, data["target_quantization"]
+            )
+
+        draft_quantization_id = get_quantization_id(
+            self.db_name, data["draft_quantization"]
+        )
+        if draft_quantization_id is None:
+            draft_quantization_id = insert_quantization(
+                self.db_name, data["draft_quantization"]
+            )
+
+        dataset_id = get_dataset_id(self.db_name, data["dataset_type"])
+        if dataset_id is None:
+            dataset_id = insert_dataset(self.db_name, data["dataset_type"])
+
+        sd_setup_id = get_sd_setup_id(
+            self.db_name,
+            target_model_id,
+            target_quantization_id,
+            draft_model_id,
+            draft_quantization_id,
+            dataset_id,
+        )
+        if sd_setup_id is None:
+            sd_setup_id = insert_sd_setup(
+                self.db_name,
+                target_model_id,
+                target_quantization_id,
+                draft_model_id,
+                draft_quantization_id,
+                dataset_id,
+            )
+        return sd_setup_id
+
+    def transform_file(self, file_path: Path | str) -> Dict[Any, Any]:
+        """
+        Extract and transform a file without loading it.
+        """
+        return self._transform(self._extract(file_path))
+
+    def open_record(self, setup: Dict[Any, Any]) -> Any:
+        """
+        Load the main row of a run that is still going, from the setup the
+        runner knows up front, and return its ID. Per-request rows can then be
+        loaded under the ID while the run progresses, and `load_record`
+        completes the row with the results.
+        """
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def _complete(self, record_id: Any, data: Dict[Any, Any]) -> None:
+        """
+        Overwrite the main row opened by `open_record` with the transformed results.
+        """
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def load_record(self, data: Dict[Any, Any], record_id: Any = None) -> Any:
+        """
+        Load a record already transformed by a runner, see database/sink.py.
+        Returns what `_load` returns, the ID of the main row for the ETL classes
+        with per-request rows. With the ID of a row from `open_record`, that
+        row is completed instead.
+        """
+        if record_id is None:
+            return self._load(data)
+        self._complete(record_id, data)
+        return record_id
+
     def run(self, file_path: Path | str) -> None:
         """
         Run the ETL process.
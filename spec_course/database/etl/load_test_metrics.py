@@ -1,19 +1,86 @@
 import json
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator
 
 from spec_course.database.db import (
-    get_dataset_id,
-    get_model_id,
-    get_quantization_id,
-    get_sd_setup_id,
-    insert_dataset,
+    insert_load_test_buckets,
     insert_load_test_performance,
-    insert_model,
-    insert_quantization,
-    insert_sd_setup,
+    insert_load_test_server_metrics,
+    load_test_performance_values,
+    update_load_test_performance,
 )
-from spec_course.database.etl.base import ETLBase
+from spec_course.database.etl.base import ETLBase, parse_model_name
+from spec_course.database.etl.raw_records import (
+    aggregate_buckets,
+    iter_raw_points,
+    iter_server_metrics,
+)
+from spec_course.scripts.prometheus import (
+    PROMETHEUS_METRICS_FILE,
+    PROMETHEUS_SUMMARY_FILE,
+)
+from spec_course.scripts.server_logs import SERVER_METRICS_FILE
+from spec_course.scripts.utils import parse_duration
+
+# ld_performances column suffix -> k6 summary-export trend stat
+LATENCY_STATS = {
+    "avg": "avg",
+    "min": "min",
+    "max": "max",
+    "p90": "p(90)",
+    "p95": "p(95)",
+    "p99": "p(99)",
+}
+# Raw per-request k6 output, see `--raw-output` in scripts/load_test.py
+RAW_OUTPUT_FILES = ("raw.json.gz", "raw.json")
+BUCKET_SECONDS = 1.0
+# A run is saturated when it achieves less than this share of the requested rate
+SATURATION_THRESHOLD = 0.95
+# A scheduled run is saturated when its 95th percentile schedule lag (ms) is
+# above this: it completes its schedule by construction, but sends requests late
+SCHEDULE_LAG_THRESHOLD_MS = 1000.0
+
+
+def get_achieved_rps(iterations: Dict[str, float], duration: str) -> float:
+    """
+    Compute the achieved request rate over the configured test duration.
+    k6's own iteration rate also counts the graceful-stop tail, which
+    understates the rate for slow responses.
+    """
+    try:
+        seconds = parse_duration(duration)
+    except ValueError:
+        seconds = 0
+    if not seconds or "count" not in iterations:
+        return iterations.get("rate", 0.0)
+    return iterations["count"] / seconds
+
+
+def is_saturated_run(
+    target_rps: float,
+    achieved_rps: float,
+    dropped_iterations: int = 0,
+    schedule_lag_p95: float | None = None,
+) -> bool:
+    """Check whether the load generator could not keep up with the target rate"""
+    if dropped_iterations > 0:
+        return True
+    if schedule_lag_p95 is not None:
+        return schedule_lag_p95 > SCHEDULE_LAG_THRESHOLD_MS
+    return achieved_rps < target_rps * SATURATION_THRESHOLD
+
+
+def raw_output_path(folder: Path) -> Path | None:
+    return next(
+        (folder / name for name in RAW_OUTPUT_FILES if (folder / name).exists()),
+        None,
+    )
+
+
+def request_buckets(raw_path: Path) -> Iterator[Dict[str, Any]]:
+    """ld_request_buckets rows of a raw k6 output file, streamed"""
+    return aggregate_buckets(iter_raw_points(raw_path), bucket_seconds=BUCKET_SECONDS)
 
 
 class LoadTestETL(ETLBase):
@@ -26,110 +93,193 @@ class LoadTestETL(ETLBase):
             input_params = json.load(f)
         with open(folder / "metrics.json", "r") as f:
             metrics = json.load(f)
+        # Raw records are streamed at load time instead of being read here
+        raw_path = raw_output_path(folder)
+        # Server-side time series from the logs and from /metrics share one format
+        server_metrics_paths = [
+            folder / name
+            for name in [SERVER_METRICS_FILE, PROMETHEUS_METRICS_FILE]
+            if (folder / name).exists()
+        ]
+        server_summary = None
+        if (folder / PROMETHEUS_SUMMARY_FILE).exists():
+            with open(folder / PROMETHEUS_SUMMARY_FILE, "r") as f:
+                server_summary = json.load(f)
         return {
             "input_params": input_params,
             "metrics": metrics,
             "folder_name": folder.name,
+            "raw_path": raw_path,
+            "server_metrics_paths": server_metrics_paths,
+            "server_summary": server_summary,
         }
 
     def _transform(self, data: Any) -> Dict[Any, Any]:
         input_params = data["input_params"]
         metrics = data["metrics"]
 
-        rps = int(input_params.get("rps", "1"))
+        rps = float(input_params.get("rps", "1"))
+        target_rps = rps
+        duration = input_params.get("duration", "")
+        scheduled = "num_requests" in input_params
+        if scheduled:
+            # Scheduled workloads (e.g. trace replay) define their own mean rate
+            rps = input_params["num_requests"] / input_params["schedule_seconds"]
+            target_rps = rps
+            duration = f"{input_params['schedule_seconds']}s"
 
-        run_id = input_params.get("run_id", "")
-        num_spec_tokens = 0
-        if "sd_" in run_id:
-            try:
-                num_spec_tokens = int(run_id.split("sd_")[1])
-            except Exception:
-                num_spec_tokens = 0
-
-        latency = (
-            metrics.get("metrics", {}).get("end_to_end_latency", {}).get("med", 0.0)
-        )
+        concurrency = input_params.get("concurrency") or None
 
-        # TODO: Think how to do it better
-        target_model_name, target_quantization = (
-            "meta-llama/Llama-3.1-8B-Instruct",
-            "FP16",
-        )
-        if "single_model" not in run_id:
-            draft_model_name = "Llama-3.2-1B-Instruct"
-            draft_quantization = "FP8"
-        else:
-            draft_model_name = ""
-            draft_quantization = ""
+        k6_metrics = metrics.get("metrics", {})
+        latency_metrics = k6_metrics.get("end_to_end_latency", {})
+        latency = latency_metrics.get("med", 0.0)
+        latency_stats = {
+            stat: latency_metrics.get(k6_stat)
+            for stat, k6_stat in LATENCY_STATS.items()
+        }
 
-        dataset_type = "code"
-        date = "_".join(data["folder_name"].split("_")[-2:])
+        failed_rate = k6_metrics.get("failed_requests", {}).get("value", 0.0)
+        achieved_rps = get_achieved_rps(k6_metrics.get("iterations", {}), duration)
+        dropped_iterations = k6_metrics.get("dropped_iterations", {}).get("count", 0)
+        schedule_lag_p95 = k6_metrics.get("schedule_lag", {}).get("p(95)")
+        if concurrency:
+            # Closed-loop runs have no requested rate to fall behind
+            rps = None
+            is_saturated = None
+        elif scheduled and schedule_lag_p95 is None and not dropped_iterations:
+            # The achieved rate of a completed schedule always matches its own
+            # rate, so without the lag of runs made before it was recorded the
+            # saturation is unknown
+            is_saturated = None
+        else:
+            is_saturated = is_saturated_run(
+                target_rps, achieved_rps, dropped_iterations, schedule_lag_p95
+            )
 
         transformed = {
+            **self._transform_setup(input_params, data["folder_name"]),
+            "rps": rps,
+            "end_to_end_latency": latency,
+            "latency_stats": latency_stats,
+            "failed_rate": failed_rate,
+            "achieved_rps": achieved_rps,
+            "dropped_iterations": dropped_iterations,
+            "is_saturated": is_saturated,
+            "concurrency": concurrency,
+            "server_summary": data.get("server_summary"),
+            # Per-request rows, read lazily when they are loaded
+            "request_buckets": (
+                request_buckets(data["raw_path"]) if data.get("raw_path") else []
+            ),
+            "server_metrics": chain.from_iterable(
+                iter_server_metrics(path)
+                for path in data.get("server_metrics_paths", [])
+            ),
+        }
+        return transformed
+
+    def _transform_setup(
+        self, input_params: Dict[str, Any], folder_name: str
+    ) -> Dict[Any, Any]:
+        """Setup fields of the input parameters of a run"""
+        run_id = input_params.get("run_id", "")
+        num_spec_tokens = input_params.get("num_spec_tokens")
+        if num_spec_tokens is None:
+            num_spec_tokens = 0
+            if "sd_" in run_id:
+                try:
+                    num_spec_tokens = int(run_id.split("sd_")[1])
+                except Exception:
+                    num_spec_tokens = 0
+
+        if "draft_model_name" in input_params:
+            target_model_name, target_quantization = parse_model_name(
+                input_params["model_name"]
+            )
+            if input_params["draft_model_name"]:
+                draft_model_name, draft_quantization = parse_model_name(
+                    input_params["draft_model_name"]
+                )
+            else:
+                draft_model_name = ""
+                draft_quantization = ""
+            dataset_type = input_params.get("prompt_type", "random")
+        else:
+            # Runs made before the setup was recorded in input_params
+            target_model_name, target_quantization = (
+                "meta-llama/Llama-3.1-8B-Instruct",
+                "FP16",
+            )
+            if "single_model" not in run_id:
+                draft_model_name = "Llama-3.2-1B-Instruct"
+                draft_quantization = "FP8"
+            else:
+                draft_model_name = ""
+                draft_quantization = ""
+            dataset_type = "code"
+
+        return {
             "target_model": target_model_name,
             "target_quantization": target_quantization,
             "draft_model": draft_model_name,
             "draft_quantization": draft_quantization,
             "dataset_type": dataset_type,
-            "rps": rps,
-            "end_to_end_latency": latency,
             "num_spec_tokens": num_spec_tokens,
-            "date": date,
+            "date": "_".join(folder_name.split("_")[-2:]),
         }
-        return transformed
 
-    def _load(self, data: Dict[Any, Any]) -> None:
-        target_model_id = get_model_id(self.db_name, data["target_model"])
-        if target_model_id is None:
-            target_model_id = insert_model(self.db_name, data["target_model"])
-
-        draft_model_id = get_model_id(self.db_name, data["draft_model"])
-        if draft_model_id is None:
-            draft_model_id = insert_model(self.db_name, data["draft_model"])
+    @staticmethod
+    def _performance_args(data: Dict[Any, Any]) -> Dict[str, Any]:
+        return {
+            "rps": data["rps"],
+            "latency": data["end_to_end_latency"],
+            "num_spec_tokens": data["num_spec_tokens"],
+            "date": data["date"],
+            "latency_stats": data["latency_stats"],
+            "failed_rate": data["failed_rate"],
+            "achieved_rps": data["achieved_rps"],
+            "dropped_iterations": data["dropped_iterations"],
+            "is_saturated": data["is_saturated"],
+            "concurrency": data["concurrency"],
+            "server_summary": data["server_summary"],
+        }
 
-        target_quantization_id = get_quantization_id(
-            self.db_name, data["target_quantization"]
+    def open_record(self, setup: Dict[Any, Any]) -> int:
+        """
+        Insert the ld_performances row of a running load test. `setup` has the
+        `input_params` the load test will save and the `folder_name` of its results.
+        """
+        input_params = setup["input_params"]
+        data = self._transform_setup(input_params, setup["folder_name"])
+        concurrency = input_params.get("concurrency") or None
+        return insert_load_test_performance(
+            self.db_name,
+            self._load_sd_setup(data),
+            rps=None if concurrency else float(input_params.get("rps", "1")),
+            latency=None,
+            num_spec_tokens=data["num_spec_tokens"],
+            date=data["date"],
+            concurrency=int(concurrency) if concurrency else None,
         )
-        if target_quantization_id is None:
-            target_quantization_id = insert_quantization(
-                self.db_name, data["target_quantization"]
-            )
 
-        draft_quantization_id = get_quantization_id(
-            self.db_name, data["draft_quantization"]
+    def _complete(self, record_id: int, data: Dict[Any, Any]) -> None:
+        values = load_test_performance_values(
+            self._load_sd_setup(data), **self._performance_args(data)
         )
-        if draft_quantization_id is None:
-            draft_quantization_id = insert_quantization(
-                self.db_name, data["draft_quantization"]
-            )
+        update_load_test_performance(self.db_name, record_id, values)
+        self._load_rows(record_id, data)
 
-        dataset_id = get_dataset_id(self.db_name, data["dataset_type"])
-        if dataset_id is None:
-            dataset_id = insert_dataset(self.db_name, data["dataset_type"])
-
-        sd_setup_id = get_sd_setup_id(
-            self.db_name,
-            target_model_id,
-            target_quantization_id,
-            draft_model_id,
-            draft_quantization_id,
-            dataset_id,
+    def _load_rows(self, ld_performance_id: int, data: Dict[Any, Any]) -> None:
+        insert_load_test_buckets(
+            self.db_name, ld_performance_id, data["request_buckets"]
+        )
+        insert_load_test_server_metrics(
+            self.db_name, ld_performance_id, data["server_metrics"]
         )
-        if sd_setup_id is None:
-            sd_setup_id = insert_sd_setup(
-                self.db_name,
-                target_model_id,
-                target_quantization_id,
-                draft_model_id,
-                draft_quantization_id,
-                dataset_id,
-            )
 
-        insert_load_test_performance(
-            self.db_name,
-            sd_setup_id,
-            data["rps"],
-            data["end_to_end_latency"],
-            data["num_spec_tokens"],
-            data["date"],
+    def _load(self, data: Dict[Any, Any]) -> int:
+        ld_performance_id = insert_load_test_performance(
+            self.db_name, self._load_sd_setup(data), **self._performance_args(data)
         )
+        self._load_rows(ld_performance_id, data)
+        return ld_performance_id
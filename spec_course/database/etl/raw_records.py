@@ -0,0 +1,140 @@
+import gzip
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# k6 metrics that carry per-request values
+LATENCY_METRIC = "http_req_duration"
+FAILED_METRIC = "failed_requests"
+TOKEN_METRICS = ("prompt_tokens", "completion_tokens")
+RAW_METRICS = {LATENCY_METRIC, FAILED_METRIC, *TOKEN_METRICS}
+
+
+@dataclass
+class RequestBucket:
+    bucket_start: float
+    num_requests: int = 0
+    num_failed: int = 0
+    latency_sum: float = 0.0
+    latency_min: float = float("inf")
+    latency_max: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add(self, metric: str, value: float) -> None:
+        if metric == LATENCY_METRIC:
+            self.num_requests += 1
+            self.latency_sum += value
+            self.latency_min = min(self.latency_min, value)
+            self.latency_max = max(self.latency_max, value)
+        elif metric == FAILED_METRIC:
+            self.num_failed += int(value)
+        else:
+            setattr(self, metric, getattr(self, metric) + int(value))
+
+    def to_dict(self, bucket_seconds: float) -> Dict[str, Any]:
+        return {
+            "bucket_start": self.bucket_start,
+            "bucket_seconds": bucket_seconds,
+            "num_requests": self.num_requests,
+            "num_failed": self.num_failed,
+            "latency_avg": (
+                self.latency_sum / self.num_requests if self.num_requests else None
+            ),
+            "latency_min": self.latency_min if self.num_requests else None,
+            "latency_max": self.latency_max if self.num_requests else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+def open_raw_file(file_path: Path | str):
+    """Open k6 raw JSON output, which is gzipped when the name ends with .gz"""
+    if str(file_path).endswith(".gz"):
+        return gzip.open(file_path, "rt")
+    return open(file_path, "r")
+
+
+def iter_raw_points(file_path: Path | str) -> Iterator[Tuple[float, str, float]]:
+    """
+    Stream (unix time, metric, value) samples from k6 JSON output line by line.
+    Only metric points describing single requests are yielded.
+    """
+    with open_raw_file(file_path) as f:
+        for line in f:
+            # Cheap pre-filter before paying for JSON parsing
+            if '"type":"Point"' not in line:
+                continue
+            record = json.loads(line)
+            metric = record["metric"]
+            if metric not in RAW_METRICS:
+                continue
+            data = record["data"]
+            timestamp = datetime.fromisoformat(data["time"]).timestamp()
+            yield timestamp, metric, data["value"]
+
+
+def aggregate_buckets(
+    points: Iterable[Tuple[float, str, float]],
+    bucket_seconds: float = 1.0,
+    lag_seconds: float = 10.0,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Aggregate streamed samples into fixed time buckets relative to the first sample.
+    k6 flushes samples slightly out of order, so a bucket is emitted once no sample
+    within `lag_seconds` of it has been seen; this keeps memory bounded by the lag
+    window instead of the run length. Samples arriving later are dropped.
+    """
+    open_buckets: Dict[int, RequestBucket] = {}
+    start_time = None
+    max_index = 0
+    flushed_index = float("-inf")
+
+    for timestamp, metric, value in points:
+        if start_time is None:
+            start_time = timestamp
+        index = int((timestamp - start_time) // bucket_seconds)
+        if index <= flushed_index:
+            continue
+        bucket = open_buckets.get(index)
+        if bucket is None:
+            bucket = open_buckets[index] = RequestBucket(index * bucket_seconds)
+        bucket.add(metric, value)
+
+        if index > max_index:
+            max_index = index
+            watermark = max_index - int(lag_seconds // bucket_seconds)
+            for ready in sorted(i for i in open_buckets if i < watermark):
+                yield open_buckets.pop(ready).to_dict(bucket_seconds)
+            flushed_index = max(flushed_index, watermark - 1)
+
+    for ready in sorted(open_buckets):
+        yield open_buckets.pop(ready).to_dict(bucket_seconds)
+
+
+def server_metric_rows(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One row per metric of a server metrics record, see `ServerLogRecorder`"""
+    return [
+        {
+            "offset_s": record["offset_s"],
+            "replica": record.get("replica", 0),
+            "source": record["source"],
+            "metric_name": metric_name,
+            "value": value,
+        }
+        for metric_name, value in record["metrics"].items()
+    ]
+
+
+def iter_server_metrics(file_path: Path | str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream server metric samples recorded during a load test as one row per metric,
+    see `ServerLogRecorder` in scripts/server_logs.py.
+    """
+    with open(file_path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            yield from server_metric_rows(json.loads(line))
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+from spec_course.database.db import (
+    get_model_id,
+    get_quantization_id,
+    insert_model,
+    insert_quantization,
+    insert_quantization_screen,
+)
+from spec_course.database.etl.base import ETLBase, parse_model_name
+
+
+class Screen(ETLBase):
+    def __init__(self, db_name: str) -> None:
+        super().__init__(db_name)
+
+    def _extract(self, file_path: Path | str) -> Any:
+        with open(file_path, "r") as f:
+            return json.load(f)
+
+    def _transform(self, data: Any) -> Dict[Any, Any]:
+        model_name, quantization_type = parse_model_name(data["model_name"])
+        return {
+            "model_name": model_name,
+            "quantization_type": quantization_type,
+            "date": data["date"],
+            "screen": {
+                key: data[key]
+                for key in [
+                    "perplexity",
+                    "baseline_perplexity",
+                    "top1_agreement",
+                    "num_tokens",
+                    "passed",
+                ]
+            },
+        }
+
+    def _load(self, data: Dict[Any, Any]) -> None:
+        model_id = get_model_id(self.db_name, data["model_name"])
+        if model_id is None:
+            model_id = insert_model(self.db_name, data["model_name"])
+
+        quantization_id = get_quantization_id(self.db_name, data["quantization_type"])
+        if quantization_id is None:
+            quantization_id = insert_quantization(
+                self.db_name, data["quantization_type"]
+            )
+
+        insert_quantization_screen(
+            self.db_name, model_id, quantization_id, data["screen"], data["date"]
+        )
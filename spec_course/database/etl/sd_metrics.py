@@ -1,18 +1,37 @@
+import math
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
 
 from spec_course.database.db import (
-    get_dataset_id,
-    get_model_id,
-    get_quantization_id,
-    get_sd_setup_id,
-    insert_dataset,
-    insert_model,
-    insert_quantization,
     insert_sd_performance,
-    insert_sd_setup,
+    insert_sd_request_acceptance,
+    sd_performance_values,
+    update_sd_performance,
 )
 from spec_course.database.etl.base import ETLBase, parse_model_name
+from spec_course.scripts.acceptance import (
+    load_acceptance_matrix,
+    request_acceptance_lengths,
+)
+
+
+def request_acceptance_rows(
+    matrix: np.ndarray, prompt_indices: Iterable[int]
+) -> List[Dict[str, Any]]:
+    """sd_request_acceptance rows of an acceptance matrix, one per prompt"""
+    lengths = request_acceptance_lengths(matrix)
+    return [
+        {
+            "prompt_index": index,
+            "num_steps": num_steps,
+            "mean_acceptance_length": None if math.isnan(length) else length,
+        }
+        for index, num_steps, length in zip(
+            prompt_indices, matrix[:, 0].tolist(), lengths.tolist()
+        )
+    ]
 
 
 class SDMetrics(ETLBase):
@@ -22,13 +41,59 @@ class SDMetrics(ETLBase):
     def _extract(self, file_path: Path | str) -> Any:
         with open(file_path, "r") as f:
             data = f.read()
-        return data
+        return {"content": data, "folder": Path(file_path).parent}
 
     def _transform(self, data: Any) -> Dict[Any, Any]:
         import json
 
-        data = json.loads(data)
+        folder = data["folder"]
+        data = json.loads(data["content"])
 
+        setup = self._transform_setup(data)
+        mean_acceptance_length = (
+            data["mean_acceptance_length"] if data["mean_acceptance_length"] else 0
+        )
+        # Rates start with position 0, which is always accepted
+        num_spec_tokens = (
+            len(data["acceptance_rates"]) - 1 if data["acceptance_rates"] else None
+        )
+        # The table has rates for 5 positions (k = 4); runs with other k, such
+        # as drafter replays, are padded with zeros or cut
+        acceptance_rates = (data["acceptance_rates"] or [])[:5]
+        acceptance_rates += [0] * (5 - len(acceptance_rates))
+
+        request_acceptance = []
+        if data.get("acceptance_counts_file"):
+            matrix = load_acceptance_matrix(folder / data["acceptance_counts_file"])
+            # Rows follow the run prompts, which may be a sample of the dataset
+            request_acceptance = request_acceptance_rows(
+                matrix, data.get("prompt_indices") or range(len(matrix))
+            )
+
+        transformed_data = {
+            **setup,
+            "time_taken": data["time_taken"],
+            "mean_acceptance_length": mean_acceptance_length,
+            "acceptance_rates": acceptance_rates,
+            "num_spec_tokens": num_spec_tokens,
+            "request_acceptance": request_acceptance,
+            # Runs made before repetitions were added have no timing stats
+            "timing_stats": {
+                key: data.get(key)
+                for key in [
+                    "repetitions",
+                    "time_std",
+                    "time_min",
+                    "tokens_per_second_mean",
+                    "tokens_per_second_std",
+                    "tokens_per_second_min",
+                ]
+            },
+        }
+        return transformed_data
+
+    def _transform_setup(self, data: Dict[str, Any]) -> Dict[Any, Any]:
+        """Setup fields of a results file, or of the setup of an open record"""
         target_model_name, target_quantization = parse_model_name(data["main_model"])
         if data["speculative_model"]:
             draft_model_name, draft_quantization = parse_model_name(
@@ -37,84 +102,68 @@ class SDMetrics(ETLBase):
         else:
             draft_model_name = ""
             draft_quantization = ""
-
-        date = data["timestamp"]
-
-        mean_acceptance_length = (
-            data["mean_acceptance_length"] if data["mean_acceptance_length"] else 0
-        )
-        acceptance_rates = (
-            data["acceptance_rates"]
-            if data["acceptance_rates"]
-            else [0 for _ in range(5)]
-        )
-        assert len(acceptance_rates) == 5, "Acceptance rates must have 5 values."
-
-        transformed_data = {
+        return {
             "target_model": target_model_name,
             "target_quantization": target_quantization,
             "draft_model": draft_model_name,
             "draft_quantization": draft_quantization,
             "dataset_type": data["dataset_type"],
-            "time_taken": data["time_taken"],
-            "date": date,
-            "mean_acceptance_length": mean_acceptance_length,
-            "acceptance_rates": acceptance_rates,
+            "date": data["timestamp"],
+            # Runs are only comparable with the same backend and prompt sample;
+            # runs made before these were recorded used vLLM on the first prompts
+            "run_config": {
+                "backend": data.get("backend", "vllm"),
+                "sampling": data.get("sampling", "head"),
+                # Sequential runs stop before their budget at a varying count
+                "num_prompts": data.get("prompt_budget") or data["num_prompts"],
+            },
         }
-        return transformed_data
 
-    def _load(self, data: Dict[Any, Any]) -> None:
-        target_model_id = get_model_id(self.db_name, data["target_model"])
-        if target_model_id is None:
-            target_model_id = insert_model(self.db_name, data["target_model"])
-
-        draft_model_id = get_model_id(self.db_name, data["draft_model"])
-        if draft_model_id is None:
-            draft_model_id = insert_model(self.db_name, data["draft_model"])
+    @staticmethod
+    def _performance_args(data: Dict[Any, Any]) -> Dict[str, Any]:
+        return {
+            "mean_acceptance_length": data["mean_acceptance_length"],
+            "date": data["date"],
+            "time_taken": data["time_taken"],
+            "acceptance_rates": data["acceptance_rates"],
+            "timing_stats": data["timing_stats"],
+            "num_spec_tokens": data["num_spec_tokens"],
+            "run_config": data["run_config"],
+        }
 
-        target_quantization_id = get_quantization_id(
-            self.db_name, data["target_quantization"]
+    def open_record(self, setup: Dict[Any, Any]) -> int:
+        """
+        Insert the sd_performances row of a running setup. `setup` has the
+        setup fields of a results file and `num_spec_tokens`.
+        """
+        data = self._transform_setup(setup)
+        return insert_sd_performance(
+            self.db_name,
+            self._load_sd_setup(data),
+            mean_acceptance_length=None,
+            date=data["date"],
+            time_taken=None,
+            acceptance_rates=[None] * 5,
+            num_spec_tokens=setup.get("num_spec_tokens"),
+            run_config=data["run_config"],
         )
-        if target_quantization_id is None:
-            target_quantization_id = insert_quantization(
-                self.db_name, data["target_quantization"]
-            )
 
-        draft_quantization_id = get_quantization_id(
-            self.db_name, data["draft_quantization"]
+    def _complete(self, record_id: int, data: Dict[Any, Any]) -> None:
+        values = sd_performance_values(
+            self._load_sd_setup(data), **self._performance_args(data)
         )
-        if draft_quantization_id is None:
-            draft_quantization_id = insert_quantization(
-                self.db_name, data["draft_quantization"]
+        update_sd_performance(self.db_name, record_id, values)
+        if data["request_acceptance"]:
+            insert_sd_request_acceptance(
+                self.db_name, record_id, data["request_acceptance"]
             )
 
-        dataset_id = get_dataset_id(self.db_name, data["dataset_type"])
-        if dataset_id is None:
-            dataset_id = insert_dataset(self.db_name, data["dataset_type"])
-
-        sd_setup_id = get_sd_setup_id(
-            self.db_name,
-            target_model_id,
-            target_quantization_id,
-            draft_model_id,
-            draft_quantization_id,
-            dataset_id,
+    def _load(self, data: Dict[Any, Any]) -> int:
+        sd_performance_id = insert_sd_performance(
+            self.db_name, self._load_sd_setup(data), **self._performance_args(data)
         )
-        if sd_setup_id is None:
-            sd_setup_id = insert_sd_setup(
-                self.db_name,
-                target_model_id,
-                target_quantization_id,
-                draft_model_id,
-                draft_quantization_id,
-                dataset_id,
+        if data["request_acceptance"]:
+            insert_sd_request_acceptance(
+                self.db_name, sd_performance_id, data["request_acceptance"]
             )
-
-        insert_sd_performance(
-            self.db_name,
-            sd_setup_id,
-            data["mean_acceptance_length"],
-            data["date"],
-            data["time_taken"],
-            data["acceptance_rates"],
-        )
+        return sd_performance_id
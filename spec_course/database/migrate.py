@@ -0,0 +1,143 @@
+import argparse
+import os
+from typing import Any, Dict, List
+
+from spec_course.database.db import (
+    AUTOINCREMENT,
+    begin_bulk_insert,
+    connect,
+    create_database,
+    db_path,
+    is_duckdb,
+    sequence_name,
+    table_columns,
+    table_definitions,
+)
+from spec_course.scripts.utils import setup_logger
+
+logger = setup_logger(log_name="db_migrate")
+
+BATCH_SIZE = 10_000
+
+
+def copy_table(
+    source_conn: Any,
+    target_conn: Any,
+    table_name: str,
+    columns: List[str],
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Copy the rows of a table in batches, IDs included"""
+    column_list = ", ".join(columns)
+    cursor = source_conn.execute(f"SELECT {column_list} FROM {table_name}")
+    query = f"""INSERT INTO {table_name} ({column_list})
+        VALUES ({", ".join(["?"] * len(columns))})"""
+
+    num_rows = 0
+    begin_bulk_insert(target_conn)
+    while batch := cursor.fetchmany(batch_size):
+        target_conn.executemany(query, batch)
+        num_rows += len(batch)
+    target_conn.commit()
+    return num_rows
+
+
+def advance_sequence(conn: Any, table_name: str, id_column: str) -> None:
+    """Move the ID sequence of a DuckDB table past the copied IDs"""
+    max_id = conn.execute(f"SELECT MAX({id_column}) FROM {table_name}").fetchone()[0]
+    if max_id:
+        conn.execute(
+            f"SELECT COUNT(nextval('{sequence_name(table_name)}')) FROM range({max_id})"
+        )
+
+
+def migrate_database(
+    source_db: str, target_db: str, batch_size: int = BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Upgrade the source database to the schema of tables.yaml, create the
+    target database from it and copy every table of the source into it.
+    Returns the number of rows per table.
+    """
+    create_database(source_db)
+    create_database(target_db)
+    tables = table_definitions()
+    duckdb_target = is_duckdb(target_db)
+
+    num_rows = {}
+    source_conn = connect(source_db)
+    target_conn = connect(target_db)
+    try:
+        for table_name, values in tables.items():
+            columns = table_columns(source_conn, source_db, table_name)
+            if columns is None:
+                logger.warning(f"Skipping {table_name}: not in {source_db}")
+                continue
+            columns = [
+                col_name for col_name in values["columns"] if col_name in columns
+            ]
+            num_rows[table_name] = copy_table(
+                source_conn, target_conn, table_name, columns, batch_size
+            )
+            if duckdb_target:
+                for col_name, col_type in values["columns"].items():
+                    if col_type == AUTOINCREMENT:
+                        advance_sequence(target_conn, table_name, col_name)
+            logger.info(f"Copied {num_rows[table_name]} rows of {table_name}")
+        target_conn.commit()
+    finally:
+        source_conn.close()
+        target_conn.close()
+    return num_rows
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Copy a SQLite database into a new DuckDB (or SQLite) database"
+    )
+    parser.add_argument("--source_db", type=str, required=True, help="Database to copy")
+    parser.add_argument(
+        "--target_db",
+        type=str,
+        required=True,
+        help="New database, a .duckdb file or duckdb:// URI selects DuckDB",
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=BATCH_SIZE, help="Rows per insert batch"
+    )
+    parser.add_argument(
+        "--dry_run",
+        "--dry-run",
+        action="store_true",
+        help="Count the rows to copy without creating the target database",
+    )
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(db_path(args.source_db)):
+        parser.error(f"Database does not exist: {args.source_db}")
+    if os.path.exists(db_path(args.target_db)):
+        parser.error(f"Target database already exists: {args.target_db}")
+
+    if args.dry_run:
+        conn = connect(args.source_db)
+        try:
+            for table_name in table_definitions():
+                if table_columns(conn, args.source_db, table_name) is None:
+                    continue
+                count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+                logger.info(
+                    f"Would copy {count[0]} rows of {table_name} into {args.target_db}"
+                )
+        finally:
+            conn.close()
+        return
+
+    num_rows = migrate_database(args.source_db, args.target_db, args.batch_size)
+    logger.info(
+        f"Copied {sum(num_rows.values())} rows of {len(num_rows)} tables "
+        f"from {args.source_db} to {args.target_db}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+from typing import Any, Dict, List
+
+from spec_course.database.db import connect
+
+LATENCY_COLUMNS = {
+    "avg": "latency_avg",
+    "min": "latency_min",
+    "med": "end_to_end_latency",
+    "max": "latency_max",
+    "p90": "latency_p90",
+    "p95": "latency_p95",
+    "p99": "latency_p99",
+}
+
+SETUP_JOINS = """
+JOIN sd_setups ss ON ld.sd_setup_id = ss.sd_setup_id
+JOIN models tm ON ss.target_model_id = tm.model_id
+JOIN quantizations tq ON ss.target_quantization_id = tq.quantization_id
+JOIN models dm ON ss.draft_model_id = dm.model_id
+JOIN quantizations dq ON ss.draft_quantization_id = dq.quantization_id
+"""
+# The setup names are grouped on next to the setup ID they depend on, since
+# DuckDB rejects selected columns that are neither grouped nor aggregated
+SETUP_GROUP_BY = (
+    "ss.sd_setup_id, tm.model_name, tq.quantization_type, "
+    "dm.model_name, dq.quantization_type"
+)
+
+
+def fetch_rows(db_name: str, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+    """Run a query and return rows as dictionaries"""
+    conn = connect(db_name)
+    try:
+        cursor = conn.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def get_latency_vs_rps(
+    db_name: str, percentile: str = "p90", include_saturated: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Get the latency percentile vs requested RPS curve for every setup.
+    Repeated runs of the same setup and RPS are averaged.
+    """
+    if percentile not in LATENCY_COLUMNS:
+        raise ValueError(
+            f"Unknown percentile: {percentile}. Available: {list(LATENCY_COLUMNS)}"
+        )
+    latency_column = LATENCY_COLUMNS[percentile]
+    saturation_filter = "" if include_saturated else "AND NOT ld.is_saturated"
+
+    query = f"""
+    SELECT
+        tm.model_name AS target_model,
+        tq.quantization_type AS target_quantization,
+        dm.model_name AS draft_model,
+        dq.quantization_type AS draft_quantization,
+        ld.num_spec_tokens,
+        ld.rps,
+        AVG(ld.achieved_rps) AS achieved_rps,
+        AVG(ld.{latency_column}) AS latency,
+        AVG(ld.failed_rate) AS failed_rate,
+        MAX(ld.is_saturated) AS is_saturated,
+        COUNT(*) AS num_runs
+    FROM ld_performances ld
+    {SETUP_JOINS}
+    WHERE ld.concurrency IS NULL {saturation_filter}
+    GROUP BY {SETUP_GROUP_BY}, ld.num_spec_tokens, ld.rps
+    ORDER BY ss.sd_setup_id, ld.num_spec_tokens, ld.rps
+    """
+    return fetch_rows(db_name, query)
+
+
+def get_saturation_points(db_name: str) -> List[Dict[str, Any]]:
+    """Get the lowest requested RPS at which every setup saturates"""
+    query = f"""
+    SELECT
+        tm.model_name AS target_model,
+        tq.quantization_type AS target_quantization,
+        dm.model_name AS draft_model,
+        dq.quantization_type AS draft_quantization,
+        ld.num_spec_tokens,
+        MIN(ld.rps) AS saturation_rps
+    FROM ld_performances ld
+    {SETUP_JOINS}
+    WHERE ld.is_saturated
+    GROUP BY {SETUP_GROUP_BY}, ld.num_spec_tokens
+    ORDER BY ss.sd_setup_id, ld.num_spec_tokens
+    """
+    return fetch_rows(db_name, query)
+
+
+def get_throughput_latency_curve(
+    db_name: str, percentile: str = "p90"
+) -> List[Dict[str, Any]]:
+    """
+    Get the throughput-vs-latency curve of closed-loop runs for every setup,
+    one point per concurrency level.
+    """
+    if percentile not in LATENCY_COLUMNS:
+        raise ValueError(
+            f"Unknown percentile: {percentile}. Available: {list(LATENCY_COLUMNS)}"
+        )
+    latency_column = LATENCY_COLUMNS[percentile]
+
+    query = f"""
+    SELECT
+        tm.model_name AS target_model,
+        tq.quantization_type AS target_quantization,
+        dm.model_name AS draft_model,
+        dq.quantization_type AS draft_quantization,
+        ld.num_spec_tokens,
+        ld.concurrency,
+        AVG(ld.achieved_rps) AS throughput_rps,
+        AVG(ld.{latency_column}) AS latency,
+        AVG(ld.failed_rate) AS failed_rate,
+        COUNT(*) AS num_runs
+    FROM ld_performances ld
+    {SETUP_JOINS}
+    WHERE ld.concurrency IS NOT NULL
+    GROUP BY {SETUP_GROUP_BY}, ld.num_spec_tokens, ld.concurrency
+    ORDER BY ss.sd_setup_id, ld.num_spec_tokens, ld.concurrency
+    """
+    return fetch_rows(db_name, query)
+
+
+def get_server_metric_series(
+    db_name: str, ld_performance_id: int, metric_names: List[str] | None = None
+) -> List[Dict[str, Any]]:
+    """
+    Get the server-side metric time series of a load test run next to the
+    client-side request buckets, so latency can be matched with queueing and
+    acceptance over time.
+    """
+    metric_filter = ""
+    params: tuple = (ld_performance_id,)
+    if metric_names:
+        metric_filter = f"AND metric_name IN ({', '.join(['?'] * len(metric_names))})"
+        params += tuple(metric_names)
+
+    query = f"""
+    SELECT offset_s, replica, source, metric_name, value
+    FROM ld_server_metrics
+    WHERE ld_performance_id = ? {metric_filter}
+    ORDER BY offset_s, replica, metric_name
+    """
+    return fetch_rows(db_name, query, params)
+
+
+def get_prompt_acceptance_drop(
+    db_name: str,
+    draft_model: str,
+    quantization: str,
+    baseline_quantization: str = "FP16",
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Get the prompts whose mean acceptance length drops the most when the draft
+    model is quantized, compared to the baseline draft on the same target model
+    and dataset. Repeated runs are averaged per prompt.
+    """
+    query = """
+    WITH per_prompt AS (
+        SELECT
+            ss.target_model_id,
+            ss.target_quantization_id,
+            ss.dataset_id,
+            dq.quantization_type AS draft_quantization,
+            ra.prompt_index,
+            AVG(ra.mean_acceptance_length) AS mean_acceptance_length
+        FROM sd_request_acceptance ra
+        JOIN sd_performances sp ON ra.sd_performance_id = sp.sd_performance_id
+        JOIN sd_setups ss ON sp.sd_setup_id = ss.sd_setup_id
+        JOIN models dm ON ss.draft_model_id = dm.model_id
+        JOIN quantizations dq ON ss.draft_quantization_id = dq.quantization_id
+        WHERE dm.model_name = ? AND dq.quantization_type IN (?, ?)
+        GROUP BY
+            ss.sd_setup_id,
+            ss.target_model_id,
+            ss.target_quantization_id,
+            ss.dataset_id,
+            dq.quantization_type,
+            ra.prompt_index
+    )
+    SELECT
+        tm.model_name AS target_model,
+        tq.quantization_type AS target_quantization,
+        d.dataset_type,
+        q.prompt_index,
+        b.mean_acceptance_length AS baseline_acceptance_length,
+        q.mean_acceptance_length AS quantized_acceptance_length,
+        b.mean_acceptance_length - q.mean_acceptance_length AS acceptance_drop
+    FROM per_prompt q
+    JOIN per_prompt b
+        ON q.target_model_id = b.target_model_id
+        AND q.target_quantization_id = b.target_quantization_id
+        AND q.dataset_id = b.dataset_id
+        AND q.prompt_index = b.prompt_index
+    JOIN models tm ON q.target_model_id = tm.model_id
+    JOIN quantizations tq ON q.target_quantization_id = tq.quantization_id
+    JOIN datasets d ON q.dataset_id = d.dataset_id
+    WHERE q.draft_quantization = ? AND b.draft_quantization = ?
+    ORDER BY acceptance_drop DESC
+    LIMIT ?
+    """
+    params = (
+        draft_model,
+        quantization,
+        baseline_quantization,
+        quantization,
+        baseline_quantization,
+        limit,
+    )
+    return fetch_rows(db_name, query, params)
+
+
+def get_sd_speed_comparison(db_name: str) -> List[Dict[str, Any]]:
+    """
+    Get tokens/s and time of every speculative decoding run with their
+    run-to-run standard deviation, for comparing setups with error bars.
+    """
+    query = """
+    SELECT
+        tm.model_name AS target_model,
+        tq.quantization_type AS target_quantization,
+        dm.model_name AS draft_model,
+        dq.quantization_type AS draft_quantization,
+        d.dataset_type,
+        sp.date,
+        sp.mean_acceptance_length,
+        sp.num_repetitions,
+        sp.time_taken,
+        sp.time_std,
+        sp.time_min,
+        sp.tokens_per_second,
+        sp.tokens_per_second_std,
+        sp.tokens_per_second_min
+    FROM sd_performances sp
+    JOIN sd_setups ss ON sp.sd_setup_id = ss.sd_setup_id
+    JOIN models tm ON ss.target_model_id = tm.model_id
+    JOIN quantizations tq ON ss.target_quantization_id = tq.quantization_id
+    JOIN models dm ON ss.draft_model_id = dm.model_id
+    JOIN quantizations dq ON ss.draft_quantization_id = dq.quantization_id
+    JOIN datasets d ON ss.dataset_id = d.dataset_id
+    WHERE sp.tokens_per_second IS NOT NULL
+    ORDER BY d.dataset_type, sp.tokens_per_second DESC
+    """
+    return fetch_rows(db_name, query)
+
+
+def get_sd_run_history(db_name: str, num_runs: int) -> List[Dict[str, Any]]:
+    """
+    Get the latest `num_runs` speculative decoding runs of every setup, number
+    of draft tokens, backend and prompt sample, newest first (`run_rank` 1 is
+    the latest run).
+    """
+    query = """
+    WITH ranked AS (
+        SELECT
+            sp.*,
+            ROW_NUMBER() OVER (
+                PARTITION BY sp.sd_setup_id, sp.num_spec_tokens, sp.backend,
+                    sp.sampling, sp.num_prompts
+                ORDER BY sp.date DESC, sp.sd_performance_id DESC
+            ) AS run_rank
+        FROM sd_performances sp
+    )
+    SELECT
+        r.sd_performance_id,
+        r.sd_setup_id,
+        tm.model_name AS target_model,
+        tq.quantization_type AS target_quantization,
+        dm.model_name AS draft_model,
+        dq.quantization_type AS draft_quantization,
+        d.dataset_type,
+        r.num_spec_tokens,
+        r.backend,
+        r.sampling,
+        r.num_prompts,
+        r.run_rank,
+        r.date,
+        r.tokens_per_second,
+        r.mean_acceptance_length
+    FROM ranked r
+    JOIN sd_setups ss ON r.sd_setup_id = ss.sd_setup_id
+    JOIN models tm ON ss.target_model_id = tm.model_id
+    JOIN quantizations tq ON ss.target_quantization_id = tq.quantization_id
+    JOIN models dm ON ss.draft_model_id = dm.model_id
+    JOIN quantizations dq ON ss.draft_quantization_id = dq.quantization_id
+    JOIN datasets d ON ss.dataset_id = d.dataset_id
+    WHERE r.run_rank <= ?
+    ORDER BY r.sd_setup_id, r.num_spec_tokens, r.backend, r.sampling,
+        r.num_prompts, r.run_rank
+    """
+    return fetch_rows(db_name, query, (num_runs,))
+
+
+def get_sd_request_samples(db_name: str, num_runs: int) -> List[Dict[str, Any]]:
+    """Get the per-request acceptance lengths of the runs of `get_sd_run_history`"""
+    query = """
+    WITH ranked AS (
+        SELECT
+            sd_performance_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY sd_setup_id, num_spec_tokens, backend, sampling,
+                    num_prompts
+                ORDER BY date DESC, sd_performance_id DESC
+            ) AS run_rank
+        FROM sd_performances
+    )
+    SELECT ra.sd_performance_id, ra.mean_acceptance_length
+    FROM sd_request_acceptance ra
+    JOIN ranked r ON ra.sd_performance_id = r.sd_performance_id
+    WHERE r.run_rank <= ? AND ra.mean_acceptance_length IS NOT NULL
+    """
+    return fetch_rows(db_name, query, (num_runs,))
+
+
+def get_ld_run_history(db_name: str, num_runs: int) -> List[Dict[str, Any]]:
+    """
+    Get the latest `num_runs` load test runs of every setup, number of draft
+    tokens and load (requested RPS or concurrency), newest first.
+    """
+    query = f"""
+    WITH ranked AS (
+        SELECT
+            ld.*,
+            ROW_NUMBER() OVER (
+                PARTITION BY ld.sd_setup_id, ld.num_spec_tokens, ld.rps, ld.concurrency
+                ORDER BY ld.date DESC, ld.ld_performance_id DESC
+            ) AS run_rank
+        FROM ld_performances ld
+    )
+    SELECT
+        ld.ld_performance_id,
+        ld.sd_setup_id,
+        tm.model_name AS target_model,
+        tq.quantization_type AS target_quantization,
+        dm.model_name AS draft_model,
+        dq.quantization_type AS draft_quantization,
+        ld.num_spec_tokens,
+        ld.rps,
+        ld.concurrency,
+        ld.run_rank,
+        ld.date,
+        ld.achieved_rps,
+        ld.latency_avg,
+        ld.latency_p90
+    FROM ranked ld
+    {SETUP_JOINS}
+    WHERE ld.run_rank <= ?
+    ORDER BY ld.sd_setup_id, ld.num_spec_tokens, ld.rps, ld.concurrency, ld.run_rank
+    """
+    return fetch_rows(db_name, query, (num_runs,))
+
+
+def get_ld_bucket_samples(db_name: str, num_runs: int) -> List[Dict[str, Any]]:
+    """
+    Get the mean latency of every non-empty request bucket of the runs of
+    `get_ld_run_history`
+    """
+    query = """
+    WITH ranked AS (
+        SELECT
+            ld_performance_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY sd_setup_id, num_spec_tokens, rps, concurrency
+                ORDER BY date DESC, ld_performance_id DESC
+            ) AS run_rank
+        FROM ld_performances
+    )
+    SELECT b.ld_performance_id, b.latency_avg
+    FROM ld_request_buckets b
+    JOIN ranked r ON b.ld_performance_id = r.ld_performance_id
+    WHERE r.run_rank <= ? AND b.num_requests > 0
+    """
+    return fetch_rows(db_name, query, (num_runs,))
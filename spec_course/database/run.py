@@ -1,12 +1,13 @@
 import argparse
 import os
 from pathlib import Path
-from typing import Tuple, Type
+from typing import List, Tuple, Type
 
-from spec_course.database.db import create_database
+from spec_course.database.db import create_database, db_path
 from spec_course.database.etl.accuracy import Accuracy
 from spec_course.database.etl.base import ETLBase
 from spec_course.database.etl.load_test_metrics import LoadTestETL
+from spec_course.database.etl.screen import Screen
 from spec_course.database.etl.sd_metrics import SDMetrics
 from spec_course.scripts.utils import setup_logger
 
@@ -19,12 +20,14 @@ def get_etl_class_and_file_pattern(etl_name: str) -> Tuple[Type[ETLBase], str]:
         "accuracy": Accuracy,
         "sd_metrics": SDMetrics,
         "load_test_metrics": LoadTestETL,
+        "screen": Screen,
     }
 
     etl_file_patterns = {
         "accuracy": "*/results_*.json",
         "sd_metrics": "sd_results_*.json",
         "load_test_metrics": "*",
+        "screen": "*/screen_results.json",
     }
 
     if etl_name not in etl_classes:
@@ -55,14 +58,14 @@ def process_files(
                 logger.error(f"Error processing {file_path}: {str(e)}")
 
 
-def main():
+def main(argv: List[str] | None = None):
     parser = argparse.ArgumentParser(description="Run ETL process for database")
     parser.add_argument(
         "--etl_class",
         type=str,
         required=True,
-        choices=["accuracy", "sd_metrics", "load_test_metrics"],
-        help="ETL class to use (e.g., accuracy, sd_metrics, load_test_metrics)",
+        choices=["accuracy", "sd_metrics", "load_test_metrics", "screen"],
+        help="ETL class to use (e.g., accuracy, sd_metrics, load_test_metrics, screen)",
     )
     parser.add_argument(
         "--data_dir",
@@ -71,18 +74,36 @@ def main():
         help="Directory containing data files to process",
     )
     parser.add_argument(
-        "--db_name", type=str, required=True, help="SQLite database name"
+        "--db_name",
+        type=str,
+        required=True,
+        help="SQLite database name, a .duckdb file or duckdb:// URI selects DuckDB",
+    )
+    parser.add_argument(
+        "--dry_run",
+        "--dry-run",
+        action="store_true",
+        help="List the files to process without writing to the database",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     data_dir = Path(args.data_dir)
 
     if not data_dir.exists():
         raise ValueError(f"Data directory does not exist: {data_dir}")
 
-    if not os.path.exists(args.db_name):
+    if args.dry_run:
+        etl_class, file_pattern = get_etl_class_and_file_pattern(args.etl_class)
+        num_files = sum(1 for _ in data_dir.glob(file_pattern))
+        logger.info(
+            f"Would process {num_files} {args.etl_class} files from {data_dir} "
+            f"into {args.db_name}"
+        )
+        return
+
+    if not os.path.exists(db_path(args.db_name)):
         logger.info(f"Creating new database: {args.db_name}")
-        create_database(args.db_name)
+    create_database(args.db_name)
 
     try:
         etl_class, file_pattern = get_etl_class_and_file_pattern(args.etl_class)
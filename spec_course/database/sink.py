@@ -0,0 +1,194 @@
+import os
+import queue
+import threading
+from itertools import count, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from spec_course.database.db import (
+    batch_connection,
+    create_database,
+    db_path,
+    insert_load_test_buckets,
+    insert_load_test_server_metrics,
+    insert_sd_request_acceptance,
+)
+from spec_course.database.etl.accuracy import Accuracy
+from spec_course.database.etl.load_test_metrics import LoadTestETL
+from spec_course.database.etl.screen import Screen
+from spec_course.database.etl.sd_metrics import SDMetrics
+from spec_course.scripts.utils import setup_logger
+
+logger = setup_logger(log_name="db_sink")
+
+# Queued items written per transaction, and per-request rows per queued chunk
+BATCH_SIZE = 64
+CHUNK_SIZE = 1000
+
+ETL_CLASSES = {
+    "accuracy": Accuracy,
+    "sd_metrics": SDMetrics,
+    "load_test_metrics": LoadTestETL,
+    "screen": Screen,
+}
+# Inserts of per-request rows under the ID of their record
+ROW_INSERTS = {
+    "sd_request_acceptance": insert_sd_request_acceptance,
+    "ld_request_buckets": insert_load_test_buckets,
+    "ld_server_metrics": insert_load_test_server_metrics,
+}
+# Per-request fields of transformed records that are queued as row chunks:
+# ETL class -> {field: table}
+ROW_FIELDS = {
+    "sd_metrics": {"request_acceptance": "sd_request_acceptance"},
+    "load_test_metrics": {
+        "request_buckets": "ld_request_buckets",
+        "server_metrics": "ld_server_metrics",
+    },
+}
+
+
+class DatabaseSink:
+    """
+    Single writer of a database for the runners. Records put by any thread are
+    queued and written by a background thread, which loads everything queued
+    at that moment in one transaction, so the database is current as soon as
+    a setup ends without rescanning the result folders. The result files stay
+    as the archival copy and can still be ingested with `database/run.py`.
+
+    A runner can also open the record of a setup when it starts, put the
+    per-request rows under it while the setup runs, and complete it with the
+    result file at the end.
+    """
+
+    def __init__(
+        self, db_name: str, batch_size: int = BATCH_SIZE, chunk_size: int = CHUNK_SIZE
+    ) -> None:
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        if not os.path.exists(db_path(db_name)):
+            logger.info(f"Creating new database: {db_name}")
+        create_database(db_name)
+        self.queue: queue.Queue = queue.Queue()
+        self.keys = count()
+        # IDs of the main rows of written records, for their per-request rows
+        self.record_ids: Dict[int, Any] = {}
+        self.num_written = 0
+        self.num_failed = 0
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def put_record(
+        self,
+        etl_name: str,
+        data: Dict[Any, Any],
+        rows: Dict[str, Iterable[Dict[str, Any]]] | None = None,
+    ) -> None:
+        """
+        Queue a record transformed by an ETL class, then its per-request rows
+        (table -> rows) in chunks inserted under the ID of the record
+        """
+        key = next(self.keys)
+        self.queue.put(("record", key, etl_name, data))
+        for table, table_rows in (rows or {}).items():
+            self.put_rows(key, table, table_rows)
+
+    def open_record(self, etl_name: str, setup: Dict[str, Any]) -> int:
+        """
+        Queue the main row of a setup that has just started, see
+        `ETLBase.open_record`, and return the key to put its rows and result under
+        """
+        key = next(self.keys)
+        self.queue.put(("open", key, etl_name, setup))
+        return key
+
+    def put_rows(self, key: int, table: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Queue per-request rows in chunks inserted under the ID of a record"""
+        iterator = iter(rows)
+        while chunk := list(islice(iterator, self.chunk_size)):
+            self.queue.put(("rows", key, table, chunk))
+
+    def put_file(
+        self, etl_name: str, file_path: Path | str, key: int | None = None
+    ) -> None:
+        """
+        Transform a result file or folder a runner has just written and queue it.
+        With the key of an open record, the record is completed and its
+        per-request rows, already put by the runner, are not read again.
+        Errors are logged, so that a failed write does not fail the run.
+        """
+        try:
+            data = ETL_CLASSES[etl_name](self.db_name).transform_file(file_path)
+            row_fields = ROW_FIELDS.get(etl_name, {})
+            rows = {table: data[field] for field, table in row_fields.items()}
+            data = {**data, **{field: [] for field in row_fields}}
+            if key is None:
+                self.put_record(etl_name, data, rows)
+            else:
+                self.queue.put(("record", key, etl_name, data))
+        except Exception as e:
+            logger.error(f"Error queueing {file_path}: {str(e)}")
+
+    def flush(self) -> None:
+        """Wait until everything queued so far is written"""
+        self.queue.join()
+
+    def close(self) -> None:
+        """Write everything queued and stop the writer"""
+        self.queue.put(None)
+        self.thread.join()
+        logger.info(
+            f"Wrote {self.num_written} records and row chunks to {self.db_name}, "
+            f"{self.num_failed} failed"
+        )
+
+    def __enter__(self) -> "DatabaseSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _write(self) -> None:
+        stopped = False
+        while not stopped:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopped = None in batch
+            self._write_batch([item for item in batch if item is not None])
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write_batch(self, items: List[Tuple[str, int, str, Any]]) -> None:
+        if not items:
+            return
+        try:
+            with batch_connection(self.db_name):
+                for item in items:
+                    self._write_item(item)
+            self.num_written += len(items)
+        except Exception as e:
+            if len(items) == 1:
+                self.num_failed += 1
+                kind, key, name, _ = items[0]
+                logger.error(f"Error writing {kind} {key} of {name}: {str(e)}")
+                return
+            # Rolled back: write the items one by one to drop only the bad ones
+            for item in items:
+                self._write_batch([item])
+
+    def _write_item(self, item: Tuple[str, int, str, Any]) -> None:
+        kind, key, name, payload = item
+        if kind == "open":
+            etl = ETL_CLASSES[name](self.db_name)
+            self.record_ids[key] = etl.open_record(payload)
+        elif kind == "record":
+            # Completes the record opened under the key, if any
+            etl = ETL_CLASSES[name](self.db_name)
+            self.record_ids[key] = etl.load_record(payload, self.record_ids.get(key))
+        else:
+            ROW_INSERTS[name](self.db_name, self.record_ids[key], payload)
@@ -0,0 +1,146 @@
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Number of bins of the per-request mean acceptance length histogram
+REQUEST_HISTOGRAM_BINS = 20
+PROMPT_PREVIEW_CHARS = 200
+
+
+def acceptance_matrix(
+    per_request_counts: Sequence[Sequence[int] | None], num_spec_tokens: int
+) -> np.ndarray:
+    """
+    Stack per-request `spec_token_acceptance_counts` into a (requests, k + 1) array.
+    Column 0 counts decoding steps, column i the steps whose i-th draft token was
+    accepted. Requests without counts get a zero row.
+    """
+    matrix = np.zeros((len(per_request_counts), num_spec_tokens + 1), dtype=np.int32)
+    for row, counts in enumerate(per_request_counts):
+        if counts:
+            matrix[row, : len(counts)] = counts[: num_spec_tokens + 1]
+    return matrix
+
+
+def step_acceptance_matrix(
+    accepted: np.ndarray, starts: np.ndarray, ends: np.ndarray, num_spec_tokens: int
+) -> np.ndarray:
+    """
+    Acceptance counts (requests, k + 1) of greedy speculative decoding, given the
+    number of draft tokens accepted by a step at every position of a token buffer.
+    Request i generates positions starts[i] to ends[i] (excluded), every step
+    emits its accepted tokens plus one target token. All requests step together.
+    """
+    matrix = np.zeros((len(starts), num_spec_tokens + 1), dtype=np.int32)
+    position = np.array(starts, dtype=np.int64)
+    active = np.flatnonzero(position < ends)
+    columns = np.arange(1, num_spec_tokens + 1)
+    while len(active):
+        step_accepted = accepted[position[active]]
+        matrix[active, 0] += 1
+        matrix[active, 1:] += columns <= step_accepted[:, None]
+        position[active] += step_accepted + 1
+        active = active[position[active] < ends[active]]
+    return matrix
+
+
+def teacher_forced_acceptance(
+    draft_matches: np.ndarray, num_spec_tokens: int
+) -> List[int]:
+    """
+    Acceptance counts of one request from whether the greedy draft prediction of
+    every output token, given the true prefix, matched it. Accepted drafts keep
+    the draft context equal to the true prefix, so a step at position t accepts
+    the matches in a row from t, at most k and the tokens left but one.
+    """
+    num_tokens = len(draft_matches)
+    positions = np.arange(num_tokens)
+    accepted = np.zeros(num_tokens, dtype=np.int64)
+    alive = np.ones(num_tokens, dtype=bool)
+    for i in range(num_spec_tokens):
+        alive &= (positions + i < num_tokens - 1) & draft_matches[
+            np.minimum(positions + i, num_tokens - 1)
+        ]
+        accepted += alive
+    return step_acceptance_matrix(
+        accepted, np.array([0]), np.array([num_tokens]), num_spec_tokens
+    )[0].tolist()
+
+
+def save_acceptance_matrix(matrix: np.ndarray, output_path: Path) -> None:
+    np.save(output_path, matrix)
+
+
+def load_acceptance_matrix(file_path: Path | str) -> np.ndarray:
+    return np.load(file_path)
+
+
+def request_acceptance_lengths(matrix: np.ndarray) -> np.ndarray:
+    """Mean number of tokens emitted per step for every request, NaN without steps"""
+    steps = matrix[:, 0].astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(steps > 0, matrix.sum(axis=1) / steps, np.nan)
+
+
+def step_length_histogram(matrix: np.ndarray) -> List[int]:
+    """
+    Number of steps in which exactly 0..k draft tokens were accepted, summed over
+    requests. A step accepting j tokens counts for positions 1..j only, so the
+    histogram is the difference of consecutive position counts.
+    """
+    totals = matrix.sum(axis=0).astype(np.int64)
+    return np.append(totals[:-1] - totals[1:], totals[-1]).tolist()
+
+
+def request_length_histogram(
+    lengths: np.ndarray, num_spec_tokens: int, bins: int = REQUEST_HISTOGRAM_BINS
+) -> Dict[str, List[float]]:
+    """Histogram of per-request mean acceptance lengths over [1, k + 1]"""
+    counts, edges = np.histogram(
+        lengths[~np.isnan(lengths)], bins=bins, range=(1, num_spec_tokens + 1)
+    )
+    return {"bin_edges": edges.tolist(), "counts": counts.tolist()}
+
+
+def acceptance_summary(matrix: np.ndarray, num_spec_tokens: int) -> Dict[str, Any]:
+    """Mean acceptance length, per-position acceptance rates and both histograms"""
+    acceptance_counts = matrix.sum(axis=0)
+    return {
+        "mean_acceptance_length": float(acceptance_counts.sum() / acceptance_counts[0]),
+        "acceptance_rates": (acceptance_counts / acceptance_counts[0]).tolist(),
+        "step_length_histogram": step_length_histogram(matrix),
+        "request_length_histogram": request_length_histogram(
+            request_acceptance_lengths(matrix), num_spec_tokens
+        ),
+    }
+
+
+def worst_prompts(
+    lengths: np.ndarray,
+    matrix: np.ndarray,
+    prompts: List[str],
+    top_k: int,
+    prompt_indices: np.ndarray | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Requests with the lowest mean acceptance length, worst first. Prompt indices
+    refer to the dataset when the indices of the run prompts are given.
+    """
+    valid = np.flatnonzero(~np.isnan(lengths))
+    top_k = min(top_k, len(valid))
+    if top_k == 0:
+        return []
+    worst = valid[np.argpartition(lengths[valid], top_k - 1)[:top_k]]
+    worst = worst[np.argsort(lengths[worst], kind="stable")]
+    return [
+        {
+            "prompt_index": int(
+                index if prompt_indices is None else prompt_indices[index]
+            ),
+            "mean_acceptance_length": float(lengths[index]),
+            "num_steps": int(matrix[index, 0]),
+            "prompt": prompts[index][:PROMPT_PREVIEW_CHARS],
+        }
+        for index in worst
+    ]
@@ -0,0 +1,183 @@
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from spec_course.scripts.utils import parse_duration
+
+ARRIVAL_PROCESSES = ["constant", "poisson", "gamma", "ramp", "on-off"]
+
+
+def _renewal_offsets(
+    sample_gaps: Callable[[int], np.ndarray], rate: float, duration: float
+) -> np.ndarray:
+    """Cumulate sampled inter-arrival gaps until they cover the duration"""
+    expected = rate * duration
+    batch_size = int(expected + 5 * np.sqrt(expected) + 16)
+    offsets = np.cumsum(sample_gaps(batch_size))
+    while offsets[-1] < duration:
+        more = offsets[-1] + np.cumsum(sample_gaps(batch_size))
+        offsets = np.concatenate([offsets, more])
+    return offsets[offsets < duration]
+
+
+def poisson_offsets(
+    rate: float, duration: float, rng: np.random.Generator
+) -> np.ndarray:
+    """Arrivals with exponentially distributed gaps"""
+    return _renewal_offsets(lambda n: rng.exponential(1 / rate, n), rate, duration)
+
+
+def gamma_offsets(
+    rate: float, cv: float, duration: float, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Arrivals with Gamma distributed gaps and a given coefficient of variation.
+    cv=1 is a Poisson process, larger values make the traffic burstier.
+    """
+    shape = 1 / cv**2
+    scale = 1 / (rate * shape)
+    return _renewal_offsets(lambda n: rng.gamma(shape, scale, n), rate, duration)
+
+
+def _thinned_offsets(
+    rate_at: Callable[[np.ndarray], np.ndarray],
+    max_rate: float,
+    duration: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Non-homogeneous Poisson arrivals by thinning a process with max_rate"""
+    candidates = poisson_offsets(max_rate, duration, rng)
+    keep = rng.random(len(candidates)) * max_rate < rate_at(candidates)
+    return candidates[keep]
+
+
+def ramp_offsets(
+    stages: List[Tuple[float, float]], rng: np.random.Generator, start_rate: float = 0
+) -> np.ndarray:
+    """
+    Poisson arrivals whose rate changes linearly to each stage's target rate
+    over the stage duration, like k6's ramping-arrival-rate stages.
+    """
+    ends = np.cumsum([duration for _, duration in stages])
+    times = np.concatenate([[0.0], ends])
+    rates = np.array([start_rate] + [rate for rate, _ in stages], dtype=float)
+    max_rate = rates.max()
+    if max_rate <= 0:
+        return np.array([])
+    return _thinned_offsets(
+        lambda t: np.interp(t, times, rates), max_rate, ends[-1], rng
+    )
+
+
+def on_off_offsets(
+    rate: float,
+    on_seconds: float,
+    off_seconds: float,
+    duration: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Poisson bursts at `rate` for on_seconds followed by off_seconds of silence"""
+    period = on_seconds + off_seconds
+    return _thinned_offsets(
+        lambda t: np.where(t % period < on_seconds, rate, 0.0), rate, duration, rng
+    )
+
+
+def parse_stages(stages: str) -> List[Tuple[float, float]]:
+    """Parse ramp stages in the `rate:duration,...` format, e.g. `5:30s,15:1m`"""
+    parsed = []
+    for stage in stages.split(","):
+        try:
+            rate, duration = stage.split(":")
+            parsed.append((float(rate), parse_duration(duration)))
+        except ValueError:
+            raise ValueError(
+                f"Invalid ramp stage: {stage}. Expected format is 'rate:duration'."
+            )
+    return parsed
+
+
+def build_arrival_offsets(
+    process: str,
+    rate: float,
+    duration: float,
+    seed: int,
+    cv: float = 1.0,
+    stages: List[Tuple[float, float]] | None = None,
+    on_seconds: float = 0.0,
+    off_seconds: float = 0.0,
+) -> np.ndarray:
+    """Precompute a seeded schedule of request offsets in seconds"""
+    if process not in ARRIVAL_PROCESSES[1:]:
+        raise ValueError(
+            f"Unknown arrival process: {process}. Available: {ARRIVAL_PROCESSES}"
+        )
+    if process == "ramp":
+        if not stages:
+            raise ValueError("Ramp arrival process requires stages")
+        for stage_rate, stage_duration in stages:
+            if stage_rate < 0:
+                raise ValueError(f"Ramp stage rate must be non-negative: {stage_rate}")
+            if stage_duration <= 0:
+                raise ValueError(
+                    f"Ramp stage duration must be positive: {stage_duration}"
+                )
+        if max(stage_rate for stage_rate, _ in stages) <= 0:
+            raise ValueError(
+                "Ramp arrival process requires a stage with a positive rate"
+            )
+    else:
+        if rate <= 0:
+            raise ValueError(f"Arrival rate must be positive: {rate}")
+        if duration <= 0:
+            raise ValueError(f"Arrival duration must be positive: {duration}")
+    if process == "gamma" and cv <= 0:
+        raise ValueError(f"Gamma arrival cv must be positive: {cv}")
+    if process == "on-off":
+        if on_seconds <= 0:
+            raise ValueError("On-off arrival process requires a positive on period")
+        if off_seconds < 0:
+            raise ValueError(f"On-off off period must be non-negative: {off_seconds}")
+
+    rng = np.random.default_rng(seed)
+    if process == "poisson":
+        return poisson_offsets(rate, duration, rng)
+    if process == "gamma":
+        return gamma_offsets(rate, cv, duration, rng)
+    if process == "ramp":
+        return ramp_offsets(stages, rng)
+    return on_off_offsets(rate, on_seconds, off_seconds, duration, rng)
+
+
+def sample_requests(
+    offsets: np.ndarray,
+    max_tokens_mean: int,
+    max_tokens_std: int,
+    prompt_len_mean: int,
+    prompt_len_std: int,
+    seed: int,
+    corpus_size: int = 0,
+) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """
+    Attach precomputed request shapes to scheduled offsets, so the load generator
+    does no random sampling per request. With a prompt corpus, requests point to
+    a random corpus entry instead of a prompt length.
+    """
+    rng = np.random.default_rng(seed)
+    num_requests = len(offsets)
+    max_tokens = np.maximum(
+        1, np.rint(rng.normal(max_tokens_mean, max_tokens_std, num_requests))
+    ).astype(int)
+    if corpus_size:
+        prompts = rng.integers(0, corpus_size, num_requests)
+        prompt_key = "corpus_index"
+    else:
+        prompts = np.maximum(
+            10, np.rint(rng.normal(prompt_len_mean, prompt_len_std, num_requests))
+        ).astype(int)
+        prompt_key = "prompt_len"
+
+    for offset, tokens, prompt in zip(
+        offsets.tolist(), max_tokens.tolist(), prompts.tolist()
+    ):
+        yield offset, {"max_tokens": tokens, prompt_key: prompt}
@@ -0,0 +1,174 @@
+import contextlib
+import gc
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from spec_course.scripts.acceptance import teacher_forced_acceptance
+from spec_course.scripts.utils import setup_logger
+
+logger = setup_logger(log_name="sd_backends")
+
+MAX_OUTPUT_TOKENS = 256
+
+
+@dataclass
+class GenerationOutput:
+    prompt_token_ids: List[int]
+    token_ids: List[int]
+    # [steps, steps accepting the 1st draft token, ..., the k-th], None without draft
+    spec_token_acceptance_counts: Optional[List[int]] = None
+
+
+class GenerationBackend:
+    """
+    Greedy chat generation of one prompt at a time with draft acceptance counts.
+    `server_args` follow the vLLM engine arguments: `model` and an optional
+    `speculative_config` with the draft `model` and `num_speculative_tokens`.
+    """
+
+    def __init__(self, server_args: Dict[str, Any]) -> None:
+        self.server_args = server_args
+
+    def generate(self, message: List[Dict[str, str]]) -> GenerationOutput:
+        """Generate the reply to a chat message, the part that is timed"""
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def measure_acceptance(self, output: GenerationOutput) -> None:
+        """Fill the acceptance counts of an output if generation did not"""
+
+    def close(self) -> None:
+        """Free the model and its memory"""
+
+
+class VLLMBackend(GenerationBackend):
+    def __init__(self, server_args: Dict[str, Any]) -> None:
+        from vllm import LLM, SamplingParams
+
+        super().__init__(server_args)
+        self.llm = LLM(**server_args)
+        self.sampling_params = SamplingParams(
+            temperature=0, max_tokens=MAX_OUTPUT_TOKENS
+        )
+
+    def generate(self, message: List[Dict[str, str]]) -> GenerationOutput:
+        output = self.llm.chat(message, self.sampling_params)[0]
+        return GenerationOutput(
+            prompt_token_ids=list(output.prompt_token_ids),
+            token_ids=list(output.outputs[0].token_ids),
+            spec_token_acceptance_counts=output.metrics.spec_token_acceptance_counts,
+        )
+
+    def close(self) -> None:
+        """Clean up vLLM resources"""
+        import ray
+        import torch
+        from vllm.distributed.parallel_state import (
+            destroy_distributed_environment,
+            destroy_model_parallel,
+        )
+
+        destroy_model_parallel()
+        destroy_distributed_environment()
+        del self.llm
+        with contextlib.suppress(AssertionError):
+            torch.distributed.destroy_process_group()
+        gc.collect()
+        torch.cuda.empty_cache()
+        ray.shutdown()
+        logger.info("Successfully delete the llm pipeline and free the GPU memory.")
+
+
+class HFBackend(GenerationBackend):
+    """
+    Transformers assisted generation, on CPU without a GPU. The draft proposes a
+    constant `num_speculative_tokens` per step. Acceptance counts come from one
+    teacher-forced draft pass over the output after generation, which gives the
+    exact greedy acceptance of a draft with k tokens per step, as vLLM reports.
+    Other vLLM engine arguments are ignored.
+    """
+
+    def __init__(self, server_args: Dict[str, Any]) -> None:
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        super().__init__(server_args)
+        self.torch = torch
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        torch_dtype = "auto" if self.device == "cuda" else torch.float32
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            server_args.get("tokenizer", server_args["model"])
+        )
+        self.model = AutoModelForCausalLM.from_pretrained(
+            server_args["model"], torch_dtype=torch_dtype
+        ).to(self.device)
+        self.model.eval()
+        # Pad id 0 is valid, only a missing one falls back to eos
+        self.pad_token_id = self.tokenizer.pad_token_id
+        if self.pad_token_id is None:
+            self.pad_token_id = self.tokenizer.eos_token_id
+
+        self.draft_model = None
+        self.num_spec_tokens = None
+        spec_config = server_args.get("speculative_config")
+        if spec_config:
+            self.num_spec_tokens = spec_config["num_speculative_tokens"]
+            self.draft_model = AutoModelForCausalLM.from_pretrained(
+                spec_config["model"], torch_dtype=torch_dtype
+            ).to(self.device)
+            self.draft_model.eval()
+            generation_config = self.draft_model.generation_config
+            generation_config.num_assistant_tokens = self.num_spec_tokens
+            generation_config.num_assistant_tokens_schedule = "constant"
+            # Draft all k tokens, whatever the draft confidence
+            generation_config.assistant_confidence_threshold = 0
+
+    def generate(self, message: List[Dict[str, str]]) -> GenerationOutput:
+        input_ids = self.tokenizer.apply_chat_template(
+            message, add_generation_prompt=True, return_tensors="pt"
+        ).to(self.device)
+        with self.torch.no_grad():
+            sequences = self.model.generate(
+                input_ids,
+                attention_mask=self.torch.ones_like(input_ids),
+                assistant_model=self.draft_model,
+                do_sample=False,
+                max_new_tokens=MAX_OUTPUT_TOKENS,
+                pad_token_id=self.pad_token_id,
+            )
+        prompt_length = input_ids.shape[1]
+        return GenerationOutput(
+            prompt_token_ids=sequences[0, :prompt_length].tolist(),
+            token_ids=sequences[0, prompt_length:].tolist(),
+        )
+
+    def measure_acceptance(self, output: GenerationOutput) -> None:
+        if self.draft_model is None or output.spec_token_acceptance_counts:
+            return
+        sequence = self.torch.tensor(
+            [output.prompt_token_ids + output.token_ids], device=self.device
+        )
+        with self.torch.no_grad():
+            logits = self.draft_model(sequence).logits[0]
+        # Draft predictions of the output tokens from the true prefix
+        prompt_length = len(output.prompt_token_ids)
+        predictions = logits[prompt_length - 1 : -1].argmax(dim=-1).cpu().numpy()
+        output.spec_token_acceptance_counts = teacher_forced_acceptance(
+            predictions == np.array(output.token_ids), self.num_spec_tokens
+        )
+
+    def close(self) -> None:
+        del self.model, self.draft_model
+        gc.collect()
+        if self.device == "cuda":
+            self.torch.cuda.empty_cache()
+
+
+BACKENDS = {"vllm": VLLMBackend, "hf": HFBackend}
+
+
+def create_backend(backend: str, server_args: Dict[str, Any]) -> GenerationBackend:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}. Available: {list(BACKENDS)}")
+    return BACKENDS[backend](server_args)
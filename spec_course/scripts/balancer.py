@@ -0,0 +1,264 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from spec_course.scripts.http_utils import (
+    format_response,
+    http_request,
+    read_http_message,
+)
+
+BALANCER_POLICIES = ["round_robin", "least_outstanding", "token_aware"]
+# Initial decode speed of a request until the replica reports real ones
+DEFAULT_TOKENS_PER_SECOND = 50.0
+# Smoothing factor for the per-replica decode speed estimate
+SPEED_EMA_ALPHA = 0.2
+REQUEST_TIMEOUT = 300
+
+
+@dataclass
+class Replica:
+    host: str
+    port: int
+    outstanding: int = 0
+    # request id -> (start time, estimated output tokens)
+    in_flight: Dict[int, Tuple[float, int]] = field(default_factory=dict)
+    tokens_per_second: float = DEFAULT_TOKENS_PER_SECOND
+    num_requests: int = 0
+    num_errors: int = 0
+    latency_sum: float = 0.0
+    latency_max: float = 0.0
+    max_outstanding: int = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def remaining_tokens(self, now: float) -> float:
+        """Estimated number of tokens the replica still has to generate"""
+        return sum(
+            max(0.0, tokens - (now - start) * self.tokens_per_second)
+            for start, tokens in self.in_flight.values()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        completed = self.num_requests - self.num_errors
+        return {
+            "url": self.url,
+            "num_requests": self.num_requests,
+            "num_errors": self.num_errors,
+            "mean_latency": self.latency_sum / completed if completed else None,
+            "max_latency": self.latency_max,
+            "max_outstanding": self.max_outstanding,
+            "tokens_per_second": self.tokens_per_second,
+        }
+
+    def reset_stats(self) -> None:
+        self.num_requests = 0
+        self.num_errors = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.max_outstanding = self.outstanding
+
+
+class RoundRobinPolicy:
+    def __init__(self) -> None:
+        self.counter = itertools.count()
+
+    def choose(self, replicas: List[Replica], request_tokens: int) -> Replica:
+        return replicas[next(self.counter) % len(replicas)]
+
+
+class LeastOutstandingPolicy:
+    def choose(self, replicas: List[Replica], request_tokens: int) -> Replica:
+        return min(replicas, key=lambda replica: replica.outstanding)
+
+
+class TokenAwarePolicy:
+    """
+    Pick the replica expected to finish the request first: its tokens left to
+    generate plus the request's, divided by its decode speed
+    """
+
+    def choose(self, replicas: List[Replica], request_tokens: int) -> Replica:
+        now = time.monotonic()
+        return min(
+            replicas,
+            key=lambda replica: (replica.remaining_tokens(now) + request_tokens)
+            / replica.tokens_per_second,
+        )
+
+
+def create_policy(name: str):
+    policies = {
+        "round_robin": RoundRobinPolicy,
+        "least_outstanding": LeastOutstandingPolicy,
+        "token_aware": TokenAwarePolicy,
+    }
+    if name not in policies:
+        raise ValueError(
+            f"Unknown balancer policy: {name}. Available: {list(policies)}"
+        )
+    return policies[name]()
+
+
+def estimate_output_tokens(body: bytes) -> int:
+    """Estimate the output length of a chat completion request from max_tokens"""
+    try:
+        return int(json.loads(body).get("max_tokens") or 0)
+    except (ValueError, TypeError, AttributeError):
+        return 0
+
+
+class LoadBalancer:
+    """
+    Asyncio HTTP load balancer in front of several OpenAI-compatible replicas.
+    Requests are proxied as a whole, so streaming responses are not supported.
+    """
+
+    def __init__(self, replica_urls: List[str], policy: str = "least_outstanding"):
+        self.replicas = []
+        for url in replica_urls:
+            host, port = url.removeprefix("http://").rstrip("/").split(":")
+            self.replicas.append(Replica(host, int(port)))
+        self.policy = create_policy(policy)
+        self.request_ids = itertools.count()
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening and return the bound port"""
+        self.server = await asyncio.start_server(self._handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [replica.stats() for replica in self.replicas]
+
+    def reset_stats(self) -> None:
+        for replica in self.replicas:
+            replica.reset_stats()
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_http_message(reader)
+                except ValueError:
+                    # Malformed Content-Length or chunk size
+                    writer.write(
+                        format_response(
+                            400, b'{"error": "bad request"}', keep_alive=False
+                        )
+                    )
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                if request.method == "GET" and request.path == "/health":
+                    status, body = 200, b""
+                else:
+                    status, body = await self._forward(request)
+                writer.write(
+                    format_response(status, body, keep_alive=request.keep_alive)
+                )
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _forward(self, request) -> Tuple[int, bytes]:
+        output_tokens = estimate_output_tokens(request.body)
+        replica = self.policy.choose(self.replicas, output_tokens)
+        request_id = next(self.request_ids)
+        start = time.monotonic()
+
+        replica.outstanding += 1
+        replica.max_outstanding = max(replica.max_outstanding, replica.outstanding)
+        replica.in_flight[request_id] = (start, output_tokens)
+        replica.num_requests += 1
+        try:
+            response = await http_request(
+                replica.host,
+                replica.port,
+                request.method,
+                request.path,
+                request.body,
+                timeout=REQUEST_TIMEOUT,
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            replica.num_errors += 1
+            return 502, b'{"error": "replica unavailable"}'
+        finally:
+            replica.outstanding -= 1
+            replica.in_flight.pop(request_id, None)
+
+        latency = time.monotonic() - start
+        if response.status != 200:
+            replica.num_errors += 1
+            return response.status, response.body
+
+        replica.latency_sum += latency
+        replica.latency_max = max(replica.latency_max, latency)
+        self._update_speed(replica, response.body, latency)
+        return response.status, response.body
+
+    @staticmethod
+    def _update_speed(replica: Replica, body: bytes, latency: float) -> None:
+        try:
+            completion_tokens = json.loads(body)["usage"]["completion_tokens"]
+        except (ValueError, KeyError, TypeError):
+            return
+        if completion_tokens and latency > 0:
+            speed = completion_tokens / latency
+            replica.tokens_per_second += SPEED_EMA_ALPHA * (
+                speed - replica.tokens_per_second
+            )
+
+
+class BalancerThread:
+    """Run a LoadBalancer on its own event loop in a background thread"""
+
+    def __init__(self, balancer: LoadBalancer, host: str, port: int):
+        self.balancer = balancer
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self) -> int:
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self.balancer.start(self.host, self.port), self.loop
+        )
+        self.port = future.result()
+        return self.port
+
+    def collect_stats(self, reset: bool = True) -> List[Dict[str, Any]]:
+        """Return per-replica stats collected since the previous call"""
+
+        async def _collect():
+            stats = self.balancer.stats()
+            if reset:
+                self.balancer.reset_stats()
+            return stats
+
+        return asyncio.run_coroutine_threadsafe(_collect(), self.loop).result()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.balancer.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,262 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from spec_course.scripts.acceptance import (
+    acceptance_summary,
+    save_acceptance_matrix,
+    step_acceptance_matrix,
+)
+from spec_course.scripts.token_store import load_token_store
+from spec_course.scripts.utils import setup_logger
+
+logger = setup_logger(log_name="drafter_replay")
+
+# Fields of a run that do not hold for a replay of its tokens with another drafter
+REPLAY_RESET_FIELDS = [
+    "time_taken",
+    "acceptance_counts_file",
+    "worst_prompts",
+    "acceptance_length_estimate",
+    "acceptance_length_stderr",
+    "time_per_token_estimate",
+    "time_per_token_stderr",
+    "acceptance_length_ci_half_width",
+    "time_per_token_ci_half_width",
+    "repetition_times",
+    "time_mean",
+    "time_std",
+    "time_min",
+    "tokens_per_second_mean",
+    "tokens_per_second_std",
+    "tokens_per_second_min",
+    "config_hash",
+    "token_ids_file",
+    "token_offsets_file",
+]
+
+
+def request_ids(offsets: np.ndarray, num_tokens: int) -> np.ndarray:
+    """Request of every position of the token buffer"""
+    return np.repeat(np.arange(len(offsets)), offsets[:, 1] + offsets[:, 2])[
+        :num_tokens
+    ]
+
+
+def ngram_draft_starts(tokens: np.ndarray, requests: np.ndarray, n: int) -> np.ndarray:
+    """
+    For every buffer position t, the start of the draft proposed from the context
+    before t: the tokens after the first earlier occurrence of the last n context
+    tokens within the same request, as the vLLM n-gram proposer does. -1 without
+    a match.
+    """
+    num_tokens = len(tokens)
+    draft_starts = np.full(num_tokens, -1, dtype=np.int64)
+    if num_tokens <= n:
+        return draft_starts
+    windows = np.lib.stride_tricks.sliding_window_view(tokens, n)[:-1]
+    # A window only matches windows of the same request, crossing ones never match
+    window_requests = np.where(
+        requests[: len(windows)] == requests[n:], requests[: len(windows)], -1
+    )
+    # Stable sort by request and n-gram, so every group starts with the first
+    # occurrence of its n-gram
+    order = np.lexsort(
+        tuple(windows[:, i] for i in reversed(range(n))) + (window_requests,)
+    )
+    sorted_requests, sorted_windows = window_requests[order], windows[order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (sorted_requests[1:] != sorted_requests[:-1]) | (
+        sorted_windows[1:] != sorted_windows[:-1]
+    ).any(axis=1)
+    first_windows = np.empty_like(order)
+    first_windows[order] = order[new_group][np.cumsum(new_group) - 1]
+    # Window w is the context suffix of position w + n
+    positions = np.arange(len(windows))
+    matched = (window_requests >= 0) & (first_windows < positions)
+    draft_starts[positions[matched] + n] = first_windows[matched] + n
+    return draft_starts
+
+
+def ngram_acceptance_matrix(
+    tokens: np.ndarray,
+    offsets: np.ndarray,
+    num_spec_tokens: int,
+    prompt_lookup_min: int = 1,
+    prompt_lookup_max: int = 4,
+) -> np.ndarray:
+    """
+    Acceptance counts (requests, k + 1) that an n-gram drafter would reach on the
+    saved outputs under greedy verification, which reproduces the target outputs
+    whatever the drafts. Every step emits the accepted draft tokens plus one target
+    token. The longest n-gram from prompt_lookup_max down to prompt_lookup_min with
+    an earlier occurrence gives the draft; steps without one emit a single token.
+    Drafts of all positions are checked at once.
+    """
+    tokens = np.asarray(tokens, dtype=np.int64)
+    requests = request_ids(offsets, len(tokens))
+    request_ends = offsets[:, 0] + offsets[:, 1] + offsets[:, 2]
+
+    draft_starts = np.full(len(tokens), -1, dtype=np.int64)
+    for n in range(prompt_lookup_min, prompt_lookup_max + 1):
+        ngram_starts = ngram_draft_starts(tokens, requests, n)
+        draft_starts = np.where(ngram_starts >= 0, ngram_starts, draft_starts)
+
+    # Accepted draft tokens when position t is the next one to generate. Drafts
+    # running past the context repeat its last token, the step emits at most the
+    # tokens left in the output.
+    positions = np.arange(len(tokens))
+    max_accepted = np.minimum(
+        num_spec_tokens, request_ends[requests] - positions - 1
+    ).clip(min=0)
+    accepted = np.zeros(len(tokens), dtype=np.int64)
+    alive = draft_starts >= 0
+    for i in range(num_spec_tokens):
+        draft_tokens = tokens[np.minimum(draft_starts + i, positions - 1)]
+        target_tokens = tokens[np.minimum(positions + i, len(tokens) - 1)]
+        alive &= (i < max_accepted) & (draft_tokens == target_tokens)
+        accepted += alive
+
+    return step_acceptance_matrix(
+        accepted, offsets[:, 0] + offsets[:, 1], request_ends, num_spec_tokens
+    )
+
+
+def drafter_name(
+    num_spec_tokens: int, prompt_lookup_min: int, prompt_lookup_max: int
+) -> str:
+    return f"ngram_k{num_spec_tokens}_n{prompt_lookup_min}_{prompt_lookup_max}"
+
+
+def replay_run(
+    result_path: Path,
+    output_dir: Path,
+    num_spec_tokens: int,
+    prompt_lookup_min: int,
+    prompt_lookup_max: int,
+) -> Tuple[Path, Dict[str, Any]]:
+    """
+    Replay an n-gram drafter on the tokens of a run and save the result with its
+    acceptance counts in the format of `run_sd.py` results, for the SD ETL
+    """
+    with open(result_path, "r") as f:
+        result = json.load(f)
+    tokens, offsets = load_token_store(
+        result_path.parent / result["token_ids_file"],
+        result_path.parent / result["token_offsets_file"],
+    )
+    matrix = ngram_acceptance_matrix(
+        tokens, offsets, num_spec_tokens, prompt_lookup_min, prompt_lookup_max
+    )
+
+    name = drafter_name(num_spec_tokens, prompt_lookup_min, prompt_lookup_max)
+    suffix = f"{result_path.stem.removeprefix('sd_results_')}_{name}"
+    counts_file = output_dir / f"acceptance_counts_{suffix}.npy"
+    save_acceptance_matrix(matrix, counts_file)
+
+    replay = {
+        **result,
+        **{field: None for field in REPLAY_RESET_FIELDS},
+        **acceptance_summary(matrix, num_spec_tokens),
+        "speculative_model": name,
+        "acceptance_counts_file": counts_file.name,
+        "warmup_iterations": 0,
+        "repetitions": 0,
+        "drafter": {
+            "method": "ngram",
+            "num_speculative_tokens": num_spec_tokens,
+            "prompt_lookup_min": prompt_lookup_min,
+            "prompt_lookup_max": prompt_lookup_max,
+        },
+        "replay_of": result_path.name,
+    }
+    output_file = output_dir / f"sd_results_{suffix}.json"
+    with open(output_file, "w") as f:
+        json.dump(replay, f, indent=2)
+    return output_file, replay
+
+
+def parse_int_list(values: str) -> List[int]:
+    return [int(value) for value in values.split(",")]
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Replay n-gram drafters on the saved tokens of SD runs on CPU"
+    )
+    parser.add_argument(
+        "--results_dir",
+        type=str,
+        default="results/sd_experiments",
+        help="Directory with run_sd.py results and their token files",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default="results/sd_replay",
+        help="Directory to save the replay results",
+    )
+    parser.add_argument(
+        "--num_spec_tokens",
+        type=parse_int_list,
+        default=[4],
+        help="Comma-separated numbers of draft tokens per step",
+    )
+    parser.add_argument(
+        "--prompt_lookup_min",
+        type=int,
+        default=1,
+        help="Shortest n-gram matched in the context",
+    )
+    parser.add_argument(
+        "--prompt_lookup_max",
+        type=parse_int_list,
+        default=[4],
+        help="Comma-separated longest n-grams matched in the context",
+    )
+    parser.add_argument(
+        "--dry_run",
+        "--dry-run",
+        action="store_true",
+        help="List the replays without running them",
+    )
+    args = parser.parse_args(argv)
+
+    results_dir = Path(args.results_dir)
+    output_dir = Path(args.output_dir)
+    if not args.dry_run:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    for result_path in sorted(results_dir.glob("sd_results_*.json")):
+        with open(result_path, "r") as f:
+            result = json.load(f)
+        if not result.get("token_ids_file"):
+            logger.info(f"Skipping {result_path.name}: no saved tokens")
+            continue
+        for num_spec_tokens in args.num_spec_tokens:
+            for prompt_lookup_max in args.prompt_lookup_max:
+                if args.dry_run:
+                    name = drafter_name(
+                        num_spec_tokens, args.prompt_lookup_min, prompt_lookup_max
+                    )
+                    logger.info(f"Would replay {name} on {result_path.name}")
+                    continue
+                output_file, replay = replay_run(
+                    result_path,
+                    output_dir,
+                    num_spec_tokens,
+                    args.prompt_lookup_min,
+                    prompt_lookup_max,
+                )
+                logger.info(
+                    f"{result_path.name} with {replay['speculative_model']}: mean "
+                    f"acceptance length {replay['mean_acceptance_length']:.3f}, "
+                    f"saved to {output_file}"
+                )
+
+
+if __name__ == "__main__":
+    main()
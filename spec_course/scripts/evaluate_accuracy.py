@@ -2,8 +2,10 @@ import argparse
 import subprocess
 import time
 from pathlib import Path
+from typing import List
 
-from utils import LOG_PATH, load_config, setup_logger
+from spec_course.scripts.screening import failed_screen
+from spec_course.scripts.utils import LOG_PATH, load_config, setup_logger
 
 logger = setup_logger(log_name="accuracy_evaluation")
 
@@ -44,12 +46,22 @@ def wait_for_process_completion(pid: int):
             break
 
 
-def main():
+def main(argv: List[str] | None = None):
     parser = argparse.ArgumentParser(description="Run LM evaluation in tmux sessions")
     parser.add_argument(
         "--config", type=str, required=True, help="Path to YAML config file"
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--include-failed-screens",
+        action="store_true",
+        help="Also evaluate quantized models that failed their quantization screen",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the lm-eval commands without running them",
+    )
+    args = parser.parse_args(argv)
     config = load_config(args.config)
 
     models = config.get("models", [])
@@ -57,7 +69,18 @@ def main():
 
     for model_path in models:
         model_name = model_path.split("/")[-1].replace(".", "_").replace("-", "_")
+        screen = failed_screen(model_path)
+        if screen and not args.include_failed_screens:
+            logger.info(
+                f"Skipping {model_name}: failed its quantization screen "
+                f"(top-1 agreement {screen['top1_agreement']:.3f}, "
+                f"perplexity ratio {screen['perplexity_ratio']:.3f})"
+            )
+            continue
         command = create_lm_eval_command(model_path, lm_eval_args)
+        if args.dry_run:
+            logger.info(f"Would evaluate {model_name}: {command}")
+            continue
 
         logger.info(f"Starting evaluation for {model_name}")
         pid = run_background_process(command, LOG_PATH, model_name)
@@ -0,0 +1,121 @@
+import asyncio
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Dict, Optional
+
+
+@dataclass
+class HTTPMessage:
+    start_line: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+    @property
+    def method(self) -> str:
+        return self.start_line.split(" ")[0]
+
+    @property
+    def path(self) -> str:
+        return self.start_line.split(" ")[1]
+
+    @property
+    def status(self) -> int:
+        return int(self.start_line.split(" ")[1])
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+async def read_http_message(
+    reader: asyncio.StreamReader, read_to_eof: bool = False
+) -> Optional[HTTPMessage]:
+    """
+    Read one HTTP/1.1 message. Bodies are delimited by Content-Length, chunked
+    encoding, or, for responses of closed connections, the end of the stream.
+    Returns None when the peer closed the connection before a new message.
+    """
+    start_line = await reader.readline()
+    if not start_line.strip():
+        return None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif read_to_eof:
+        body = await reader.read()
+    else:
+        body = b""
+
+    return HTTPMessage(start_line.decode("latin-1").strip(), headers, body)
+
+
+def format_response(
+    status: int,
+    body: bytes,
+    content_type: str = "application/json",
+    keep_alive: bool = True,
+) -> bytes:
+    """Serialize an HTTP/1.1 response with a Content-Length delimited body"""
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        # Non-standard codes a replica may return have no phrase
+        reason = ""
+    head = (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def http_request(
+    host: str,
+    port: int,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    content_type: str = "application/json",
+    timeout: Optional[float] = None,
+) -> HTTPMessage:
+    """Send a single request over a new connection and return the response"""
+
+    async def _request() -> HTTPMessage:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            head = (
+                f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {host}:{port}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+            response = await read_http_message(reader, read_to_eof=True)
+            if response is None:
+                raise ConnectionError(f"Empty response from {host}:{port}")
+            return response
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(_request(), timeout)
@@ -1,6 +1,7 @@
 import http from "k6/http";
-import { check } from "k6";
-import { Rate } from "k6/metrics";
+import exec from "k6/execution";
+import { check, sleep } from "k6";
+import { Counter, Rate, Trend } from "k6/metrics";
 import { SharedArray } from "k6/data";
 import { textSummary } from "https://jslib.k6.io/k6-summary/0.0.2/index.js";
 const logger = {
@@ -9,6 +10,10 @@ const logger = {
 };
 
 const failRate = new Rate("failed_requests");
+const promptTokens = new Counter("prompt_tokens");
+const completionTokens = new Counter("completion_tokens");
+// How late scheduled requests are sent; grows when there are too few VUs.
+const scheduleLag = new Trend("schedule_lag");
 
 const params = {
   rps: __ENV.RPS ? parseInt(__ENV.RPS) : 10,
@@ -21,8 +26,21 @@ const params = {
   promptType: __ENV.PROMPT_TYPE || "random",
   resultsDir: __ENV.RESULTS_DIR || "./load_test_results",
   proxyURL: "http://localhost:9000" + __ENV.API_ROUTE,
+  maxVUs: __ENV.MAX_VUS ? parseInt(__ENV.MAX_VUS) : 500,
+  workload: __ENV.WORKLOAD || "constant",
+  numRequests: __ENV.NUM_REQUESTS ? parseInt(__ENV.NUM_REQUESTS) : 0,
+  concurrency: __ENV.CONCURRENCY ? parseInt(__ENV.CONCURRENCY) : 1,
+  maxDuration: __ENV.MAX_DURATION || "10m",
 };
 
+// Prompts with exact token counts pre-generated by load_test.py --exact-prompts
+let promptCorpus = [];
+if (__ENV.PROMPT_CORPUS) {
+  promptCorpus = new SharedArray("prompt_corpus", function () {
+    return JSON.parse(open(__ENV.PROMPT_CORPUS));
+  });
+}
+
 let prompts = [];
 if (params.promptType === "code" && params.resultsDir.concat("/prompts.json")) {
   prompts = new SharedArray("prompts", function () {
@@ -30,16 +48,51 @@ if (params.promptType === "code" && params.resultsDir.concat("/prompts.json")) {
   });
 }
 
+// Precomputed request offsets (seconds) and payloads written by load_test.py
+let schedule = [];
+let scheduledRequests = [];
+if (params.workload === "schedule") {
+  schedule = new SharedArray("schedule", function () {
+    return JSON.parse(open(params.resultsDir.concat("/schedule.json")));
+  });
+  scheduledRequests = new SharedArray("requests", function () {
+    return JSON.parse(open(params.resultsDir.concat("/requests.json")));
+  });
+}
+
+function buildScenario() {
+  if (params.workload === "schedule") {
+    // Every iteration sleeps until its own offset, so the executor only
+    // has to hand out iterations in order.
+    return {
+      executor: "shared-iterations",
+      vus: params.maxVUs,
+      iterations: params.numRequests,
+      maxDuration: params.maxDuration,
+    };
+  }
+  if (params.workload === "closed") {
+    // Every VU is a client that sends its next request right after a response.
+    return {
+      executor: "constant-vus",
+      vus: params.concurrency,
+      duration: params.duration,
+    };
+  }
+  return {
+    executor: "constant-arrival-rate",
+    rate: params.rps,
+    timeUnit: "1s",
+    duration: params.duration,
+    preAllocatedVUs: params.maxVUs,
+  };
+}
+
 export const options = {
   scenarios: {
-    streaming: {
-      executor: "constant-arrival-rate",
-      rate: params.rps,
-      timeUnit: "1s",
-      duration: params.duration,
-      preAllocatedVUs: 500,
-    },
+    streaming: buildScenario(),
   },
+  summaryTrendStats: ["avg", "min", "med", "max", "p(90)", "p(95)", "p(99)"],
 };
 
 function generatePrompt(prompt_length) {
@@ -70,29 +123,64 @@ function getNormallyDistributedRandomNumber(mean, stddev) {
   return z0 * stddev + mean;
 }
 
-export default function () {
+function sampleRequest() {
   const normDistTokens = getNormallyDistributedRandomNumber(
     params.maxTokensMean,
     params.maxTokensStdDev,
   );
+  const maxTokens = Math.max(1, Math.round(normDistTokens));
+
+  if (promptCorpus.length > 0) {
+    const idx = Math.floor(Math.random() * promptCorpus.length);
+    return {
+      messages: [{ role: "user", content: promptCorpus[idx].content }],
+      maxTokens: maxTokens,
+    };
+  }
+
   const normDistPrompts = getNormallyDistributedRandomNumber(
     params.promptLenMean,
     params.promptLenStdDev,
   );
 
-  const maxTokens = Math.max(1, Math.round(normDistTokens));
-  // We assume that 1 character is approximately equivalent to 4 tokens.
+  // Without a corpus we assume that 1 token is approximately 4 characters.
   const promptLen = Math.max(10, Math.round(normDistPrompts)) * 4;
 
+  return {
+    messages: [{ role: "user", content: generatePrompt(promptLen) }],
+    maxTokens: maxTokens,
+  };
+}
+
+function nextScheduledRequest() {
+  const idx = exec.scenario.iterationInTest;
+  const elapsed = (Date.now() - exec.scenario.startTime) / 1000;
+  const delay = schedule[idx] - elapsed;
+  if (delay > 0) {
+    sleep(delay);
+  }
+  scheduleLag.add(Math.max(0, -delay) * 1000);
+
+  const request = scheduledRequests[idx];
+  let messages = request.messages;
+  if (!messages) {
+    const content =
+      request.corpus_index !== undefined
+        ? promptCorpus[request.corpus_index].content
+        : generatePrompt(request.prompt_len * 4);
+    messages = [{ role: "user", content: content }];
+  }
+  return { messages: messages, maxTokens: request.max_tokens };
+}
+
+export default function () {
+  const request =
+    params.workload === "schedule" ? nextScheduledRequest() : sampleRequest();
+
   const payload = {
     model: params.modelName,
-    messages: [
-      {
-        role: "user",
-        content: generatePrompt(promptLen),
-      },
-    ],
-    max_tokens: maxTokens,
+    messages: request.messages,
+    max_tokens: request.maxTokens,
     temperature: 1,
   };
 
@@ -105,13 +193,18 @@ export default function () {
     timeout: "120s",
   });
 
-  check(response, {
+  const isSuccess = check(response, {
     "is status 200": (r) => r.status === 200,
-  }) || failRate.add(1);
+  });
+  failRate.add(!isSuccess);
 
   if (response.body) {
     try {
       const responseData = JSON.parse(response.body);
+      if (responseData.usage) {
+        promptTokens.add(responseData.usage.prompt_tokens || 0);
+        completionTokens.add(responseData.usage.completion_tokens || 0);
+      }
     } catch (error) {
       logger.error("Error parsing JSON response:", error);
     }
@@ -123,7 +216,12 @@ export default function () {
 export function handleSummary(data) {
   data.metrics["end_to_end_latency"] = data.metrics["http_req_duration"];
 
+  // Keep iteration counters: they give the achieved request rate.
+  const keptMetrics = ["iterations", "dropped_iterations"];
   for (const key in data.metrics) {
+    if (keptMetrics.includes(key)) {
+      continue;
+    }
     if (
       key.startsWith("iteration") ||
       key.startsWith("data") ||
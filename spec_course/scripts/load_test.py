@@ -1,10 +1,31 @@
 import argparse
 import json
+import math
 import subprocess
 import time
 from pathlib import Path
 from typing import Any, Dict, List
 
+from spec_course.scripts.arrivals import (
+    ARRIVAL_PROCESSES,
+    build_arrival_offsets,
+    parse_stages,
+    sample_requests,
+)
+from spec_course.scripts.prompt_corpus import (
+    CORPUS_CACHE_DIR,
+    LOREM_TEXT,
+    PromptBuilder,
+    build_prompt_corpus,
+    get_corpus_path,
+    sample_prompt_lengths,
+)
+from spec_course.scripts.utils import parse_duration
+from spec_course.scripts.workload import trace_requests, write_schedule
+
+# Time left for the last scheduled requests to complete (k6 request timeout)
+SCHEDULE_GRACE_SECONDS = 120
+
 
 def fetch_prompts_from_hf() -> List[str]:
     """Load prompts from huggingface dataset: mbpp"""
@@ -14,6 +35,37 @@ def fetch_prompts_from_hf() -> List[str]:
     return dataset["test"]["text"]
 
 
+def prepare_prompt_corpus(args: Dict[Any, Any], mean: int, std: int) -> Path:
+    """
+    Pre-generate prompts with exact token counts for the target tokenizer.
+    The corpus is cached, so repeated runs with the same parameters reuse it.
+    """
+    tokenizer_name = args.tokenizer or args.model_name
+    cache_dir = Path(__file__).parent.parent / CORPUS_CACHE_DIR
+    corpus_path = get_corpus_path(
+        cache_dir,
+        tokenizer_name,
+        args.prompt_type,
+        mean,
+        std,
+        args.corpus_size,
+        args.seed,
+    )
+    if corpus_path.exists():
+        print(f"Using cached prompt corpus: {corpus_path}")
+        return corpus_path
+
+    from transformers import AutoTokenizer
+
+    print(f"Building prompt corpus with {tokenizer_name} tokenizer")
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    lengths = sample_prompt_lengths(mean, std, args.corpus_size, args.seed)
+    source = fetch_prompts_from_hf() if args.prompt_type == "code" else [LOREM_TEXT]
+    builder = PromptBuilder(tokenizer, source, max(lengths), args.seed)
+    build_prompt_corpus(corpus_path, builder, lengths)
+    return corpus_path
+
+
 def run_k6_test(args: Dict[Any, Any]) -> None:
     """Run k6 test with provided arguments"""
     script_dir = Path(__file__).parent
@@ -37,9 +89,12 @@ def run_k6_test(args: Dict[Any, Any]) -> None:
             f"Invalid input tokens distribution: {args.input_tokens_distribution}. Error: {e}"
         )
 
-    timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
-    current_dir = f"{args.run_id + '_' if args.run_id else ''}{timestamp}"
-    results_dir = script_dir.parent / "results" / "load_test" / current_dir
+    if args.results_dir:
+        results_dir = Path(args.results_dir)
+    else:
+        timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
+        current_dir = f"{args.run_id + '_' if args.run_id else ''}{timestamp}"
+        results_dir = script_dir.parent / "results" / "load_test" / current_dir
     results_dir.mkdir(parents=True, exist_ok=True)
     env = {
         "RPS": args.rps,
@@ -53,14 +108,70 @@ def run_k6_test(args: Dict[Any, Any]) -> None:
         "DURATION": args.duration,
         "PROMPT_TYPE": args.prompt_type,
         "RESULTS_DIR": results_dir,
+        "MAX_VUS": str(args.max_vus),
+        "WORKLOAD": "constant",
     }
 
-    if args.prompt_type == "code":
+    corpus_size = 0
+    if args.exact_prompts:
+        corpus_path = prepare_prompt_corpus(args, prompt_len_mean, prompt_len_std)
+        env["PROMPT_CORPUS"] = str(corpus_path)
+        corpus_size = args.corpus_size
+    elif args.prompt_type == "code":
         prompts = fetch_prompts_from_hf()
         prompt_file = results_dir / "prompts.json"
         with open(prompt_file, "w") as file:
             json.dump(prompts, file, indent=4)
 
+    if args.concurrency and (args.trace or args.arrival_process != "constant"):
+        raise ValueError("Closed-loop concurrency cannot be combined with a schedule")
+
+    schedule_info = {}
+    if args.concurrency:
+        env.update({"WORKLOAD": "closed", "CONCURRENCY": str(args.concurrency)})
+    elif args.trace:
+        schedule_info = write_schedule(
+            results_dir, trace_requests(args.trace, args.trace_time_scale)
+        )
+    elif args.arrival_process != "constant":
+        stages = parse_stages(args.ramp_stages) if args.ramp_stages else None
+        if args.arrival_process == "ramp" and stages:
+            duration = sum(stage_duration for _, stage_duration in stages)
+        else:
+            duration = parse_duration(args.duration)
+        offsets = build_arrival_offsets(
+            args.arrival_process,
+            rate=float(args.rps),
+            duration=duration,
+            seed=args.seed,
+            cv=args.arrival_cv,
+            stages=stages,
+            on_seconds=parse_duration(args.burst_on),
+            off_seconds=parse_duration(args.burst_off),
+        )
+        requests = sample_requests(
+            offsets,
+            max_tokens_mean,
+            max_tokens_std,
+            prompt_len_mean,
+            prompt_len_std,
+            seed=args.seed,
+            corpus_size=corpus_size,
+        )
+        schedule_info = write_schedule(results_dir, requests, duration=duration)
+
+    if schedule_info:
+        max_duration = math.ceil(
+            schedule_info["schedule_seconds"] + SCHEDULE_GRACE_SECONDS
+        )
+        env.update(
+            {
+                "WORKLOAD": "schedule",
+                "NUM_REQUESTS": str(schedule_info["num_requests"]),
+                "MAX_DURATION": f"{max_duration}s",
+            }
+        )
+
     try:
         print("Starting proxy server")
         proxy = subprocess.Popen(
@@ -69,25 +180,25 @@ def run_k6_test(args: Dict[Any, Any]) -> None:
         )
         time.sleep(3)
 
+        k6_args = [f"--summary-export={results_dir / 'metrics.json'}"]
+        if args.raw_output:
+            # k6 gzips the per-request samples because of the .gz suffix
+            k6_args.append(f"--out=json={results_dir / 'raw.json.gz'}")
+
         subprocess.run(
-            [
-                "k6",
-                "run",
-                f"--summary-export={results_dir / 'metrics.json'}",
-                str(k6_script_path),
-            ],
+            ["k6", "run", *k6_args, str(k6_script_path)],
             env={**dict(env), **dict(subprocess.os.environ)},
             check=True,
         )
         proxy.terminate()
         params_file = results_dir / "input_params.json"
         with open(params_file, "w") as file:
-            json.dump(vars(args), file, indent=4)
+            json.dump({**vars(args), **schedule_info}, file, indent=4)
     except subprocess.CalledProcessError as e:
         print(f"Error running k6 test: {e}")
 
 
-def main():
+def main(argv: List[str] | None = None):
     parser = argparse.ArgumentParser(description="Run k6 load test for LLM endpoint")
     parser.add_argument("--rps", type=str, default="10", help="Requests per second")
     parser.add_argument(
@@ -96,6 +207,18 @@ def main():
     parser.add_argument(
         "--model-name", type=str, required=True, help="Model name to test"
     )
+    parser.add_argument(
+        "--draft-model-name",
+        type=str,
+        default="",
+        help="Draft model served for speculative decoding, recorded with the results",
+    )
+    parser.add_argument(
+        "--num-spec-tokens",
+        type=int,
+        default=0,
+        help="Number of speculative tokens, recorded with the results",
+    )
     parser.add_argument(
         "--endpoint-url",
         type=str,
@@ -128,7 +251,95 @@ def main():
         help="Prefix the folder name with the results of the current run.",
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--exact-prompts",
+        action="store_true",
+        help="Pre-generate prompts with exact token counts using the model tokenizer",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default=None,
+        help="Tokenizer for --exact-prompts (defaults to --model-name)",
+    )
+    parser.add_argument(
+        "--corpus-size",
+        type=int,
+        default=1000,
+        help="Number of pre-generated prompts for --exact-prompts",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for pre-generated workloads"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Closed-loop mode: number of clients that send a new request as soon "
+        "as the previous one completes (0 keeps the open-loop --rps mode)",
+    )
+    parser.add_argument(
+        "--arrival-process",
+        type=str,
+        choices=ARRIVAL_PROCESSES,
+        default="constant",
+        help="Arrival process of requests; all but constant use a precomputed schedule",
+    )
+    parser.add_argument(
+        "--arrival-cv",
+        type=float,
+        default=2.0,
+        help="Coefficient of variation of inter-arrival gaps for the gamma process",
+    )
+    parser.add_argument(
+        "--ramp-stages",
+        type=str,
+        default="",
+        help="Ramp stages as <rate:duration,...>, e.g. 5:30s,15:60s",
+    )
+    parser.add_argument(
+        "--burst-on",
+        type=str,
+        default="0s",
+        help="Duration of bursts at --rps for the on-off process",
+    )
+    parser.add_argument(
+        "--burst-off",
+        type=str,
+        default="0s",
+        help="Duration of silence between bursts for the on-off process",
+    )
+    parser.add_argument(
+        "--max-vus",
+        type=int,
+        default=500,
+        help="Maximum number of concurrent virtual users in k6",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="JSONL trace to replay instead of generating constant-rate traffic",
+    )
+    parser.add_argument(
+        "--trace-time-scale",
+        type=float,
+        default=1.0,
+        help="Multiplier for inter-arrival gaps of the replayed trace",
+    )
+    parser.add_argument(
+        "--results-dir",
+        type=str,
+        default=None,
+        help="Folder for the results (defaults to results/load_test/<run-id>_<timestamp>)",
+    )
+    parser.add_argument(
+        "--raw-output",
+        action="store_true",
+        help="Also export per-request samples to raw.json.gz in the results folder",
+    )
+
+    args = parser.parse_args(argv)
     run_k6_test(args)
 
 
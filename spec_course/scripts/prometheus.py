@@ -0,0 +1,256 @@
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from spec_course.scripts.http_utils import http_request
+
+PROMETHEUS_METRICS_FILE = "prometheus_metrics.jsonl"
+PROMETHEUS_SUMMARY_FILE = "prometheus_summary.json"
+SCRAPE_INTERVAL = 5.0
+SCRAPE_TIMEOUT = 5.0
+
+GAUGES = {
+    "vllm:num_requests_running": "running",
+    "vllm:num_requests_waiting": "waiting",
+    "vllm:gpu_cache_usage_perc": "gpu_cache_usage",
+}
+COUNTERS = {
+    "vllm:prompt_tokens_total": "prompt_tokens",
+    "vllm:generation_tokens_total": "generation_tokens",
+    "vllm:request_success_total": "requests",
+    "vllm:spec_decode_num_drafts_total": "num_drafts",
+    "vllm:spec_decode_num_draft_tokens_total": "draft_tokens",
+    "vllm:spec_decode_num_accepted_tokens_total": "accepted_tokens",
+    # Only exported by the V0 engine, which has no drafts counter
+    "vllm:spec_decode_num_emitted_tokens_total": "emitted_tokens",
+}
+HISTOGRAMS = {
+    "vllm:time_to_first_token_seconds": "ttft",
+    "vllm:request_queue_time_seconds": "queue_time",
+    "vllm:time_per_output_token_seconds": "tpot",
+    "vllm:e2e_request_latency_seconds": "e2e_latency",
+}
+# Exposed sample name -> short name; only _sum and _count of histograms are kept
+WANTED_SAMPLES = {
+    **GAUGES,
+    **COUNTERS,
+    **{f"{name}_sum": f"{short}_sum" for name, short in HISTOGRAMS.items()},
+    **{f"{name}_count": f"{short}_count" for name, short in HISTOGRAMS.items()},
+}
+CUMULATIVE_SAMPLES = [
+    *COUNTERS.values(),
+    *(f"{short}_{part}" for short in HISTOGRAMS.values() for part in ["sum", "count"]),
+]
+
+
+def parse_exposition(text: str) -> Dict[str, float]:
+    """
+    Parse the wanted vLLM samples from Prometheus text exposition format.
+    Samples of the same metric with different labels (e.g. finish reasons)
+    are summed. Comments, buckets and unrelated metrics are skipped cheaply.
+    """
+    samples: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line.startswith("vllm:"):
+            continue
+        labels_start = line.find("{")
+        if labels_start == -1:
+            name, _, rest = line.partition(" ")
+        else:
+            name = line[:labels_start]
+            rest = line[line.rfind("}") + 1 :]
+        short_name = WANTED_SAMPLES.get(name)
+        if short_name is None:
+            continue
+        try:
+            value = float(rest.split()[0])
+        except (IndexError, ValueError):
+            continue
+        samples[short_name] = samples.get(short_name, 0.0) + value
+    return samples
+
+
+def _delta(previous: Dict[str, float], current: Dict[str, float], name: str) -> float:
+    """Counter increase, treating a decrease as a server restart"""
+    value = current.get(name, 0.0)
+    increase = value - previous.get(name, 0.0)
+    return value if increase < 0 else increase
+
+
+def _ratio(numerator: float, denominator: float) -> float | None:
+    return numerator / denominator if denominator else None
+
+
+def interval_metrics(
+    previous: Dict[str, float], current: Dict[str, float], elapsed: float
+) -> Dict[str, float]:
+    """Gauges plus counter rates and histogram means between two scrapes"""
+    metrics = {short: current[short] for short in GAUGES.values() if short in current}
+    if elapsed > 0:
+        for short in ["prompt_tokens", "generation_tokens", "requests"]:
+            if short in current:
+                metrics[f"{short}_per_s"] = _delta(previous, current, short) / elapsed
+    for short in HISTOGRAMS.values():
+        mean = _ratio(
+            _delta(previous, current, f"{short}_sum"),
+            _delta(previous, current, f"{short}_count"),
+        )
+        if mean is not None:
+            metrics[f"mean_{short}"] = mean
+    acceptance_rate = _ratio(
+        _delta(previous, current, "accepted_tokens"),
+        _delta(previous, current, "draft_tokens"),
+    )
+    if acceptance_rate is not None:
+        metrics["draft_acceptance_rate"] = acceptance_rate
+    return metrics
+
+
+def summarize_run(
+    first: List[Dict[str, float]],
+    last: List[Dict[str, float]],
+    gauges: List[Dict[str, float]],
+) -> Dict[str, float | None]:
+    """
+    Summarize a run from the first and last scrape of every replica and the
+    gauge values of all scrapes.
+    """
+    totals = {}
+    for name in CUMULATIVE_SAMPLES:
+        totals[name] = sum(_delta(a, b, name) for a, b in zip(first, last))
+
+    accepted = totals["accepted_tokens"]
+    # Every verification step emits its accepted tokens plus one bonus or
+    # recovered token, so V0 servers give the number of steps as well
+    num_steps = totals["num_drafts"] or totals["emitted_tokens"] - accepted
+    mean_acceptance_length = _ratio(accepted, num_steps)
+    return {
+        "spec_acceptance_rate": _ratio(accepted, totals["draft_tokens"]),
+        "mean_acceptance_length": (
+            1 + mean_acceptance_length if mean_acceptance_length is not None else None
+        ),
+        "mean_ttft": _ratio(totals["ttft_sum"], totals["ttft_count"]),
+        "mean_queue_time": _ratio(totals["queue_time_sum"], totals["queue_time_count"]),
+        "mean_tpot": _ratio(totals["tpot_sum"], totals["tpot_count"]),
+        "max_num_waiting": max(
+            (sample.get("waiting", 0.0) for sample in gauges), default=None
+        ),
+        "max_gpu_cache_usage": max(
+            (sample.get("gpu_cache_usage", 0.0) for sample in gauges), default=None
+        ),
+    }
+
+
+class PrometheusScraper:
+    """
+    Poll the /metrics endpoint of every replica at a fixed interval on a background
+    event loop and append the per-interval metrics to a JSONL time series.
+    Every record is also passed to `on_record` if given.
+    """
+
+    def __init__(
+        self,
+        replica_urls: List[str],
+        output_path: Path,
+        interval: float = SCRAPE_INTERVAL,
+        on_record: Callable[[Dict[str, Any]], None] | None = None,
+    ):
+        self.replicas = []
+        for url in replica_urls:
+            host, port = url.removeprefix("http://").rstrip("/").split(":")
+            self.replicas.append((host, int(port)))
+        self.output_path = output_path
+        self.interval = interval
+        self.on_record = on_record
+        self.first: List[Dict[str, float] | None] = [None] * len(self.replicas)
+        self.previous: List[Dict[str, float] | None] = [None] * len(self.replicas)
+        self.previous_time: List[float] = [0.0] * len(self.replicas)
+        self.gauges: List[Dict[str, float]] = []
+        self.num_scrapes = 0
+        self.num_errors = 0
+        self.loop = asyncio.new_event_loop()
+        self.stop_event = asyncio.Event()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+
+    async def _scrape(self, replica_id: int) -> Dict[str, float] | None:
+        host, port = self.replicas[replica_id]
+        try:
+            response = await http_request(
+                host, port, "GET", "/metrics", timeout=SCRAPE_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            self.num_errors += 1
+            return None
+        if response.status != 200:
+            self.num_errors += 1
+            return None
+        return parse_exposition(response.body.decode("utf-8", "replace"))
+
+    async def _scrape_all(self, output_file, start_time: float) -> None:
+        samples = await asyncio.gather(
+            *(self._scrape(replica_id) for replica_id in range(len(self.replicas)))
+        )
+        now = time.monotonic()
+        for replica_id, sample in enumerate(samples):
+            if sample is None:
+                continue
+            self.num_scrapes += 1
+            self.gauges.append(
+                {short: sample[short] for short in GAUGES.values() if short in sample}
+            )
+            previous = self.previous[replica_id]
+            if previous is None:
+                self.first[replica_id] = sample
+            else:
+                record = {
+                    "offset_s": round(now - start_time, 3),
+                    "replica": replica_id,
+                    "source": "prometheus",
+                    "metrics": interval_metrics(
+                        previous, sample, now - self.previous_time[replica_id]
+                    ),
+                }
+                output_file.write(json.dumps(record) + "\n")
+                if self.on_record is not None:
+                    self.on_record(record)
+            self.previous[replica_id] = sample
+            self.previous_time[replica_id] = now
+        output_file.flush()
+
+    async def _run(self) -> None:
+        start_time = time.monotonic()
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.output_path, "w") as output_file:
+            while not self.stop_event.is_set():
+                await self._scrape_all(output_file, start_time)
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            # Final scrape so the summary covers the whole run
+            await self._scrape_all(output_file, start_time)
+
+    def _run_loop(self) -> None:
+        self.loop.run_until_complete(self._run())
+        self.loop.close()
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> Dict[str, float | None]:
+        """Stop scraping and return the summary of the run"""
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.thread.join()
+        first = [sample for sample in self.first if sample is not None]
+        last = [sample for sample in self.previous if sample is not None]
+        return summarize_run(first, last, self.gauges)
+
+
+def save_prometheus_summary(summary: Dict[str, Any], results_dir: Path) -> None:
+    """Save the server-side summary of a run next to the load test results"""
+    results_dir.mkdir(parents=True, exist_ok=True)
+    with open(results_dir / PROMETHEUS_SUMMARY_FILE, "w") as f:
+        json.dump(summary, f, indent=4)
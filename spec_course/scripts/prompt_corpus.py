@@ -0,0 +1,90 @@
+import hashlib
+import json
+import random
+from pathlib import Path
+from typing import Any, Iterable, List, Tuple
+
+from spec_course.scripts.workload import JsonArrayWriter
+
+CORPUS_CACHE_DIR = Path(".cache") / "prompt_corpus"
+LOREM_TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+MIN_PROMPT_TOKENS = 10
+# Decoding and re-encoding can merge tokens at the edges, so retry a few times
+MAX_ADJUST_ATTEMPTS = 4
+
+
+class PromptBuilder:
+    """Build prompts with an exact number of tokens for a given tokenizer"""
+
+    def __init__(
+        self, tokenizer: Any, source_texts: Iterable[str], min_pool_size: int, seed: int
+    ):
+        self.tokenizer = tokenizer
+        self.rng = random.Random(seed)
+        self.pool: List[int] = []
+        texts = list(source_texts)
+        if not texts:
+            raise ValueError("Prompt source is empty")
+        # Cycle through the sources so any requested length fits in the pool
+        while len(self.pool) < 2 * min_pool_size:
+            for text in texts:
+                self.pool.extend(self.tokenizer.encode(text, add_special_tokens=False))
+                if len(self.pool) >= 2 * min_pool_size:
+                    break
+
+    def build(self, num_tokens: int) -> Tuple[str, int]:
+        """Return a prompt and its length in tokens, which is `num_tokens` if possible"""
+        start = self.rng.randrange(len(self.pool) - 2 * num_tokens + 1)
+        end = start + num_tokens
+        token_ids = self.pool[start:end]
+        for _ in range(MAX_ADJUST_ATTEMPTS):
+            text = self.tokenizer.decode(token_ids)
+            encoded = self.tokenizer.encode(text, add_special_tokens=False)
+            if len(encoded) == num_tokens:
+                break
+            if len(encoded) > num_tokens:
+                token_ids = encoded[:num_tokens]
+            else:
+                missing = num_tokens - len(encoded)
+                token_ids = encoded + self.pool[end : end + missing]
+                end += missing
+        return text, len(encoded)
+
+
+def sample_prompt_lengths(mean: int, std: int, size: int, seed: int) -> List[int]:
+    """Sample prompt lengths in tokens from a normal distribution"""
+    rng = random.Random(seed)
+    return [max(MIN_PROMPT_TOKENS, round(rng.gauss(mean, std))) for _ in range(size)]
+
+
+def get_corpus_path(
+    cache_dir: Path,
+    tokenizer_name: str,
+    prompt_type: str,
+    mean: int,
+    std: int,
+    size: int,
+    seed: int,
+) -> Path:
+    """Cache path of a corpus, unique for its generation parameters"""
+    key = json.dumps([tokenizer_name, prompt_type, mean, std, size, seed])
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return cache_dir / f"{prompt_type}_{digest}.json"
+
+
+def build_prompt_corpus(
+    output_path: Path,
+    builder: PromptBuilder,
+    lengths: List[int],
+) -> None:
+    """
+    Write prompts as a JSON array of {content, num_tokens}.
+    The load generator samples it by index without any string processing.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(".tmp")
+    with JsonArrayWriter(tmp_path) as corpus:
+        for num_tokens in lengths:
+            content, actual_tokens = builder.build(num_tokens)
+            corpus.write({"content": content, "num_tokens": actual_tokens})
+    tmp_path.rename(output_path)
@@ -0,0 +1,173 @@
+from pathlib import Path
+from statistics import NormalDist
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+from spec_course.scripts.utils import config_hash
+
+STRATA_CACHE_DIR = Path(".cache") / "prompt_strata"
+SAMPLING_METHODS = ["head", "stratified"]
+TOKENIZE_BATCH_SIZE = 1000
+
+
+def get_strata_path(
+    cache_dir: Path, dataset_type: str, tokenizer_name: str, num_prompts: int
+) -> Path:
+    """Cache path of the prompt token lengths of a dataset"""
+    digest = config_hash([dataset_type, tokenizer_name, num_prompts])
+    return cache_dir / f"{dataset_type}_{digest}.npy"
+
+
+def count_prompt_tokens(prompts: Sequence[str], tokenizer: Any) -> np.ndarray:
+    """Token length of every prompt, tokenized in batches"""
+    lengths = np.empty(len(prompts), dtype=np.int32)
+    for start in range(0, len(prompts), TOKENIZE_BATCH_SIZE):
+        batch = list(prompts[start : start + TOKENIZE_BATCH_SIZE])
+        input_ids = tokenizer(batch, add_special_tokens=False)["input_ids"]
+        lengths[start : start + len(batch)] = [len(ids) for ids in input_ids]
+    return lengths
+
+
+def load_prompt_lengths(
+    prompts: Sequence[str],
+    dataset_type: str,
+    tokenizer_name: str,
+    cache_dir: Path = STRATA_CACHE_DIR,
+) -> np.ndarray:
+    """Token lengths of the dataset prompts, computed once and cached"""
+    cache_path = get_strata_path(cache_dir, dataset_type, tokenizer_name, len(prompts))
+    if cache_path.exists():
+        return np.load(cache_path)
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    lengths = count_prompt_tokens(prompts, tokenizer)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(cache_path, lengths)
+    return lengths
+
+
+def length_strata(lengths: np.ndarray, num_strata: int) -> np.ndarray:
+    """Assign every prompt to a stratum by token length quantile"""
+    edges = np.quantile(lengths, np.linspace(0, 1, num_strata + 1)[1:-1])
+    strata = np.searchsorted(edges, lengths, side="right")
+    # Renumber to 0..S-1 so empty quantile bins do not leave gaps
+    return np.unique(strata, return_inverse=True)[1]
+
+
+def allocate_proportionally(stratum_sizes: np.ndarray, sample_size: int) -> np.ndarray:
+    """Split the sample over strata proportionally, rounding by largest remainder"""
+    sample_size = min(sample_size, int(stratum_sizes.sum()))
+    quotas = stratum_sizes * sample_size / stratum_sizes.sum()
+    allocation = np.floor(quotas).astype(np.int64)
+    remainders = np.argsort(allocation - quotas, kind="stable")
+    allocation[remainders[: sample_size - allocation.sum()]] += 1
+    return np.minimum(allocation, stratum_sizes)
+
+
+def stratified_sample(strata: np.ndarray, sample_size: int, seed: int) -> np.ndarray:
+    """Seeded sample of prompt indices with proportional representation of strata"""
+    rng = np.random.default_rng(seed)
+    stratum_sizes = np.bincount(strata)
+    allocation = allocate_proportionally(stratum_sizes, sample_size)
+    order = np.argsort(strata, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(stratum_sizes)[:-1]])
+    sampled = [
+        rng.choice(order[start : start + size], count, replace=False)
+        for start, size, count in zip(starts, stratum_sizes, allocation)
+        if count
+    ]
+    return np.sort(np.concatenate(sampled))
+
+
+def stratified_mean(
+    values: np.ndarray, sample_strata: np.ndarray, stratum_sizes: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Stratified estimate of the population mean and its standard error, with the
+    finite population correction. NaN values are left out; a stratum with a
+    single value contributes no variance.
+    """
+    valid = ~np.isnan(values)
+    values, sample_strata = values[valid], sample_strata[valid]
+    weights = stratum_sizes / stratum_sizes.sum()
+    counts = np.bincount(sample_strata, minlength=len(stratum_sizes))
+    sums = np.bincount(sample_strata, weights=values, minlength=len(stratum_sizes))
+    squares = np.bincount(
+        sample_strata, weights=values**2, minlength=len(stratum_sizes)
+    )
+
+    sampled = counts > 0
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=sampled)
+    # Strata without values are represented by the sampled ones
+    weights = np.where(sampled, weights, 0)
+    weights = weights / weights.sum()
+    variances = np.divide(
+        squares - counts * means**2,
+        counts - 1,
+        out=np.zeros_like(sums),
+        where=counts > 1,
+    )
+    correction = 1 - counts / stratum_sizes
+    stderr = np.sqrt(
+        np.sum(
+            np.divide(
+                weights**2 * np.maximum(variances, 0) * correction,
+                counts,
+                out=np.zeros_like(sums),
+                where=sampled,
+            )
+        )
+    )
+    return float(np.sum(weights * means)), float(stderr)
+
+
+def select_prompts(
+    prompts: List[str],
+    num_prompts: int,
+    sampling: str = "head",
+    lengths: np.ndarray | None = None,
+    num_strata: int = 1,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Select prompt indices to run. Returns the indices, their strata and the size
+    of every stratum in the full dataset, so estimates can be extrapolated to it.
+    Head sampling takes the first prompts and uses a single stratum.
+    """
+    total = len(prompts)
+    sample_size = total if num_prompts == -1 else min(num_prompts, total)
+    if sampling == "head":
+        return (
+            np.arange(sample_size),
+            np.zeros(sample_size, dtype=np.int64),
+            np.array([total]),
+        )
+    if sampling != "stratified":
+        raise ValueError(f"Unknown sampling: {sampling}. Available: {SAMPLING_METHODS}")
+    if lengths is None:
+        raise ValueError("Stratified sampling requires prompt lengths")
+
+    strata = length_strata(lengths, num_strata)
+    indices = stratified_sample(strata, sample_size, seed)
+    return indices, strata[indices], np.bincount(strata)
+
+
+def ci_half_width(stderr: float, confidence: float) -> float:
+    """Half-width of the normal confidence interval of an estimate"""
+    return NormalDist().inv_cdf(0.5 + confidence / 2) * stderr
+
+
+def is_precise(
+    estimate: float, stderr: float, tolerance: float, confidence: float
+) -> bool:
+    """Check whether the CI half-width is within a relative tolerance of the estimate"""
+    return ci_half_width(stderr, confidence) <= tolerance * abs(estimate)
+
+
+def has_stratum_variances(sample_strata: np.ndarray) -> bool:
+    """Check that every sampled stratum has enough values to estimate its variance"""
+    counts = np.bincount(sample_strata)
+    return bool(np.all(counts[counts > 0] >= 2))
@@ -1,25 +1,48 @@
 import argparse
 import gc
+import importlib
 import traceback
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 
-import torch
-from datasets import load_dataset
-from llmcompressor.modifiers.obcq import SparseGPTModifier
-from llmcompressor.modifiers.quantization import GPTQModifier
-from llmcompressor.modifiers.smoothquant import SmoothQuantModifier
-from llmcompressor.transformers import oneshot
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from utils import load_config, setup_logger
+from spec_course.database.db import create_database
+from spec_course.database.etl.screen import Screen
+from spec_course.scripts.screening import (
+    SCREEN_DEFAULTS,
+    SCREEN_RESULTS_FILE,
+    load_baseline_predictions,
+    load_heldout_tokens,
+    predict_heldout,
+    save_screen_results,
+    screen_predictions,
+)
+from spec_course.scripts.utils import load_config, setup_logger
 
 CALIBRATION_DATASET = "neuralmagic/LLM_compression_calibration"
 logger = setup_logger(log_name="quantization")
 
+# Recipe modifier name -> llmcompressor module that defines it. Modifiers are
+# imported when a model is quantized, so that `--dry-run` stays fast
+QUANT_MODIFIER_MODULES = {
+    "GPTQModifier": "llmcompressor.modifiers.quantization",
+    "SmoothQuantModifier": "llmcompressor.modifiers.smoothquant",
+    "SparseGPTModifier": "llmcompressor.modifiers.obcq",
+}
+
+
+def get_quant_modifier(method_name: str):
+    """Import the llmcompressor modifier class of a recipe entry"""
+    module = importlib.import_module(QUANT_MODIFIER_MODULES[method_name])
+    return getattr(module, method_name)
+
+
+def get_model_output_dir(output_dir: str, model_name: str, model_suffix: str) -> Path:
+    return Path(output_dir) / f"{model_name.split('/')[-1]}-scheme-{model_suffix}"
+
+
+def load_calibration_dataset(tokenizer, num_calibration_samples: int = 512):
+    from datasets import load_dataset
 
-def load_calibration_dataset(
-    tokenizer: AutoTokenizer, num_calibration_samples: int = 512
-):
     def preprocess_fn(example):
         return {
             "text": tokenizer.apply_chat_template(
@@ -33,24 +56,28 @@ def load_calibration_dataset(
     return ds
 
 
-str2QuantModifier = {
-    "GPTQModifier": GPTQModifier,
-    "SmoothQuantModifier": SmoothQuantModifier,
-    "SparseGPTModifier": SparseGPTModifier,
-}
-
-
 def quantize_model(
     model_name,
     output_dir,
     quant_method: Dict[str, Any],
     num_calibration_samples: int = 512,
     max_sequence_length: int = 8192,
+    screen_config: Dict[str, Any] | None = None,
+    db_name: str | None = None,
 ):
+    """
+    Quantize a model with a recipe. With `screen_config`, the perplexity and top-1
+    agreement of the quantized model with the unquantized one on a held-out set
+    are saved to `screen_results.json` in its folder (and to the database when
+    given), and the model is marked as failed below the thresholds.
+    """
+    import torch
+    from llmcompressor.transformers import oneshot
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
     logger.info(f"Processing model: {model_name}")
-    model_output_dir = (
-        Path(output_dir)
-        / f"{model_name.split('/')[-1]}-scheme-{quant_method['model_suffix']}"
+    model_output_dir = get_model_output_dir(
+        output_dir, model_name, quant_method["model_suffix"]
     )
     model_output_dir.mkdir(parents=True, exist_ok=True)
     try:
@@ -69,7 +96,14 @@ def quantize_model(
         recipe = []
         for method in quant_method["recipe"]:
             method_name, method_args = list(method.items())[0]
-            recipe.append(str2QuantModifier[method_name](**method_args))
+            recipe.append(get_quant_modifier(method_name)(**method_args))
+
+        if screen_config:
+            logger.info("Computing unquantized predictions for the screen...")
+            heldout_ids = load_heldout_tokens(tokenizer, model_name, screen_config)
+            baseline_top1, baseline_nll = load_baseline_predictions(
+                model, model_name, heldout_ids, screen_config
+            )
 
         logger.info("Starting quantization...")
         oneshot(
@@ -83,6 +117,28 @@ def quantize_model(
             oneshot_device="auto",
         )
         logger.info(f"Model quantized and saved to: {model_output_dir}")
+
+        if screen_config:
+            top1, nll = predict_heldout(model, heldout_ids, screen_config["batch_size"])
+            metrics = screen_predictions(
+                top1, nll, baseline_top1, baseline_nll, screen_config
+            )
+            save_screen_results(
+                model_output_dir,
+                model_name,
+                quant_method["setup_name"],
+                metrics,
+                screen_config,
+            )
+            logger.info(
+                f"Screen {'passed' if metrics['passed'] else 'FAILED'}: perplexity "
+                f"{metrics['perplexity']:.3f} (unquantized "
+                f"{metrics['baseline_perplexity']:.3f}), top-1 agreement "
+                f"{metrics['top1_agreement']:.3f}"
+            )
+            if db_name:
+                create_database(db_name)
+                Screen(db_name).run(model_output_dir / SCREEN_RESULTS_FILE)
     except Exception as e:
         error_msg = (
             f"Error processing model {model_name} with method {quant_method['setup_name']}:\n"
@@ -101,7 +157,24 @@ def quantize_model(
         gc.collect()
 
 
-def main():
+def validate_quant_methods(quant_methods: List[Dict[str, Any]]) -> None:
+    """Check that every quantization method has a suffix and known modifiers"""
+    for quant_method in quant_methods:
+        for key in ["setup_name", "model_suffix", "recipe"]:
+            if key not in quant_method:
+                raise ValueError(
+                    f"Quantization method is missing '{key}': {quant_method}"
+                )
+        for method in quant_method["recipe"]:
+            method_name = list(method)[0]
+            if method_name not in QUANT_MODIFIER_MODULES:
+                raise ValueError(
+                    f"Unknown quantization modifier in {quant_method['setup_name']}: "
+                    f"{method_name}. Available: {list(QUANT_MODIFIER_MODULES)}"
+                )
+
+
+def main(argv: List[str] | None = None):
     parser = argparse.ArgumentParser(description="Quantize language models to 8-bit")
     parser.add_argument("--config", type=str, help="Path to YAML config file")
     parser.add_argument("--model", type=str, help="Single model to quantize")
@@ -117,11 +190,24 @@ def main():
     parser.add_argument(
         "--max-seq-length", type=int, default=8192, help="Maximum sequence length"
     )
+    parser.add_argument(
+        "--no-screen",
+        action="store_true",
+        help="Skip the perplexity and top-1 agreement screen of quantized models",
+    )
+    parser.add_argument(
+        "--db-name",
+        type=str,
+        default=None,
+        help="SQLite database to write the screen results to",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Validate the config and list the models to produce without quantizing",
+    )
 
-    args = parser.parse_args()
-
-    output_dir = Path(args.output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    args = parser.parse_args(argv)
 
     if args.config:
         config = load_config(args.config)
@@ -129,6 +215,7 @@ def main():
         num_samples = config.get("num_calibration_samples", 512)
         max_seq_length = config.get("max_sequence_length", 8192)
         quant_methods = config.get("quant_methods", None)
+        screen_config = {**SCREEN_DEFAULTS, **(config.get("screen") or {})}
     else:
         if not args.model:
             logger.error("Either --config or --model must be specified")
@@ -136,9 +223,27 @@ def main():
         models = [args.model]
         num_samples = args.num_samples
         max_seq_length = args.max_seq_length
+        quant_methods = None
+        screen_config = dict(SCREEN_DEFAULTS)
 
     if not quant_methods:
         raise ValueError("The quantization schema is not specified")
+    validate_quant_methods(quant_methods)
+
+    if args.dry_run:
+        for model_name in models:
+            for quant_method in quant_methods:
+                model_output_dir = get_model_output_dir(
+                    args.output_dir, model_name, quant_method["model_suffix"]
+                )
+                logger.info(
+                    f"Would quantize {model_name} with {quant_method['setup_name']} "
+                    f"into {model_output_dir}"
+                )
+        return
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
 
     for model_name in models:
         for quant_method in quant_methods:
@@ -148,6 +253,8 @@ def main():
                 quant_method=quant_method,
                 num_calibration_samples=num_samples,
                 max_sequence_length=max_seq_length,
+                screen_config=None if args.no_screen else screen_config,
+                db_name=args.db_name,
             )
 
 
@@ -1,17 +1,28 @@
 import argparse
 import json
+import shlex
 import subprocess
+import sys
 import time
 import traceback
 import warnings
+from functools import partial
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List
 
-import libtmux
-import requests
 from tqdm import tqdm
 
-from spec_course.scripts.utils import load_config, setup_logger
+from spec_course.database.etl.load_test_metrics import raw_output_path, request_buckets
+from spec_course.database.etl.raw_records import server_metric_rows
+from spec_course.database.sink import DatabaseSink
+from spec_course.scripts.prometheus import (
+    PROMETHEUS_METRICS_FILE,
+    PrometheusScraper,
+    save_prometheus_summary,
+)
+from spec_course.scripts.server_logs import SERVER_METRICS_FILE, ServerLogRecorder
+from spec_course.scripts.server_pool import ServerPool, order_setups_for_reuse
+from spec_course.scripts.utils import load_config, log_context, setup_logger
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
@@ -19,20 +30,6 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 logger = setup_logger(log_name="load_test_experiments")
 
 
-def wait_for_server(url: str, max_retries: int = 120, delay: int = 10) -> bool:
-    """Wait for the vllm server to start by checking its health endpoint"""
-    for i in tqdm(range(max_retries), desc=f"Waiting for server at {url} to start..."):
-        try:
-            response = requests.get(url + "/health")
-            if response.status_code == 200:
-                time.sleep(90)  # Warm up time for the server
-                return True
-        except requests.RequestException:
-            pass
-        time.sleep(delay)
-    return False
-
-
 def run_background_process(
     command: str, output_dir: Path, log_name: str
 ) -> subprocess.Popen:
@@ -48,63 +45,152 @@ def run_background_process(
     return process
 
 
-def save_tmux_output(session_name: str, output_dir: Path, log_name: str) -> None:
-    """Save tmux session output to a file"""
-    server = libtmux.Server()
-    session = server.find_where({"session_name": session_name})
-    if session:
-        with open(output_dir / log_name, "w") as f:
-            pane = session.panes[0]
-            output_lines = pane.capture_pane("-S", "-10000")
-            output_lines.extend(pane.capture_pane())
-            output = "\n".join(line.strip("\n") for line in output_lines if line)
-            f.write(output)
-
-
-def create_vllm_command(setup: Dict[str, str]) -> List[str]:
-    """Create vllm command with arguments"""
-    server_args = setup.get("server_args", {})
-    env_args = setup.get("env_args", {})
-    env_args = " ".join([f"{k}={v}" for k, v in env_args.items()])
-    args_str = " ".join(
-        [
-            f"--{k} {v}"
-            for k, v in server_args.items()
-            if k not in ["model", "speculative_config"]
-        ]
+def create_load_test_command(
+    load_test_args: Dict[str, str],
+    load: Dict[str, str],
+    server_args: Dict[str, str],
+    results_dir: Path,
+    endpoint_url: str | None = None,
+) -> str:
+    """
+    Create load test command with arguments.
+    `load` holds the swept load level: either {"rps": ...} or {"concurrency": ...}.
+    """
+    args = []
+    for k, v in load_test_args.items():
+        if k in ["rps", "concurrency", "run-id"] or v is False:
+            continue
+        args.append(f"--{k}" if v is True else f"--{k} {v}")
+    args.extend(f"--{k} {v}" for k, v in load.items())
+    if endpoint_url:
+        args.append(f"--endpoint-url {endpoint_url}")
+
+    spec_config = server_args.get("speculative_config", {})
+    if spec_config:
+        args.append(f"--draft-model-name {spec_config['model']}")
+        args.append(f"--num-spec-tokens {spec_config['num_speculative_tokens']}")
+    args_str = " ".join(args)
+    full_run_id = (
+        f"{load_test_args['run-id']}_{spec_config.get('num_speculative_tokens', '')}"
+    )
+    # Run the module with this interpreter, independent of the working directory
+    return (
+        f"{shlex.quote(sys.executable)} -m spec_course.scripts.load_test {args_str}"
+        f" --model-name {server_args['model']} --run-id {full_run_id}"
+        f" --results-dir {results_dir}"
     )
-    model_name = server_args["model"]
-    if "speculative_config" in server_args:
-        spec_config = json.dumps(server_args["speculative_config"])
-        args_str += f" --speculative_config '{spec_config}'"
-    commands = [
-        "source ../.venv/bin/activate",
-        f"{env_args} vllm serve {model_name} {args_str}",
-    ]
-    return commands
 
 
-def create_load_test_command(
-    load_test_args: Dict[str, str], rps: str, model_name: str, suffix_run_id: str
-) -> str:
-    """Create load test command with arguments"""
-    args_str = " ".join(
-        [f"--{k} {v}" for k, v in load_test_args.items() if k not in ["rps", "run-id"]]
+def parse_sweep_values(values: str | int) -> List[str]:
+    """Parse sweep values given as 'start:end:step', 'start:end', 'a,b,c' or a single value"""
+    values = str(values)
+    if ":" in values:
+        if len(values.split(":")) == 3:
+            start, end, step = map(int, values.split(":"))
+        elif len(values.split(":")) == 2:
+            start, end = map(int, values.split(":"))
+            step = 1
+        else:
+            raise ValueError(
+                f"Invalid sweep format: {values}. Expected format is 'start:end:step' or 'start:end'."
+            )
+        return [str(value) for value in range(start, end + 1, step)]
+    return [value.strip() for value in values.split(",")]
+
+
+def expand_loads(load_test_args: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Load levels swept by a setup: concurrency levels if given, otherwise RPS values"""
+    if "concurrency" in load_test_args:
+        # Closed-loop sweep: throughput-vs-latency curve over concurrency levels
+        return [
+            {"concurrency": value}
+            for value in parse_sweep_values(load_test_args["concurrency"])
+        ]
+    if "rps" not in load_test_args:
+        raise ValueError("Load test setup needs either 'rps' or 'concurrency'")
+    return [{"rps": value} for value in parse_sweep_values(load_test_args["rps"])]
+
+
+def save_balancer_stats(stats: List[Dict[str, Any]], results_dir: Path) -> None:
+    """Log per-replica load and latency and save them next to the load test results"""
+    for replica_stats in stats:
+        mean_latency = replica_stats["mean_latency"]
+        logger.info(
+            f"Replica {replica_stats['url']}: {replica_stats['num_requests']} requests, "
+            f"{replica_stats['num_errors']} errors, "
+            f"max outstanding {replica_stats['max_outstanding']}, mean latency "
+            f"{f'{mean_latency:.3f}s' if mean_latency is not None else 'n/a'}"
+        )
+    if results_dir.exists():
+        with open(results_dir / "balancer_stats.json", "w") as f:
+            json.dump(stats, f, indent=4)
+
+
+def open_load_test_record(
+    sink: DatabaseSink,
+    load_test_args: Dict[str, Any],
+    load: Dict[str, str],
+    server_args: Dict[str, Any],
+    results_dir: Path,
+) -> int:
+    """
+    Queue the record of a load test that is about to start, from the input
+    parameters scripts/load_test.py will save, and return its key
+    """
+    spec_config = server_args.get("speculative_config", {})
+    num_spec_tokens = spec_config.get("num_speculative_tokens", 0)
+    input_params = {
+        "model_name": server_args["model"],
+        "draft_model_name": spec_config.get("model", ""),
+        "num_spec_tokens": num_spec_tokens,
+        "prompt_type": load_test_args.get("prompt-type", "random"),
+        "run_id": f"{load_test_args['run-id']}_{num_spec_tokens}",
+        **load,
+    }
+    return sink.open_record(
+        "load_test_metrics",
+        {"input_params": input_params, "folder_name": results_dir.name},
     )
-    full_run_id = f"{load_test_args['run-id']}_{suffix_run_id}"
-    return f"python3 scripts/load_test.py {args_str} --rps {rps} --model-name {model_name} --run-id {full_run_id}"
 
 
-def run_evaluation(setup: Dict[str, str]) -> None:
+def put_server_metrics(sink: DatabaseSink, key: int, record: Dict[str, Any]) -> None:
+    """Queue a record of ServerLogRecorder or PrometheusScraper as rows"""
+    sink.put_rows(key, "ld_server_metrics", server_metric_rows(record))
+
+
+def ingest_load_test_results(
+    sink: DatabaseSink, results_dir: Path, key: int | None = None
+) -> None:
+    """
+    Queue the results of a finished load test for the database writer. With
+    the key of its open record, the request buckets of the raw k6 output are
+    put under it, then the record is completed.
+    """
+    if not (results_dir / "metrics.json").exists():
+        logger.error(f"No load test metrics to ingest in {results_dir}")
+        return
+    raw_path = raw_output_path(results_dir)
+    if key is not None and raw_path is not None:
+        try:
+            sink.put_rows(key, "ld_request_buckets", request_buckets(raw_path))
+        except Exception as e:
+            logger.error(f"Error queueing request buckets of {raw_path}: {str(e)}")
+    sink.put_file("load_test_metrics", results_dir, key)
+    logger.info(f"Queued load test results from {results_dir}")
+
+
+def run_evaluation(
+    setup: Dict[str, str], pool: ServerPool, sink: DatabaseSink | None = None
+) -> None:
     """
     Run evaluation for a given setup. Steps:
-    1. Start vllm server with specified model and parameters.
-    2. Wait for the server to be ready.
-    3. Run load test with specified RPS values.
-    4. Log results and clean up.
+    1. Get a vllm server for the setup from the pool, starting it if needed.
+    2. Run load test with specified RPS values or concurrency levels.
+    3. Log results and queue them for the database writer if given. The
+       server metrics are put as they are recorded, the request buckets once
+       k6 has exited and the results at the end.
     """
     dir_log = Path(__file__).parent.parent / ".logs"
-    vllm_commands = create_vllm_command(setup["vllm"])
 
     model_name = (
         setup["vllm"]["server_args"]["model"].replace("/", "_").replace(".", "_")
@@ -124,77 +210,116 @@ def run_evaluation(setup: Dict[str, str]) -> None:
     timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
     current_setup = f"{model_name}_{draft_name}_{num_spec_tokens}"
 
-    log_name = f"vllm_{current_setup}_{timestamp}.log"
-    logger.info("Starting vllm server")
-    server = libtmux.Server()
-    if server.has_session(current_setup):
-        server.kill_session(current_setup)
-
-    session = server.new_session(current_setup)
-    window = session.attached_window
-    pane = window.attached_pane
-    for cmd in vllm_commands:
-        pane.send_keys(cmd)
-
-    base_url = "http://localhost:8000"
-    if not wait_for_server(base_url):
-        save_tmux_output(current_setup)
-        server.kill_session(current_setup)
-        raise RuntimeError(f"Server at {base_url} did not start in time")
-    logger.info("Started vllm server.")
-
-    rps = setup["load_test"]["rps"]
-    if ":" in rps:
-        if len(rps.split(":")) == 3:
-            start, end, step = map(int, rps.split(":"))
-        elif len(rps.split(":")) == 2:
-            start, end = map(int, rps.split(":"))
-            step = 1
-        else:
-            raise ValueError(
-                f"Invalid RPS format: {rps}. Expected format is 'start:end:step' or 'start:end'."
-            )
-        rps_values = range(start, end + 1, step)
-    else:
-        rps_values = [rps]
-
-    for rps_value in rps_values:
-        suffix_run_id = (
-            setup["vllm"]["server_args"]
-            .get("speculative_config", {})
-            .get("num_speculative_tokens", "")
+    group = pool.acquire(setup["vllm"], current_setup)
+    balancer = group.balancer
+    endpoint_url = group.endpoint_url
+
+    load_test_args = setup["load_test"]
+    for load in expand_loads(load_test_args):
+        load_name = "_".join(f"{k}_{v}" for k, v in load.items())
+        run_timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
+        results_dir = (
+            Path(__file__).parent.parent
+            / "results"
+            / "load_test"
+            / f"{load_test_args['run-id']}_{num_spec_tokens}_{run_timestamp}"
         )
         load_test_command = create_load_test_command(
-            setup["load_test"],
-            rps_value,
-            setup["vllm"]["server_args"]["model"],
-            suffix_run_id,
+            load_test_args,
+            load,
+            setup["vllm"]["server_args"],
+            results_dir,
+            endpoint_url,
         )
-        log_name = f"load_test_{rps_value}_{current_setup}_{timestamp}.log"
-        logger.info(f"Running load test for RPS {rps_value} with setup {current_setup}")
-        load_test_process = run_background_process(load_test_command, dir_log, log_name)
-        load_test_process.wait()
+        log_name = f"load_test_{load_name}_{current_setup}_{timestamp}.log"
+        logger.info(f"Running load test for {load_name} with setup {current_setup}")
+        key = None
+        on_record = None
+        if sink is not None:
+            key = open_load_test_record(
+                sink, load_test_args, load, setup["vllm"]["server_args"], results_dir
+            )
+            on_record = partial(put_server_metrics, sink, key)
+
+        log_recorder = ServerLogRecorder(results_dir / SERVER_METRICS_FILE, on_record)
+        scraper = PrometheusScraper(
+            [server.url for server in group.servers],
+            results_dir / PROMETHEUS_METRICS_FILE,
+            on_record=on_record,
+        )
+        scraper.start()
+        with group.stream_logs_to(log_recorder.record):
+            load_test_process = run_background_process(
+                load_test_command, dir_log, log_name
+            )
+            load_test_process.wait()
+        log_recorder.close()
+        save_prometheus_summary(scraper.stop(), results_dir)
         logger.info(
-            f"Load test completed for RPS {rps_value} and setup {current_setup}"
+            f"Recorded {log_recorder.num_records} server metrics log lines and "
+            f"{scraper.num_scrapes} /metrics scrapes ({scraper.num_errors} failed)"
         )
+        logger.info(f"Load test completed for {load_name} and setup {current_setup}")
+        if balancer is not None:
+            save_balancer_stats(balancer.collect_stats(), results_dir)
+        if sink is not None:
+            ingest_load_test_results(sink, results_dir, key)
         logger.info("-" * 80)
-    server.kill_session(current_setup)
 
 
-def main():
+def dry_run(setups: List[Dict[str, Any]]) -> None:
+    """Validate the setups and log the load tests they expand to, in run order"""
+    for setup in order_setups_for_reuse(setups):
+        server_args = setup["vllm"]["server_args"]
+        load_test_args = setup["load_test"]
+        if "run-id" not in load_test_args:
+            raise ValueError(f"Load test setup of {server_args['model']} has no run-id")
+        loads = expand_loads(load_test_args)
+        logger.info(f"Setup {server_args['model']}: {len(loads)} load tests")
+        for load in loads:
+            command = create_load_test_command(
+                load_test_args, load, server_args, Path("<results_dir>")
+            )
+            logger.info(f"Would run: {command}")
+
+
+def main(argv: List[str] | None = None):
     parser = argparse.ArgumentParser(description="Run server evaluation")
     parser.add_argument("--config", type=str, required=True, help="Path to config file")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--db_name",
+        type=str,
+        default=None,
+        help="Database to write results to after every load test, by a "
+        "background writer",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Validate the config and list the load tests without starting servers",
+    )
+    args = parser.parse_args(argv)
 
     config = load_config(args.config)
-    for setup in tqdm(config["setups"]):
-        try:
-            run_evaluation(setup)
-            logger.info("Setup completed successfully")
-        except Exception as e:
-            error_msg = f"Setup failed:\n{str(e)}\nTraceback:\n{traceback.format_exc()}"
-            logger.error(error_msg)
-            continue
+    if args.dry_run:
+        dry_run(config["setups"])
+        return
+    dir_log = Path(__file__).parent.parent / ".logs"
+    sink = DatabaseSink(args.db_name) if args.db_name else None
+    with ServerPool(dir_log) as pool:
+        for setup in tqdm(order_setups_for_reuse(config["setups"])):
+            try:
+                with log_context(setup_id=setup["load_test"].get("run-id")):
+                    run_evaluation(setup, pool, sink)
+                    logger.info("Setup completed successfully")
+            except Exception as e:
+                error_msg = (
+                    f"Setup failed:\n{str(e)}\nTraceback:\n{traceback.format_exc()}"
+                )
+                logger.error(error_msg)
+                continue
+    if sink is not None:
+        sink.close()
 
 
 if __name__ == "__main__":
@@ -1,30 +1,55 @@
 import argparse
-import contextlib
-import gc
 import json
 import os
 import time
 import traceback
 from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import ray
-import torch
-from datasets import load_dataset
+import numpy as np
 from tqdm import tqdm
-from vllm import LLM, SamplingParams
-from vllm.distributed.parallel_state import (
-    destroy_distributed_environment,
-    destroy_model_parallel,
-)
 
-from spec_course.scripts.utils import load_config, setup_logger
+from spec_course.database.etl.sd_metrics import request_acceptance_rows
+from spec_course.database.sink import DatabaseSink
+from spec_course.scripts.acceptance import (
+    acceptance_matrix,
+    acceptance_summary,
+    request_acceptance_lengths,
+    save_acceptance_matrix,
+    worst_prompts,
+)
+from spec_course.scripts.backends import (
+    BACKENDS,
+    GenerationBackend,
+    GenerationOutput,
+    create_backend,
+)
+from spec_course.scripts.prompt_sampling import (
+    SAMPLING_METHODS,
+    ci_half_width,
+    has_stratum_variances,
+    is_precise,
+    load_prompt_lengths,
+    select_prompts,
+    stratified_mean,
+)
+from spec_course.scripts.screening import failed_screen
+from spec_course.scripts.sd_config import (
+    RUN_ARG_NAMES,
+    expand_matrix,
+    load_cached_results,
+    make_cell,
+)
+from spec_course.scripts.token_store import save_token_store
+from spec_course.scripts.utils import load_config, log_context, setup_logger
 
 os.environ["VLLM_USE_V1"] = "0"
 
 logger = setup_logger(log_name="sd_experiments")
 
+NUM_WORST_PROMPTS = 20
+
 
 @dataclass
 class SDMetrics:
@@ -36,6 +61,46 @@ class SDMetrics:
     timestamp: str
     mean_acceptance_length: Optional[float] = None
     acceptance_rates: Optional[List[float]] = None
+    # Per-request acceptance counts are saved to a separate .npy file
+    acceptance_counts_file: Optional[str] = None
+    step_length_histogram: Optional[List[int]] = None
+    request_length_histogram: Optional[Dict[str, List[float]]] = None
+    worst_prompts: Optional[List[Dict[str, Any]]] = None
+    # Prompt selection and full-dataset estimates with their standard errors
+    sampling: str = "head"
+    seed: Optional[int] = None
+    prompt_indices: Optional[List[int]] = None
+    acceptance_length_estimate: Optional[float] = None
+    acceptance_length_stderr: Optional[float] = None
+    time_per_token_estimate: Optional[float] = None
+    time_per_token_stderr: Optional[float] = None
+    # Sequential mode: prompt budget, whether it stopped early and the CI reached
+    prompt_budget: Optional[int] = None
+    stopped_early: Optional[bool] = None
+    confidence: Optional[float] = None
+    acceptance_length_ci_half_width: Optional[float] = None
+    time_per_token_ci_half_width: Optional[float] = None
+    # Timing over repeated generations of the prompts after a warm-up;
+    # time_taken is the mean time of a repetition
+    warmup_iterations: int = 0
+    repetitions: int = 1
+    repetition_times: Optional[List[float]] = None
+    time_mean: Optional[float] = None
+    time_std: Optional[float] = None
+    time_min: Optional[float] = None
+    tokens_per_second_mean: Optional[float] = None
+    tokens_per_second_std: Optional[float] = None
+    tokens_per_second_min: Optional[float] = None
+    # Hash of the setup, dataset and run arguments, see scripts/sd_config.py
+    config_hash: Optional[str] = None
+    backend: str = "vllm"
+    # Prompt and output token ids of every request, see scripts/token_store.py
+    token_ids_file: Optional[str] = None
+    token_offsets_file: Optional[str] = None
+    # Replays of a model-free drafter on the tokens of another run, see
+    # scripts/drafter_replay.py
+    drafter: Optional[Dict[str, Any]] = None
+    replay_of: Optional[str] = None
 
     def to_dict(self):
         return asdict(self)
@@ -47,6 +112,8 @@ class SDMetrics:
 
 def prepare_prompts(dataset_type: str, num_prompts: int) -> List[str]:
     """Prepare prompts based on dataset type"""
+    from datasets import load_dataset
+
     if dataset_type == "code":
         dataset = load_dataset("google-research-datasets/mbpp", "full")
         prompts = dataset["test"]["text"]
@@ -65,55 +132,242 @@ def prepare_prompts(dataset_type: str, num_prompts: int) -> List[str]:
     return prompts[:num_prompts]
 
 
-def cleanup_vllm(llm: LLM):
-    """Clean up vLLM resources"""
-    destroy_model_parallel()
-    destroy_distributed_environment()
-    del llm
-    with contextlib.suppress(AssertionError):
-        torch.distributed.destroy_process_group()
-    gc.collect()
-    torch.cuda.empty_cache()
-    ray.shutdown()
-    logger.info("Successfully delete the llm pipeline and free the GPU memory.")
+def time_per_output_token(
+    outputs: List[GenerationOutput], request_times: List[float]
+) -> np.ndarray:
+    """Request time divided by its number of output tokens, NaN without output"""
+    output_tokens = np.array([len(output.token_ids) for output in outputs])
+    return np.divide(
+        request_times,
+        output_tokens,
+        out=np.full(len(outputs), np.nan),
+        where=output_tokens > 0,
+    )
 
 
-def run_offline_vllm(
-    server_args: Dict, dataset_type: str, num_prompts: int, output_dir: Path
-) -> SDMetrics:
-    """Run vLLM with given configuration and measure performance"""
-    logger.info(f"Initializing vLLM with config: {server_args}")
+def count_output_tokens(outputs: List[GenerationOutput]) -> int:
+    return sum(len(output.token_ids) for output in outputs)
 
-    llm = LLM(**server_args)
-    sampling_params = SamplingParams(temperature=0, max_tokens=256)
-
-    prompts = prepare_prompts(dataset_type, num_prompts)
-    messages = [[{"role": "user", "content": prompt}] for prompt in prompts]
 
+def generate_outputs(
+    backend: GenerationBackend,
+    messages: List[List[Dict[str, str]]],
+    should_stop: Callable[[List, List[float]], bool] | None = None,
+) -> Tuple[List[GenerationOutput], List[float], float, bool]:
+    """
+    Generate outputs one prompt at a time. Returns the outputs, the time of every
+    request, the total time and whether `should_stop` ended generation early.
+    Acceptance counts measured after generation are not part of the timing.
+    """
     outputs = []
+    request_times = []
+    stopped_early = False
 
-    start = time.time()
     for message in tqdm(messages, desc="Generating outputs"):
-        output = llm.chat(message, sampling_params)
-        outputs.append(output[0])
-    end = time.time()
+        request_start = time.perf_counter()
+        output = backend.generate(message)
+        request_times.append(time.perf_counter() - request_start)
+        logger.debug(
+            "Generated request",
+            extra={
+                "request_index": len(outputs),
+                "request_time": request_times[-1],
+                "num_output_tokens": len(output.token_ids),
+            },
+        )
+        backend.measure_acceptance(output)
+        outputs.append(output)
+        if should_stop is not None and should_stop(outputs, request_times):
+            stopped_early = True
+            break
+    return outputs, request_times, sum(request_times), stopped_early
+
+
+def timing_stats(
+    repetition_times: List[float], repetition_tokens: List[int]
+) -> Dict[str, float | None]:
+    """
+    Mean, standard deviation and minimum of time and tokens/s over repetitions.
+    The standard deviation is unknown (None) for a single repetition.
+    """
+    times = np.array(repetition_times)
+    tokens_per_second = np.array(repetition_tokens) / times
+    repeated = len(times) > 1
+    return {
+        "time_mean": float(times.mean()),
+        "time_std": float(times.std(ddof=1)) if repeated else None,
+        "time_min": float(times.min()),
+        "tokens_per_second_mean": float(tokens_per_second.mean()),
+        "tokens_per_second_std": (
+            float(tokens_per_second.std(ddof=1)) if repeated else None
+        ),
+        "tokens_per_second_min": float(tokens_per_second.min()),
+    }
+
+
+def has_converged(
+    outputs: List[GenerationOutput],
+    request_times: List[float],
+    prompt_strata: np.ndarray,
+    stratum_sizes: np.ndarray,
+    num_spec_tokens: int | None,
+    ci_tolerance: float,
+    confidence: float,
+) -> bool:
+    """Check whether the estimates of the prompts done so far are precise enough"""
+    strata = prompt_strata[: len(outputs)]
+    if not has_stratum_variances(strata):
+        return False
+    estimates = [
+        stratified_mean(
+            time_per_output_token(outputs, request_times), strata, stratum_sizes
+        )
+    ]
+    if num_spec_tokens:
+        matrix = acceptance_matrix(
+            [output.spec_token_acceptance_counts for output in outputs],
+            num_spec_tokens,
+        )
+        estimates.append(
+            stratified_mean(request_acceptance_lengths(matrix), strata, stratum_sizes)
+        )
+    return all(
+        is_precise(mean, stderr, ci_tolerance, confidence) for mean, stderr in estimates
+    )
 
-    time_taken = end - start
+
+def run_offline(
+    server_args: Dict,
+    dataset_type: str,
+    num_prompts: int,
+    output_dir: Path,
+    sampling: str = "head",
+    num_strata: int = 5,
+    seed: int = 0,
+    sequential: bool = False,
+    chunk_size: int = 16,
+    ci_tolerance: float = 0.02,
+    confidence: float = 0.95,
+    warmup_iterations: int = 0,
+    repetitions: int = 1,
+    config_hash: str | None = None,
+    backend: str = "vllm",
+    sink: DatabaseSink | None = None,
+) -> SDMetrics:
+    """
+    Run a setup with the given backend (see scripts/backends.py) and measure
+    performance.
+    In sequential mode prompts are processed in chunks, and the run stops once the
+    confidence intervals of the acceptance length and time per output token are
+    within `ci_tolerance` of the estimates, or `num_prompts` is used up.
+    After `warmup_iterations` discarded requests, the prompts are generated
+    `repetitions` times with the same model instance to measure timing variance.
+    The results are also queued for the database writer `sink` if given: the
+    record is opened before generation, the acceptance of every chunk of
+    `chunk_size` requests is put as it is measured and the record is completed
+    with the results file.
+    """
+    logger.info(f"Initializing {backend} backend with config: {server_args}")
+
+    all_prompts = prepare_prompts(dataset_type, -1)
+    lengths = None
+    if sampling == "stratified":
+        lengths = load_prompt_lengths(
+            all_prompts,
+            dataset_type,
+            server_args.get("tokenizer", server_args["model"]),
+        )
+    prompt_indices, prompt_strata, stratum_sizes = select_prompts(
+        all_prompts, num_prompts, sampling, lengths, num_strata, seed
+    )
+    if sequential and sampling == "stratified":
+        # Random order, so every chunk prefix is a sample of all strata
+        order = np.random.default_rng(seed).permutation(len(prompt_indices))
+        prompt_indices, prompt_strata = prompt_indices[order], prompt_strata[order]
+    prompts = [all_prompts[index] for index in prompt_indices]
+    logger.info(f"Selected {len(prompts)} of {len(all_prompts)} prompts ({sampling})")
 
     spec_config = server_args.get("speculative_config")
-    mean_acceptance_length = None
-    acceptance_rates = None
+    num_spec_tokens = spec_config["num_speculative_tokens"] if spec_config else None
 
-    if spec_config:
-        num_spec_tokens = spec_config["num_speculative_tokens"]
-        acceptance_counts = [0] * (num_spec_tokens + 1)
+    generation_backend = create_backend(backend, server_args)
+    messages = [[{"role": "user", "content": prompt}] for prompt in prompts]
 
-        for output in outputs:
-            for step, count in enumerate(output.metrics.spec_token_acceptance_counts):
-                acceptance_counts[step] += count
+    key = None
+    if sink is not None:
+        key = sink.open_record(
+            "sd_metrics",
+            {
+                "main_model": server_args["model"],
+                "speculative_model": spec_config["model"] if spec_config else None,
+                "dataset_type": dataset_type,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "num_spec_tokens": num_spec_tokens,
+                "backend": backend,
+                "sampling": sampling,
+                "num_prompts": len(prompts),
+            },
+        )
+    num_requests_put = 0
+
+    def put_acceptance_rows(outputs: List[GenerationOutput]) -> None:
+        """Queue the acceptance of the requests generated since the last call"""
+        nonlocal num_requests_put
+        matrix = acceptance_matrix(
+            [
+                output.spec_token_acceptance_counts
+                for output in outputs[num_requests_put:]
+            ],
+            num_spec_tokens,
+        )
+        indices = prompt_indices[num_requests_put : len(outputs)].tolist()
+        sink.put_rows(
+            key, "sd_request_acceptance", request_acceptance_rows(matrix, indices)
+        )
+        num_requests_put = len(outputs)
+
+    def should_stop(outputs: List, request_times: List[float]) -> bool:
+        if key is not None and spec_config and len(outputs) % chunk_size == 0:
+            put_acceptance_rows(outputs)
+        return (
+            sequential
+            and len(outputs) % chunk_size == 0
+            and len(outputs) < len(messages)
+            and has_converged(
+                outputs,
+                request_times,
+                prompt_strata,
+                stratum_sizes,
+                num_spec_tokens,
+                ci_tolerance,
+                confidence,
+            )
+        )
 
-        mean_acceptance_length = sum(acceptance_counts) / acceptance_counts[0]
-        acceptance_rates = [count / acceptance_counts[0] for count in acceptance_counts]
+    for i in tqdm(range(warmup_iterations), desc="Warming up"):
+        generation_backend.generate(messages[i % len(messages)])
+
+    # The first repetition decides the prompts; acceptance is measured on it only
+    outputs, request_times, time_taken, stopped_early = generate_outputs(
+        generation_backend, messages, should_stop
+    )
+    if stopped_early:
+        logger.info(f"Estimates converged after {len(outputs)} prompts")
+    if key is not None and spec_config:
+        put_acceptance_rows(outputs)
+    repetition_times = [time_taken]
+    repetition_tokens = [count_output_tokens(outputs)]
+    for _ in range(repetitions - 1):
+        repetition_outputs, _, repetition_time, _ = generate_outputs(
+            generation_backend, messages[: len(outputs)]
+        )
+        repetition_times.append(repetition_time)
+        repetition_tokens.append(count_output_tokens(repetition_outputs))
+    # Only the prompts actually processed take part in the results
+    prompts = prompts[: len(outputs)]
+    prompt_indices = prompt_indices[: len(outputs)]
+    prompt_strata = prompt_strata[: len(outputs)]
+    time_per_token = time_per_output_token(outputs, request_times)
 
     timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
     metrics = SDMetrics(
@@ -121,28 +375,83 @@ def run_offline_vllm(
         speculative_model=spec_config["model"] if spec_config else None,
         dataset_type=dataset_type,
         num_prompts=len(prompts),
-        time_taken=time_taken,
-        mean_acceptance_length=mean_acceptance_length,
-        acceptance_rates=acceptance_rates,
+        time_taken=float(np.mean(repetition_times)),
         timestamp=timestamp.replace("_", " "),
+        sampling=sampling,
+        seed=seed if sampling == "stratified" else None,
+        prompt_indices=prompt_indices.tolist(),
+        warmup_iterations=warmup_iterations,
+        repetitions=repetitions,
+        repetition_times=repetition_times,
+        config_hash=config_hash,
+        backend=backend,
+        **timing_stats(repetition_times, repetition_tokens),
+    )
+    metrics.time_per_token_estimate, metrics.time_per_token_stderr = stratified_mean(
+        time_per_token, prompt_strata, stratum_sizes
+    )
+    if sequential:
+        metrics.prompt_budget = len(messages)
+        metrics.stopped_early = stopped_early
+        metrics.confidence = confidence
+        metrics.time_per_token_ci_half_width = ci_half_width(
+            metrics.time_per_token_stderr, confidence
+        )
+
+    # Kept for replaying drafters offline on the target outputs
+    tokens_file = output_dir / f"token_ids_{timestamp}.npy"
+    offsets_file = output_dir / f"token_offsets_{timestamp}.npy"
+    save_token_store(
+        [output.prompt_token_ids for output in outputs],
+        [output.token_ids for output in outputs],
+        tokens_file,
+        offsets_file,
     )
+    metrics.token_ids_file = tokens_file.name
+    metrics.token_offsets_file = offsets_file.name
+
+    if spec_config:
+        matrix = acceptance_matrix(
+            [output.spec_token_acceptance_counts for output in outputs],
+            num_spec_tokens,
+        )
+        for name, value in acceptance_summary(matrix, num_spec_tokens).items():
+            setattr(metrics, name, value)
+
+        counts_file = output_dir / f"acceptance_counts_{timestamp}.npy"
+        save_acceptance_matrix(matrix, counts_file)
+        acceptance_lengths = request_acceptance_lengths(matrix)
+        metrics.acceptance_counts_file = counts_file.name
+        metrics.worst_prompts = worst_prompts(
+            acceptance_lengths, matrix, prompts, NUM_WORST_PROMPTS, prompt_indices
+        )
+        (
+            metrics.acceptance_length_estimate,
+            metrics.acceptance_length_stderr,
+        ) = stratified_mean(acceptance_lengths, prompt_strata, stratum_sizes)
+        if sequential:
+            metrics.acceptance_length_ci_half_width = ci_half_width(
+                metrics.acceptance_length_stderr, confidence
+            )
 
     output_file = output_dir / f"sd_results_{timestamp}.json"
     metrics.save_to_json(output_file)
     logger.info(f"Results saved to {output_file}")
-    cleanup_vllm(llm)
+    if sink is not None:
+        sink.put_file("sd_metrics", output_file, key)
+    generation_backend.close()
     return metrics
 
 
-def main():
+def main(argv: List[str] | None = None):
     parser = argparse.ArgumentParser(description="Run speculative decoding experiments")
     parser.add_argument("--config", type=str, required=True, help="Path to config file")
     parser.add_argument(
         "--dataset",
         type=str,
         choices=["code", "summary", "chat"],
-        required=True,
-        help="Dataset type to use",
+        default=None,
+        help="Dataset type to use (the matrix setup defines its own datasets)",
     )
     parser.add_argument(
         "--num_prompts",
@@ -153,63 +462,173 @@ def main():
     parser.add_argument(
         "--setup_type",
         type=str,
-        choices=["single_setup", "few_setups"],
+        choices=["single_setup", "few_setups", "matrix"],
         required=True,
         help="Which setup to use from config",
     )
+    parser.add_argument(
+        "--sampling",
+        type=str,
+        choices=SAMPLING_METHODS,
+        default="head",
+        help="Take the first prompts or a length-stratified sample of the dataset",
+    )
+    parser.add_argument(
+        "--num_strata",
+        type=int,
+        default=5,
+        help="Number of prompt length strata for stratified sampling",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the stratified sample"
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="Stop before --num_prompts once the estimates are precise enough",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=16,
+        help="Number of prompts between convergence checks in sequential mode",
+    )
+    parser.add_argument(
+        "--ci_tolerance",
+        type=float,
+        default=0.02,
+        help="Maximal CI half-width relative to the estimate in sequential mode",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the intervals in sequential mode",
+    )
+    parser.add_argument(
+        "--warmup_iterations",
+        type=int,
+        default=0,
+        help="Number of discarded warm-up requests before measuring",
+    )
+    parser.add_argument(
+        "--repetitions",
+        type=int,
+        default=1,
+        help="Number of measured generations of the prompts per setup",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=list(BACKENDS),
+        default="vllm",
+        help="vLLM, or transformers assisted generation that also runs on CPU",
+    )
+    parser.add_argument(
+        "--include_failed_screens",
+        action="store_true",
+        help="Also run setups with models that failed their quantization screen",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rerun setups that already have a valid result in --output_dir",
+    )
+    parser.add_argument(
+        "--dry_run",
+        "--dry-run",
+        action="store_true",
+        help="Validate the config and list the expanded setups without running them",
+    )
     parser.add_argument(
         "--output_dir",
         type=str,
         default="results/sd_experiments",
         help="Directory to save results",
     )
+    parser.add_argument(
+        "--db_name",
+        type=str,
+        default=None,
+        help="Database to write results to after every setup, by a background writer",
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.setup_type != "matrix" and args.dataset is None:
+        parser.error(f"--dataset is required for {args.setup_type}")
     config = load_config(args.config)
     output_dir = Path(args.output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    if not args.dry_run:
+        output_dir.mkdir(parents=True, exist_ok=True)
 
+    run_args = {name: getattr(args, name) for name in RUN_ARG_NAMES}
     if args.setup_type == "single_setup":
-        run_offline_vllm(
-            server_args=config["single_setup"]["server_args"],
-            dataset_type=args.dataset,
-            num_prompts=args.num_prompts,
-            output_dir=output_dir,
-        )
-        main_model = config["single_setup"]["server_args"]["model"]
-        speculative_model = (
-            config["single_setup"]["server_args"]
-            .get("speculative_config", {})
-            .get("model", "None")
-        )
-        logger.info(
-            f"Single setup completed: {main_model} {'with ' + speculative_model}"
-        )
-
+        cells = [
+            make_cell(config["single_setup"]["server_args"], args.dataset, run_args)
+        ]
+    elif args.setup_type == "few_setups":
+        cells = [
+            make_cell(setup["server_args"], args.dataset, run_args)
+            for setup in config["few_setups"]
+        ]
     else:
-        for setup in tqdm(config["few_setups"]):
-            main_model = setup["server_args"]["model"]
-            speculative_model = (
-                setup["server_args"].get("speculative_config", {}).get("model", "None")
+        cells = expand_matrix(config["matrix"], run_args)
+
+    cached = {} if args.force else load_cached_results(output_dir)
+    logger.info(
+        f"{len(cells)} setups, {sum(c['config_hash'] in cached for c in cells)} cached"
+    )
+
+    sink = DatabaseSink(args.db_name) if args.db_name and not args.dry_run else None
+    for cell in tqdm(cells, disable=args.dry_run):
+        server_args = cell["server_args"]
+        main_model = server_args["model"]
+        spec_config = server_args.get("speculative_config", {})
+        speculative_model = spec_config.get("model", "None")
+        if spec_config:
+            speculative_model += f" (k={spec_config.get('num_speculative_tokens')})"
+        setup_name = f"{main_model} with {speculative_model} on {cell['dataset_type']}"
+        if cell["config_hash"] in cached:
+            logger.info(
+                f"Skipping {setup_name}, cached in {cached[cell['config_hash']]}"
             )
-            try:
-                run_offline_vllm(
-                    server_args=setup["server_args"],
-                    dataset_type=args.dataset,
-                    num_prompts=args.num_prompts,
+            continue
+        failed_models = [
+            model
+            for model in [main_model, spec_config.get("model")]
+            if model and failed_screen(model)
+        ]
+        if failed_models and not args.include_failed_screens:
+            logger.info(
+                f"Skipping {setup_name}, failed the quantization screen: "
+                f"{', '.join(failed_models)}"
+            )
+            continue
+        if args.dry_run:
+            logger.info(f"Would run {setup_name} ({cell['config_hash']})")
+            continue
+        try:
+            with log_context(setup_id=cell["config_hash"]):
+                run_offline(
+                    server_args=server_args,
+                    dataset_type=cell["dataset_type"],
                     output_dir=output_dir,
+                    config_hash=cell["config_hash"],
+                    sink=sink,
+                    **cell["run_args"],
                 )
-                logger.info(
-                    f"Setup completed: {main_model} {'with ' + speculative_model}"
-                )
-            except Exception as e:
-                error_msg = (
-                    f"Setup failed: {main_model} {'with ' + speculative_model}:\n"
-                    f"{str(e)}\n"
-                    f"Traceback:\n{traceback.format_exc()}"
-                )
-                logger.error(error_msg)
-                continue
+                logger.info(f"Setup completed: {setup_name}")
+        except Exception as e:
+            error_msg = (
+                f"Setup failed: {setup_name}:\n"
+                f"{str(e)}\n"
+                f"Traceback:\n{traceback.format_exc()}"
+            )
+            logger.error(error_msg)
+            continue
+
+    if sink is not None:
+        sink.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+import json
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from spec_course.scripts.utils import config_hash
+
+SCREEN_CACHE_DIR = Path(".cache") / "screen"
+SCREEN_RESULTS_FILE = "screen_results.json"
+SCREEN_DATASET = ("wikitext", "wikitext-2-raw-v1", "test")
+# Held-out set size and the thresholds a quantized model must pass, overridden
+# by the `screen` block of the quantization config
+SCREEN_DEFAULTS = {
+    "num_samples": 32,
+    "seq_length": 512,
+    "batch_size": 4,
+    "min_top1_agreement": 0.9,
+    "max_perplexity_ratio": 1.25,
+}
+
+
+def get_screen_cache_path(
+    cache_dir: Path, name: str, model_name: str, screen_config: Dict[str, Any]
+) -> Path:
+    digest = config_hash(
+        [model_name, screen_config["num_samples"], screen_config["seq_length"]]
+    )
+    return cache_dir / f"{name}_{digest}.npz"
+
+
+def load_heldout_tokens(
+    tokenizer: Any,
+    tokenizer_name: str,
+    screen_config: Dict[str, Any],
+    cache_dir: Path = SCREEN_CACHE_DIR,
+) -> np.ndarray:
+    """
+    (num_samples, seq_length) token ids of consecutive chunks of the wikitext-2
+    test split, tokenized once per tokenizer and cached
+    """
+    cache_path = get_screen_cache_path(
+        cache_dir, "heldout", tokenizer_name, screen_config
+    )
+    if cache_path.exists():
+        return np.load(cache_path)["input_ids"]
+
+    from datasets import load_dataset
+
+    path, name, split = SCREEN_DATASET
+    text = "\n\n".join(load_dataset(path, name, split=split)["text"])
+    num_tokens = screen_config["num_samples"] * screen_config["seq_length"]
+    input_ids = np.array(
+        tokenizer(text, add_special_tokens=False)["input_ids"][:num_tokens],
+        dtype=np.int32,
+    )
+    if len(input_ids) < num_tokens:
+        raise ValueError(
+            f"The held-out set has {len(input_ids)} tokens, {num_tokens} are needed"
+        )
+    input_ids = input_ids.reshape(screen_config["num_samples"], -1)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(cache_path, input_ids=input_ids)
+    return input_ids
+
+
+def predict_heldout(
+    model: Any, input_ids: np.ndarray, batch_size: int
+) -> Tuple[np.ndarray, float]:
+    """Top-1 next-token predictions and the summed negative log-likelihood"""
+    import torch
+
+    top1 = []
+    nll = 0.0
+    with torch.no_grad():
+        for start in range(0, len(input_ids), batch_size):
+            batch = torch.tensor(
+                input_ids[start : start + batch_size], dtype=torch.long
+            ).to(model.device)
+            logits = model(batch).logits[:, :-1].float()
+            nll += torch.nn.functional.cross_entropy(
+                logits.reshape(-1, logits.shape[-1]),
+                batch[:, 1:].reshape(-1),
+                reduction="sum",
+            ).item()
+            top1.append(logits.argmax(dim=-1).cpu().numpy().astype(np.int32))
+    return np.concatenate(top1), nll
+
+
+def load_baseline_predictions(
+    model: Any,
+    model_name: str,
+    input_ids: np.ndarray,
+    screen_config: Dict[str, Any],
+    cache_dir: Path = SCREEN_CACHE_DIR,
+) -> Tuple[np.ndarray, float]:
+    """Predictions of the unquantized model, computed once per model and cached"""
+    cache_path = get_screen_cache_path(cache_dir, "baseline", model_name, screen_config)
+    if cache_path.exists():
+        cached = np.load(cache_path)
+        return cached["top1"], float(cached["nll"])
+
+    top1, nll = predict_heldout(model, input_ids, screen_config["batch_size"])
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(cache_path, top1=top1, nll=nll)
+    return top1, nll
+
+
+def screen_predictions(
+    top1: np.ndarray,
+    nll: float,
+    baseline_top1: np.ndarray,
+    baseline_nll: float,
+    screen_config: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Perplexities, top-1 agreement with the baseline and whether both pass"""
+    num_tokens = top1.size
+    perplexity = math.exp(nll / num_tokens)
+    baseline_perplexity = math.exp(baseline_nll / num_tokens)
+    top1_agreement = float((top1 == baseline_top1).mean())
+    return {
+        "perplexity": perplexity,
+        "baseline_perplexity": baseline_perplexity,
+        "perplexity_ratio": perplexity / baseline_perplexity,
+        "top1_agreement": top1_agreement,
+        "num_tokens": int(num_tokens),
+        "passed": bool(
+            top1_agreement >= screen_config["min_top1_agreement"]
+            and perplexity / baseline_perplexity
+            <= screen_config["max_perplexity_ratio"]
+        ),
+    }
+
+
+def save_screen_results(
+    output_dir: Path,
+    model_name: str,
+    setup_name: str,
+    metrics: Dict[str, Any],
+    screen_config: Dict[str, Any],
+) -> None:
+    """Save the screen of a quantized model into its folder"""
+    results = {
+        "model_name": output_dir.name,
+        "base_model": model_name,
+        "setup_name": setup_name,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        **metrics,
+        "screen_config": screen_config,
+    }
+    with open(output_dir / SCREEN_RESULTS_FILE, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def failed_screen(model_path: str | Path) -> Dict[str, Any] | None:
+    """Screen results of a local model that failed its screen, None otherwise"""
+    screen_path = Path(model_path) / SCREEN_RESULTS_FILE
+    if not screen_path.exists():
+        return None
+    with open(screen_path, "r") as f:
+        results = json.load(f)
+    return None if results.get("passed", True) else results
@@ -0,0 +1,126 @@
+import json
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List
+
+from spec_course.scripts.utils import config_hash
+
+# run_offline arguments that change the results of a setup
+RUN_ARG_NAMES = [
+    "num_prompts",
+    "sampling",
+    "num_strata",
+    "seed",
+    "sequential",
+    "chunk_size",
+    "ci_tolerance",
+    "confidence",
+    "warmup_iterations",
+    "repetitions",
+    "backend",
+]
+# Run arguments added later are left out at their default, so that the hashes
+# of earlier results stay the same
+HASHED_UNLESS_DEFAULT = {"backend": "vllm"}
+
+
+def make_cell(
+    server_args: Dict[str, Any], dataset_type: str, run_args: Dict[str, Any]
+) -> Dict[str, Any]:
+    """A concrete run: server args, dataset and run arguments with their hash"""
+    run_args = {
+        name: run_args[name]
+        for name in RUN_ARG_NAMES
+        if name in run_args
+        and (
+            name not in HASHED_UNLESS_DEFAULT
+            or run_args[name] != HASHED_UNLESS_DEFAULT[name]
+        )
+    }
+    return {
+        "server_args": server_args,
+        "dataset_type": dataset_type,
+        "run_args": run_args,
+        "config_hash": config_hash(
+            {
+                "server_args": server_args,
+                "dataset_type": dataset_type,
+                "run_args": run_args,
+            }
+        ),
+    }
+
+
+def expand_matrix(
+    matrix: Dict[str, Any], run_args: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """
+    Expand a sweep of targets x drafts x num_speculative_tokens x datasets x
+    sampling into concrete cells. `server_args` and `speculative_config` hold
+    arguments shared by all cells, a null draft runs the target alone (once,
+    independent of num_speculative_tokens), and every `sampling` entry
+    overrides the given run arguments.
+    """
+    drafts = matrix.get("drafts", [None])
+    spec_tokens = matrix.get("num_speculative_tokens", [])
+    samplings = matrix.get("sampling") or [{}]
+
+    for sampling in samplings:
+        unknown = set(sampling) - set(RUN_ARG_NAMES)
+        if unknown:
+            raise ValueError(
+                f"Unknown sampling params: {sorted(unknown)}. Available: {RUN_ARG_NAMES}"
+            )
+
+    cells = []
+    for target, draft, dataset_type, sampling in product(
+        matrix["targets"], drafts, matrix["datasets"], samplings
+    ):
+        cell_run_args = {**run_args, **sampling}
+        server_args = {**matrix.get("server_args", {}), "model": target}
+        if draft is None:
+            cells.append(make_cell(server_args, dataset_type, cell_run_args))
+            continue
+        for num_spec_tokens in spec_tokens:
+            speculative_config = {
+                **matrix.get("speculative_config", {}),
+                "model": draft,
+                "num_speculative_tokens": num_spec_tokens,
+            }
+            cells.append(
+                make_cell(
+                    {**server_args, "speculative_config": speculative_config},
+                    dataset_type,
+                    cell_run_args,
+                )
+            )
+    return cells
+
+
+def load_cached_results(output_dir: Path) -> Dict[str, Path]:
+    """
+    Map the config hash of every valid result in the output folder to its file.
+    A result is valid when it parses, has timing and its acceptance counts and
+    token files, if any, exist.
+    """
+    cached = {}
+    for result_path in sorted(output_dir.glob("sd_results_*.json")):
+        try:
+            with open(result_path, "r") as f:
+                result = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if not result.get("config_hash") or result.get("time_taken") is None:
+            continue
+        files = [
+            result.get(key)
+            for key in [
+                "acceptance_counts_file",
+                "token_ids_file",
+                "token_offsets_file",
+            ]
+        ]
+        if any(file and not (output_dir / file).exists() for file in files):
+            continue
+        cached[result["config_hash"]] = result_path
+    return cached
@@ -0,0 +1,105 @@
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+SERVER_METRICS_FILE = "server_metrics.jsonl"
+
+# Markers of the periodic vLLM stats lines (V0 and V1 engines) -> metrics source
+LOG_SOURCES = {
+    "Avg prompt throughput:": "scheduler",
+    "Speculative metrics:": "spec_decode",
+    "SpecDecoding metrics:": "spec_decode",
+}
+LOG_FIELD = re.compile(r"([A-Za-z][A-Za-z \-]*?):\s*(-?\d+(?:\.\d+)?)\s*(%?)")
+PER_POSITION_FIELD = re.compile(r"Per-position acceptance rate:\s*([\d.,\s]+)")
+# Different names of the same quantity across vLLM versions
+METRIC_ALIASES = {
+    "pending": "waiting",
+    "number_of_accepted_tokens": "accepted",
+    "number_of_draft_tokens": "drafted",
+    "number_of_emitted_tokens": "emitted",
+    "number_of_speculative_tokens": "num_spec_tokens",
+}
+
+
+def _metric_name(field_name: str) -> str:
+    name = re.sub(r"[^a-z0-9]+", "_", field_name.strip().lower()).strip("_")
+    return METRIC_ALIASES.get(name, name)
+
+
+def parse_metrics_line(line: str) -> Tuple[str, Dict[str, float]] | None:
+    """
+    Parse a periodic vLLM stats log line into (source, {metric: value}).
+    Percentages are converted to fractions, so acceptance rates of V0 and V1
+    engines are comparable. Returns None for all other lines.
+    """
+    source = None
+    for marker, marker_source in LOG_SOURCES.items():
+        position = line.find(marker)
+        if position != -1:
+            source = marker_source
+            break
+    if source is None:
+        return None
+
+    text = line[position:]
+    if source == "spec_decode":
+        text = text.split(":", 1)[1]
+    metrics = {}
+    per_position = PER_POSITION_FIELD.search(text)
+    if per_position:
+        text = text[: per_position.start()]
+        rates = [rate for rate in per_position.group(1).split(",") if rate.strip()]
+        for i, rate in enumerate(rates, start=1):
+            metrics[f"acceptance_rate_pos{i}"] = float(rate)
+    for field_name, value, percent in LOG_FIELD.findall(text):
+        metrics[_metric_name(field_name)] = float(value) / (100 if percent else 1)
+    return source, metrics
+
+
+class ServerLogRecorder:
+    """
+    Collect metrics from vLLM log lines as they are streamed and append them
+    to a JSONL time series, with offsets relative to the recorder start.
+    Every record is also passed to `on_record` if given.
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        on_record: Callable[[Dict[str, Any]], None] | None = None,
+    ):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.output_path = output_path
+        self.on_record = on_record
+        self.file = open(output_path, "w")
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.num_records = 0
+
+    def record(self, line: str, replica: int = 0) -> None:
+        parsed = parse_metrics_line(line)
+        if parsed is None:
+            return
+        source, metrics = parsed
+        record = {
+            "offset_s": round(time.time() - self.start_time, 3),
+            "replica": replica,
+            "source": source,
+            "metrics": metrics,
+        }
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            self.num_records += 1
+        if self.on_record is not None:
+            self.on_record(record)
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
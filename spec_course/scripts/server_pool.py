@@ -0,0 +1,313 @@
+import json
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import requests
+from tqdm import tqdm
+
+from spec_course.scripts.balancer import BalancerThread, LoadBalancer
+from spec_course.scripts.utils import config_hash, setup_logger
+
+logger = setup_logger(log_name="server_pool")
+
+# Replica i of a server group listens on BASE_PORT + i
+BASE_PORT = 8000
+BALANCER_PORT = 8100
+WARMUP_SECONDS = 90
+STOP_TIMEOUT = 30
+VENV_DIR = Path("../.venv")
+
+
+def server_key(vllm_setup: Dict[str, Any]) -> str:
+    """
+    Canonical hash of everything that defines the replicas of a server group.
+    The balancer policy is left out: the balancer is rebuilt for every setup.
+    """
+    return config_hash(
+        {
+            "server_args": vllm_setup.get("server_args", {}),
+            "env": vllm_setup.get("env", vllm_setup.get("env_args", {})),
+            "replicas": vllm_setup.get("replicas", 1),
+            "gpus_per_replica": vllm_setup.get("gpus_per_replica"),
+        }
+    )
+
+
+def order_setups_for_reuse(setups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Group setups that share a server so it is launched once per group.
+    Groups keep the order of their first setup, setups keep their order within a group.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for setup in setups:
+        groups.setdefault(server_key(setup["vllm"]), []).append(setup)
+    return [setup for group in groups.values() for setup in group]
+
+
+def create_vllm_command(
+    setup: Dict[str, Any], port: int | None = None, devices: str | None = None
+) -> Tuple[List[str], Dict[str, str]]:
+    """Create vllm command arguments and the environment variables to run it with"""
+    server_args = setup.get("server_args", {})
+    if port is not None:
+        server_args = {**server_args, "port": port}
+    env_args = {
+        k: str(v) for k, v in setup.get("env", setup.get("env_args", {})).items()
+    }
+    if devices is not None:
+        env_args["CUDA_VISIBLE_DEVICES"] = devices
+
+    venv_vllm = VENV_DIR / "bin" / "vllm"
+    executable = str(venv_vllm) if venv_vllm.exists() else shutil.which("vllm")
+    command = [executable or "vllm", "serve", server_args["model"]]
+    for k, v in server_args.items():
+        if k in ["model", "speculative_config"]:
+            continue
+        command.extend([f"--{k}", str(v)])
+    if "speculative_config" in server_args:
+        command.extend(
+            ["--speculative_config", json.dumps(server_args["speculative_config"])]
+        )
+    return command, env_args
+
+
+class ServerProcess:
+    """A supervised vllm server whose output is streamed to a log file"""
+
+    def __init__(
+        self,
+        command: List[str],
+        env: Dict[str, str],
+        url: str,
+        log_path: Path,
+        tail_lines: int = 50,
+    ):
+        self.command = command
+        self.env = env
+        self.url = url
+        self.log_path = log_path
+        self.tail = deque(maxlen=tail_lines)
+        self.process: subprocess.Popen | None = None
+        self.log_thread: threading.Thread | None = None
+        # Callbacks receiving every output line while it is streamed
+        self.listeners: List[Callable[[str], None]] = []
+
+    def start(self) -> None:
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.process = subprocess.Popen(
+            self.command,
+            # Unbuffered output so log lines are seen while the server runs
+            env={**os.environ, "PYTHONUNBUFFERED": "1", **self.env},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            start_new_session=True,
+        )
+        self.log_thread = threading.Thread(target=self._stream_logs, daemon=True)
+        self.log_thread.start()
+
+    def _stream_logs(self) -> None:
+        with open(self.log_path, "w") as log_file:
+            for line in self.process.stdout:
+                log_file.write(line)
+                log_file.flush()
+                self.tail.append(line.rstrip("\n"))
+                for listener in list(self.listeners):
+                    # A failing listener must not stop draining the pipe, or
+                    # the server blocks once it is full
+                    try:
+                        listener(line)
+                    except Exception as e:
+                        logger.error(f"Error in log listener of {self.url}: {e}")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def is_healthy(self) -> bool:
+        if not self.is_alive():
+            return False
+        try:
+            return requests.get(self.url + "/health", timeout=5).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def wait_until_ready(self, max_retries: int = 120, delay: int = 10) -> bool:
+        """Wait for the health endpoint, giving up early if the process exits"""
+        for _ in tqdm(
+            range(max_retries), desc=f"Waiting for server at {self.url} to start..."
+        ):
+            if not self.is_alive():
+                return False
+            if self.is_healthy():
+                return True
+            time.sleep(delay)
+        return False
+
+    def stop(self) -> None:
+        """Terminate the whole process group, killing it if it does not exit in time"""
+        if not self.is_alive():
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            self.process.wait(timeout=STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        except ProcessLookupError:
+            pass
+        if self.log_thread is not None:
+            self.log_thread.join(timeout=5)
+
+
+@dataclass
+class ServerGroup:
+    key: str
+    servers: List[ServerProcess] = field(default_factory=list)
+    balancer: BalancerThread | None = None
+
+    @property
+    def endpoint_url(self) -> str | None:
+        """URL for the load test, None when it should use the default server URL"""
+        if self.balancer is None:
+            return None
+        return f"http://localhost:{self.balancer.port}"
+
+    def is_healthy(self) -> bool:
+        return all(server.is_healthy() for server in self.servers)
+
+    def start_balancer(self, policy: str, port: int = BALANCER_PORT) -> None:
+        """Put a new load balancer with the given policy in front of the replicas"""
+        self.stop_balancer()
+        self.balancer = BalancerThread(
+            LoadBalancer([server.url for server in self.servers], policy),
+            "127.0.0.1",
+            port,
+        )
+        self.balancer.start()
+        logger.info(f"Started {policy} load balancer at {self.endpoint_url}")
+
+    def stop_balancer(self) -> None:
+        if self.balancer is not None:
+            self.balancer.stop()
+            self.balancer = None
+
+    @contextmanager
+    def stream_logs_to(self, callback: Callable[..., None]) -> Iterator[None]:
+        """Pass every server output line and its `replica` index to the callback"""
+        listeners = []
+        for replica_id, server in enumerate(self.servers):
+            listener = partial(callback, replica=replica_id)
+            server.listeners.append(listener)
+            listeners.append((server, listener))
+        try:
+            yield
+        finally:
+            for server, listener in listeners:
+                server.listeners.remove(listener)
+
+    def stop(self) -> None:
+        self.stop_balancer()
+        for server in self.servers:
+            server.stop()
+
+
+class ServerPool:
+    """
+    Keep the vllm server group of the previous setup running and hand it out again
+    to following setups with identical server args, env and replicas, behind a
+    balancer with the policy of the setup.
+    Only one group runs at a time since a group typically takes all GPUs.
+    """
+
+    def __init__(
+        self,
+        log_dir: Path,
+        warmup_seconds: float = WARMUP_SECONDS,
+        balancer_port: int = BALANCER_PORT,
+    ):
+        self.log_dir = log_dir
+        self.warmup_seconds = warmup_seconds
+        self.balancer_port = balancer_port
+        self.current: ServerGroup | None = None
+
+    def acquire(self, vllm_setup: Dict[str, Any], name: str) -> ServerGroup:
+        """Return a healthy server group for the setup, launching it if needed"""
+        key = server_key(vllm_setup)
+        if self.current is not None and self.current.key == key:
+            if self.current.is_healthy():
+                logger.info(f"Reusing running vllm server group {key}")
+            else:
+                logger.warning(f"Server group {key} is unhealthy, restarting it")
+                self.release()
+        else:
+            self.release()
+        if self.current is None:
+            self.current = self._launch(vllm_setup, key, name)
+        if len(self.current.servers) > 1:
+            self.current.start_balancer(
+                vllm_setup.get("balancer_policy", "least_outstanding"),
+                self.balancer_port,
+            )
+        return self.current
+
+    def _launch(self, vllm_setup: Dict[str, Any], key: str, name: str) -> ServerGroup:
+        timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
+        num_replicas = vllm_setup.get("replicas", 1)
+        gpus_per_replica = vllm_setup.get("gpus_per_replica")
+        group = ServerGroup(key)
+        for replica_id in range(num_replicas):
+            port = BASE_PORT + replica_id
+            devices = None
+            if gpus_per_replica:
+                first_device = replica_id * gpus_per_replica
+                devices = ",".join(
+                    str(device)
+                    for device in range(first_device, first_device + gpus_per_replica)
+                )
+            command, env = create_vllm_command(vllm_setup, port, devices)
+            replica_name = name if num_replicas == 1 else f"{name}_r{replica_id}"
+            server = ServerProcess(
+                command,
+                env,
+                f"http://localhost:{port}",
+                self.log_dir / f"vllm_{replica_name}_{timestamp}.log",
+            )
+            logger.info(f"Starting vllm server on port {port}")
+            server.start()
+            group.servers.append(server)
+
+        for server in group.servers:
+            if not server.wait_until_ready():
+                tail = "\n".join(server.tail)
+                group.stop()
+                raise RuntimeError(
+                    f"Server at {server.url} did not start in time. "
+                    f"Last output:\n{tail}"
+                )
+        time.sleep(self.warmup_seconds)
+        logger.info(f"Started {num_replicas} vllm server(s).")
+        return group
+
+    def release(self) -> None:
+        """Stop the running server group"""
+        if self.current is not None:
+            logger.info(f"Stopping vllm server group {self.current.key}")
+            self.current.stop()
+            self.current = None
+
+    def __enter__(self) -> "ServerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
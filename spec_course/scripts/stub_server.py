@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import json
+import time
+
+from spec_course.scripts.http_utils import format_response, read_http_message
+
+STUB_ACCEPTANCE_RATE = 0.7
+
+
+class StubServer:
+    """
+    Minimal OpenAI-compatible chat completion server for running the load test
+    tooling without accelerators. A request takes `base_latency` plus
+    `token_latency` per requested output token; with `max_concurrency` set,
+    further requests queue as they would on a saturated server.
+    """
+
+    def __init__(
+        self,
+        base_latency: float = 0.0,
+        token_latency: float = 0.0,
+        max_concurrency: int = 0,
+    ):
+        self.base_latency = base_latency
+        self.token_latency = token_latency
+        self.slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.num_requests = 0
+        self.num_running = 0
+        self.num_waiting = 0
+        self.prompt_tokens = 0
+        self.generation_tokens = 0
+        self.queue_time_sum = 0.0
+        self.latency_sum = 0.0
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening and return the bound port"""
+        self.server = await asyncio.start_server(self._handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_http_message(reader)
+                except ValueError:
+                    # Malformed Content-Length or chunk size
+                    writer.write(
+                        format_response(
+                            400, b'{"error": "bad request"}', keep_alive=False
+                        )
+                    )
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                status, body = await self._respond(request)
+                writer.write(
+                    format_response(status, body, keep_alive=request.keep_alive)
+                )
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request):
+        if request.method == "GET" and request.path == "/health":
+            return 200, b""
+        if request.method == "GET" and request.path == "/metrics":
+            return 200, self._metrics().encode()
+        if request.method != "POST" or request.path != "/v1/chat/completions":
+            return 404, b'{"error": "not found"}'
+
+        payload = json.loads(request.body or b"{}")
+        max_tokens = int(payload.get("max_tokens") or 16)
+        prompt = " ".join(
+            str(message.get("content", "")) for message in payload.get("messages", [])
+        )
+        self.num_requests += 1
+        latency = self.base_latency + self.token_latency * max_tokens
+        arrival = time.monotonic()
+        queue_time = 0.0
+        if self.slots is None:
+            await self._process(latency)
+        else:
+            self.num_waiting += 1
+            async with self.slots:
+                self.num_waiting -= 1
+                queue_time = time.monotonic() - arrival
+                await self._process(latency)
+        # Histograms are only updated for finished requests, as in vLLM
+        self.queue_time_sum += queue_time
+        self.latency_sum += time.monotonic() - arrival
+        self.prompt_tokens += len(prompt) // 4
+        self.generation_tokens += max_tokens
+
+        response = {
+            "id": f"stub-{self.num_requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "ok " * max_tokens},
+                    "finish_reason": "length",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": max_tokens,
+                "total_tokens": len(prompt) // 4 + max_tokens,
+            },
+        }
+        return 200, json.dumps(response).encode()
+
+    async def _process(self, latency: float) -> None:
+        self.num_running += 1
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            self.num_running -= 1
+
+    def _metrics(self) -> str:
+        """Canned vLLM-like Prometheus exposition text built from the counters"""
+        labels = 'model_name="stub"'
+        completed = self.num_requests - self.num_running - self.num_waiting
+        # Pretend a fixed share of one-token drafts per generated token is accepted
+        accepted = int(self.generation_tokens * STUB_ACCEPTANCE_RATE)
+        return (
+            "# HELP vllm:num_requests_running Number of requests in model execution.\n"
+            "# TYPE vllm:num_requests_running gauge\n"
+            f"vllm:num_requests_running{{{labels}}} {self.num_running}\n"
+            "# TYPE vllm:num_requests_waiting gauge\n"
+            f"vllm:num_requests_waiting{{{labels}}} {self.num_waiting}\n"
+            "# TYPE vllm:gpu_cache_usage_perc gauge\n"
+            f"vllm:gpu_cache_usage_perc{{{labels}}} {min(1.0, self.num_running / 64)}\n"
+            "# TYPE vllm:prompt_tokens_total counter\n"
+            f"vllm:prompt_tokens_total{{{labels}}} {float(self.prompt_tokens)}\n"
+            "# TYPE vllm:generation_tokens_total counter\n"
+            f"vllm:generation_tokens_total{{{labels}}} {float(self.generation_tokens)}\n"
+            "# TYPE vllm:request_success_total counter\n"
+            f'vllm:request_success_total{{finished_reason="length",{labels}}} '
+            f"{float(completed)}\n"
+            f'vllm:request_success_total{{finished_reason="stop",{labels}}} 0.0\n'
+            "# TYPE vllm:spec_decode_num_drafts_total counter\n"
+            f"vllm:spec_decode_num_drafts_total{{{labels}}} {float(self.generation_tokens)}\n"
+            "# TYPE vllm:spec_decode_num_draft_tokens_total counter\n"
+            f"vllm:spec_decode_num_draft_tokens_total{{{labels}}} "
+            f"{float(self.generation_tokens)}\n"
+            "# TYPE vllm:spec_decode_num_accepted_tokens_total counter\n"
+            f"vllm:spec_decode_num_accepted_tokens_total{{{labels}}} {float(accepted)}\n"
+            "# TYPE vllm:request_queue_time_seconds histogram\n"
+            f'vllm:request_queue_time_seconds_bucket{{{labels},le="+Inf"}} '
+            f"{float(completed)}\n"
+            f"vllm:request_queue_time_seconds_sum{{{labels}}} {self.queue_time_sum}\n"
+            f"vllm:request_queue_time_seconds_count{{{labels}}} {float(completed)}\n"
+            "# TYPE vllm:time_to_first_token_seconds histogram\n"
+            f'vllm:time_to_first_token_seconds_bucket{{{labels},le="+Inf"}} '
+            f"{float(completed)}\n"
+            f"vllm:time_to_first_token_seconds_sum{{{labels}}} "
+            f"{self.queue_time_sum + self.base_latency * completed}\n"
+            f"vllm:time_to_first_token_seconds_count{{{labels}}} {float(completed)}\n"
+            "# TYPE vllm:e2e_request_latency_seconds histogram\n"
+            f"vllm:e2e_request_latency_seconds_sum{{{labels}}} {self.latency_sum}\n"
+            f"vllm:e2e_request_latency_seconds_count{{{labels}}} {float(completed)}\n"
+        )
+
+
+async def serve(
+    host: str,
+    port: int,
+    base_latency: float,
+    token_latency: float,
+    max_concurrency: int,
+):
+    stub = StubServer(base_latency, token_latency, max_concurrency)
+    bound_port = await stub.start(host, port)
+    print(f"Stub server listening on {host}:{bound_port}")
+    await stub.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub chat completion server")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+    parser.add_argument(
+        "--base-latency", type=float, default=0.0, help="Latency per request (s)"
+    )
+    parser.add_argument(
+        "--token-latency",
+        type=float,
+        default=0.0,
+        help="Latency per requested output token (s)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=0,
+        help="Number of requests processed at once (0 for unlimited)",
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        serve(
+            args.host,
+            args.port,
+            args.base_latency,
+            args.token_latency,
+            args.max_concurrency,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,588 @@
+import argparse
+import gzip
+import io
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+from spec_course.scripts.acceptance import (
+    request_acceptance_lengths,
+    request_length_histogram,
+    save_acceptance_matrix,
+    step_length_histogram,
+    worst_prompts,
+)
+from spec_course.scripts.prometheus import (
+    PROMETHEUS_METRICS_FILE,
+    PROMETHEUS_SUMMARY_FILE,
+)
+from spec_course.scripts.server_logs import SERVER_METRICS_FILE
+from spec_course.scripts.utils import parse_duration
+
+QUANTIZATION_SCHEMES = ["FP8", "INT8", "sparse_05", "sparse_05_FP8", "sparse_05_INT8"]
+TARGET_MODELS = [
+    "meta-llama/Llama-3.1-8B-Instruct",
+    "models/Llama-3.1-8B-Instruct-scheme-FP8",
+]
+DRAFT_MODELS = [
+    "meta-llama/Llama-3.2-1B-Instruct",
+    *(f"models/Llama-3.2-1B-Instruct-scheme-{s}" for s in QUANTIZATION_SCHEMES),
+]
+EVAL_MODELS = [
+    *DRAFT_MODELS,
+    "meta-llama/Llama-3.1-8B-Instruct",
+    *(f"models/Llama-3.1-8B-Instruct-scheme-{s}" for s in QUANTIZATION_SCHEMES),
+]
+DATASETS = ["chat", "code", "summary"]
+# The sd_metrics ETL expects acceptance rates of five positions
+NUM_SPEC_TOKENS = 4
+# 2025-01-01; consecutive runs are RUN_INTERVAL seconds apart so names are unique
+START_TIME = 1_735_689_600
+RUN_INTERVAL = 600
+LOG_INTERVAL = 5
+# Requests per chunk of raw k6 output written at once
+RAW_CHUNK_SIZE = 1000
+RAW_TAGS = (
+    '{"expected_response":"true","group":"","method":"POST",'
+    '"name":"http://localhost:9000/v1/chat/completions","proto":"HTTP/1.1",'
+    '"scenario":"constant_request_rate","status":"200",'
+    '"url":"http://localhost:9000/v1/chat/completions"}'
+)
+
+
+def _draft_quality(rng: np.random.Generator) -> Dict[str, float]:
+    """Per-token acceptance probability of every draft model, lower when quantized"""
+    base = rng.uniform(0.7, 0.85)
+    return {
+        model: base if i == 0 else base - rng.uniform(0.0, 0.15)
+        for i, model in enumerate(DRAFT_MODELS)
+    }
+
+
+def synthetic_acceptance_matrix(
+    rng: np.random.Generator, num_requests: int, acceptance_prob: float
+) -> np.ndarray:
+    """
+    Per-request acceptance counts as saved by run_sd: the i-th draft token can
+    only be accepted when the previous one was, so every column is a binomial
+    draw from the one before. The probability varies between prompts.
+    """
+    steps = rng.integers(20, 200, num_requests)
+    probs = np.clip(rng.normal(acceptance_prob, 0.1, num_requests), 0.05, 0.98)
+    columns = [steps]
+    for _ in range(NUM_SPEC_TOKENS):
+        columns.append(rng.binomial(columns[-1], probs))
+    return np.stack(columns, axis=1).astype(np.int32)
+
+
+def write_accuracy_results(
+    output_dir: Path, num_files: int, rng: np.random.Generator
+) -> int:
+    """lm-eval gsm8k results, one folder per model as lm-eval writes them"""
+    base_scores = {model: rng.uniform(0.3, 0.85) for model in EVAL_MODELS}
+    for i in range(num_files):
+        model = EVAL_MODELS[rng.integers(len(EVAL_MODELS))]
+        date = START_TIME + i * RUN_INTERVAL + rng.uniform(0, 1)
+        score = float(np.clip(base_scores[model] + rng.normal(0, 0.01), 0, 1))
+        strict_score = float(np.clip(score - rng.uniform(0, 0.05), 0, 1))
+        result = {
+            "results": {
+                "gsm8k": {
+                    "alias": "gsm8k",
+                    "exact_match,strict-match": strict_score,
+                    "exact_match_stderr,strict-match": 0.012,
+                    "exact_match,flexible-extract": score,
+                    "exact_match_stderr,flexible-extract": 0.012,
+                }
+            },
+            "configs": {
+                "gsm8k": {
+                    "task": "gsm8k",
+                    "dataset_path": "gsm8k",
+                    "dataset_name": "main",
+                    "num_fewshot": 0,
+                    "metadata": {"version": 3.0, "pretrained": model},
+                }
+            },
+            "versions": {"gsm8k": 3.0},
+            "n-shot": {"gsm8k": 0},
+            "n-samples": {"gsm8k": {"original": 1319, "effective": 1319}},
+            "config": {
+                "model": "vllm",
+                "model_args": f"pretrained={model}",
+                "batch_size": "128",
+            },
+            "date": date,
+            "total_evaluation_time_seconds": str(rng.uniform(100, 1000)),
+        }
+        folder = output_dir / model.replace("/", "__")
+        folder.mkdir(parents=True, exist_ok=True)
+        # lm-eval names results by the ISO time of the run with ':' replaced
+        file_time = time.strftime("%Y-%m-%dT%H-%M-%S", time.gmtime(date))
+        micros = int((date % 1) * 1_000_000)
+        with open(folder / f"results_{file_time}.{micros:06d}.json", "w") as f:
+            json.dump(result, f, indent=2)
+    return num_files
+
+
+def write_sd_results(
+    output_dir: Path,
+    num_files: int,
+    rng: np.random.Generator,
+    num_prompts: int = 100,
+) -> int:
+    """
+    run_sd results with their per-request acceptance counts. Returns the number
+    of per-request rows written.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    draft_quality = _draft_quality(rng)
+    prompts = [f"Synthetic prompt {i}" for i in range(num_prompts)]
+    num_rows = 0
+    for i in range(num_files):
+        timestamp = time.strftime(
+            "%Y-%m-%d_%H:%M:%S", time.gmtime(START_TIME + i * RUN_INTERVAL)
+        )
+        target = TARGET_MODELS[rng.integers(len(TARGET_MODELS))]
+        # Every tenth run is a baseline without speculative decoding
+        draft = (
+            None
+            if rng.random() < 0.1
+            else DRAFT_MODELS[rng.integers(len(DRAFT_MODELS))]
+        )
+        repetition_times = rng.normal(num_prompts * 0.5, num_prompts * 0.01, 3)
+        if draft:
+            repetition_times /= 1 + draft_quality[draft]
+        tokens = num_prompts * 256
+        tokens_per_second = tokens / repetition_times
+        result: Dict[str, Any] = {
+            "main_model": target,
+            "speculative_model": draft,
+            "dataset_type": DATASETS[rng.integers(len(DATASETS))],
+            "num_prompts": num_prompts,
+            "time_taken": float(repetition_times.mean()),
+            "timestamp": timestamp.replace("_", " "),
+            "mean_acceptance_length": None,
+            "acceptance_rates": None,
+            "acceptance_counts_file": None,
+            "step_length_histogram": None,
+            "request_length_histogram": None,
+            "worst_prompts": None,
+            "sampling": "head",
+            "seed": None,
+            "prompt_indices": list(range(num_prompts)),
+            "warmup_iterations": 0,
+            "repetitions": len(repetition_times),
+            "repetition_times": repetition_times.tolist(),
+            "time_mean": float(repetition_times.mean()),
+            "time_std": float(repetition_times.std(ddof=1)),
+            "time_min": float(repetition_times.min()),
+            "tokens_per_second_mean": float(tokens_per_second.mean()),
+            "tokens_per_second_std": float(tokens_per_second.std(ddof=1)),
+            "tokens_per_second_min": float(tokens_per_second.min()),
+        }
+        if draft:
+            matrix = synthetic_acceptance_matrix(rng, num_prompts, draft_quality[draft])
+            counts = matrix.sum(axis=0)
+            lengths = request_acceptance_lengths(matrix)
+            counts_file = output_dir / f"acceptance_counts_{timestamp}.npy"
+            save_acceptance_matrix(matrix, counts_file)
+            result.update(
+                {
+                    "mean_acceptance_length": float(counts.sum() / counts[0]),
+                    "acceptance_rates": (counts / counts[0]).tolist(),
+                    "acceptance_counts_file": counts_file.name,
+                    "step_length_histogram": step_length_histogram(matrix),
+                    "request_length_histogram": request_length_histogram(
+                        lengths, NUM_SPEC_TOKENS
+                    ),
+                    "worst_prompts": worst_prompts(lengths, matrix, prompts, 20),
+                }
+            )
+            num_rows += num_prompts
+        with open(output_dir / f"sd_results_{timestamp}.json", "w") as f:
+            json.dump(result, f, indent=2)
+    return num_rows
+
+
+def _iso_time(unix_time: float) -> str:
+    seconds = int(unix_time)
+    micros = int((unix_time - seconds) * 1_000_000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + (
+        f".{micros:06d}+00:00"
+    )
+
+
+def write_raw_output(
+    raw_path: Path,
+    start_time: float,
+    offsets: np.ndarray,
+    latencies: np.ndarray,
+    prompt_tokens: np.ndarray,
+    completion_tokens: np.ndarray,
+) -> int:
+    """
+    Per-request k6 JSON output, gzipped and written in chunks of requests.
+    Returns the number of sample lines.
+    """
+    metrics = {
+        "http_req_duration": ("trend", "time"),
+        "failed_requests": ("rate", "default"),
+        "prompt_tokens": ("counter", "default"),
+        "completion_tokens": ("counter", "default"),
+    }
+    # k6 emits the samples of a request when it completes
+    end_times = start_time + offsets + latencies / 1000
+    order = np.argsort(end_times, kind="stable")
+    end_times, latencies = end_times[order], latencies[order]
+    prompt_tokens, completion_tokens = prompt_tokens[order], completion_tokens[order]
+    num_lines = 0
+    # A fixed gzip mtime keeps archives of the same seed byte-identical
+    with io.TextIOWrapper(gzip.GzipFile(raw_path, "wb", compresslevel=1, mtime=0)) as f:
+        for metric, (metric_type, contains) in metrics.items():
+            f.write(
+                f'{{"type":"Metric","data":{{"name":"{metric}","type":"{metric_type}",'
+                f'"contains":"{contains}","thresholds":[],"submetrics":null}},'
+                f'"metric":"{metric}"}}\n'
+            )
+        for chunk_start in range(0, len(end_times), RAW_CHUNK_SIZE):
+            lines = []
+            for end_time, latency, prompt, completion in zip(
+                end_times[chunk_start : chunk_start + RAW_CHUNK_SIZE].tolist(),
+                latencies[chunk_start : chunk_start + RAW_CHUNK_SIZE].tolist(),
+                prompt_tokens[chunk_start : chunk_start + RAW_CHUNK_SIZE].tolist(),
+                completion_tokens[chunk_start : chunk_start + RAW_CHUNK_SIZE].tolist(),
+            ):
+                point_time = _iso_time(end_time)
+                for metric, value in [
+                    ("http_req_duration", round(latency, 3)),
+                    ("failed_requests", 0),
+                    ("prompt_tokens", prompt),
+                    ("completion_tokens", completion),
+                ]:
+                    lines.append(
+                        f'{{"metric":"{metric}","type":"Point","data":{{'
+                        f'"time":"{point_time}","value":{value},"tags":{RAW_TAGS}}}}}\n'
+                    )
+            f.write("".join(lines))
+            num_lines += len(lines)
+    return num_lines
+
+
+def _trend(values: np.ndarray) -> Dict[str, float]:
+    """k6 summary-export trend stats"""
+    if len(values) == 0:
+        return {stat: 0.0 for stat in ["avg", "min", "med", "max"]}
+    p90, p95, p99 = np.percentile(values, [90, 95, 99])
+    return {
+        "avg": float(values.mean()),
+        "min": float(values.min()),
+        "med": float(np.median(values)),
+        "max": float(values.max()),
+        "p(90)": float(p90),
+        "p(95)": float(p95),
+        "p(99)": float(p99),
+    }
+
+
+def write_server_metrics(
+    folder: Path,
+    rng: np.random.Generator,
+    seconds: float,
+    rps: int,
+    load: float,
+    acceptance_prob: float | None,
+    latencies: np.ndarray,
+) -> int:
+    """
+    Server metric time series from the vLLM logs and /metrics, and the run summary.
+    Returns the number of metric rows.
+    """
+    num_rows = 0
+    running = min(rps * latencies.mean() / 1000, 256) if len(latencies) else 0.0
+    waiting = max(load - 1, 0) * rps * seconds / 10
+    with open(folder / SERVER_METRICS_FILE, "w") as log_file, open(
+        folder / PROMETHEUS_METRICS_FILE, "w"
+    ) as prometheus_file:
+        for offset in np.arange(LOG_INTERVAL, seconds + LOG_INTERVAL, LOG_INTERVAL):
+            scheduler = {
+                "avg_prompt_throughput": float(rps * 1000 * rng.uniform(0.9, 1.1)),
+                "avg_generation_throughput": float(rps * 256 * rng.uniform(0.9, 1.1)),
+                "running": float(round(running)),
+                "waiting": float(round(waiting * offset / seconds)),
+                "gpu_kv_cache_usage": float(min(load, 1.0) * rng.uniform(0.5, 0.9)),
+            }
+            records = [(log_file, "scheduler", scheduler)]
+            prometheus = {
+                "running": scheduler["running"],
+                "waiting": scheduler["waiting"],
+                "gpu_cache_usage": scheduler["gpu_kv_cache_usage"],
+                "requests_per_s": float(min(rps, rps / load)),
+                "mean_e2e_latency": float(latencies.mean() / 1000),
+            }
+            if acceptance_prob is not None:
+                rates = acceptance_prob ** np.arange(1, NUM_SPEC_TOKENS + 1)
+                records.append(
+                    (
+                        log_file,
+                        "spec_decode",
+                        {
+                            "draft_acceptance_rate": float(rates.mean()),
+                            "system_efficiency": float(rates.sum() / NUM_SPEC_TOKENS),
+                            **{
+                                f"acceptance_rate_pos{i}": float(rate)
+                                for i, rate in enumerate(rates, start=1)
+                            },
+                        },
+                    )
+                )
+                prometheus["draft_acceptance_rate"] = float(rates.mean())
+            records.append((prometheus_file, "prometheus", prometheus))
+            for output_file, source, metrics in records:
+                record = {
+                    "offset_s": float(offset),
+                    "replica": 0,
+                    "source": source,
+                    "metrics": metrics,
+                }
+                output_file.write(json.dumps(record) + "\n")
+                num_rows += len(metrics)
+
+    acceptance_rate = (
+        float((acceptance_prob ** np.arange(1, NUM_SPEC_TOKENS + 1)).mean())
+        if acceptance_prob is not None
+        else None
+    )
+    summary = {
+        "spec_acceptance_rate": acceptance_rate,
+        "mean_acceptance_length": (
+            1 + acceptance_rate * NUM_SPEC_TOKENS if acceptance_rate else None
+        ),
+        "mean_ttft": float(latencies.mean() / 1000 * 0.1),
+        "mean_queue_time": float(waiting / max(rps, 1)),
+        "mean_tpot": float(latencies.mean() / 1000 / 256),
+        "max_num_waiting": float(round(waiting)),
+        "max_gpu_cache_usage": float(min(load, 1.0)),
+    }
+    with open(folder / PROMETHEUS_SUMMARY_FILE, "w") as f:
+        json.dump(summary, f, indent=4)
+    return num_rows
+
+
+def write_load_tests(
+    output_dir: Path,
+    num_runs: int,
+    rng: np.random.Generator,
+    duration: str = "60s",
+    raw_output: bool = False,
+    server_metrics: bool = False,
+) -> Dict[str, int]:
+    """
+    Load test result folders as written by run_load_test. Latency grows with
+    the load and runs above the setup capacity drop requests. Returns the number
+    of requests, raw sample lines and server metric rows written.
+    """
+    seconds = parse_duration(duration)
+    draft_quality = _draft_quality(rng)
+    totals = {"requests": 0, "raw_lines": 0, "server_metric_rows": 0}
+    for i in range(num_runs):
+        run_start = START_TIME + i * RUN_INTERVAL
+        spec_tokens = int(rng.integers(0, NUM_SPEC_TOKENS + 2))
+        draft = DRAFT_MODELS[rng.integers(len(DRAFT_MODELS))] if spec_tokens else ""
+        acceptance_prob = draft_quality[draft] if draft else None
+        rps = int(rng.integers(1, 33))
+        # Speculative decoding speeds up light loads and costs capacity at heavy ones
+        capacity = 16 - 1.5 * spec_tokens if draft else 20
+        speedup = 1 + acceptance_prob * spec_tokens / 2 if draft else 1
+        load = rps / capacity
+
+        num_requests = int(rng.poisson(min(rps, capacity) * seconds))
+        offsets = np.sort(rng.uniform(0, seconds, num_requests))
+        completion_tokens = np.maximum(rng.normal(256, 8, num_requests), 1).astype(int)
+        prompt_tokens = np.maximum(rng.normal(1000, 128, num_requests), 1).astype(int)
+        median_latency = 20 * 256 / speedup * (1 + max(load - 0.7, 0) * 5)
+        latencies = median_latency * rng.lognormal(0, 0.2, num_requests)
+        dropped = int(max(rps * seconds - num_requests, 0)) if load > 1 else 0
+
+        run_id = f"sd_{spec_tokens}" if draft else "single_model_"
+        date = time.strftime("%Y-%m-%d_%H:%M:%S", time.gmtime(run_start))
+        folder = output_dir / f"{run_id}_{date}"
+        folder.mkdir(parents=True, exist_ok=True)
+        input_params = {
+            "rps": str(rps),
+            "duration": duration,
+            "model_name": TARGET_MODELS[0],
+            "draft_model_name": draft,
+            "num_spec_tokens": spec_tokens,
+            "endpoint_url": "http://localhost:8000",
+            "input_tokens_distribution": "1000,128",
+            "output_tokens_distribution": "256,8",
+            "prompt_type": DATASETS[rng.integers(len(DATASETS))],
+            "run_id": run_id,
+            "exact_prompts": False,
+            "tokenizer": None,
+            "corpus_size": 1000,
+            "seed": 0,
+            "concurrency": 0,
+            "arrival_process": "constant",
+            "arrival_cv": 2.0,
+            "ramp_stages": "",
+            "burst_on": "0s",
+            "burst_off": "0s",
+            "max_vus": 500,
+            "trace": None,
+            "trace_time_scale": 1.0,
+            "results_dir": str(folder),
+            "raw_output": raw_output,
+        }
+        latency_trend = _trend(latencies)
+        metrics = {
+            "root_group": {"name": "", "path": "", "id": "", "groups": {}},
+            "metrics": {
+                "http_req_duration": latency_trend,
+                "end_to_end_latency": latency_trend,
+                "iterations": {
+                    "count": num_requests,
+                    "rate": (
+                        num_requests / (seconds + latencies.max() / 1000)
+                        if num_requests
+                        else 0.0
+                    ),
+                },
+                "dropped_iterations": {"count": dropped, "rate": dropped / seconds},
+                "failed_requests": {"passes": 0, "fails": num_requests, "value": 0},
+                "prompt_tokens": {
+                    "count": int(prompt_tokens.sum()),
+                    "rate": float(prompt_tokens.sum() / seconds),
+                },
+                "completion_tokens": {
+                    "count": int(completion_tokens.sum()),
+                    "rate": float(completion_tokens.sum() / seconds),
+                },
+                "vus_max": {"value": 500, "min": 500, "max": 500},
+            },
+        }
+        with open(folder / "input_params.json", "w") as f:
+            json.dump(input_params, f, indent=4)
+        with open(folder / "metrics.json", "w") as f:
+            json.dump(metrics, f, indent=4)
+
+        totals["requests"] += num_requests
+        if raw_output:
+            totals["raw_lines"] += write_raw_output(
+                folder / "raw.json.gz",
+                run_start,
+                offsets,
+                latencies,
+                prompt_tokens,
+                completion_tokens,
+            )
+        if server_metrics:
+            totals["server_metric_rows"] += write_server_metrics(
+                folder, rng, seconds, rps, load, acceptance_prob, latencies
+            )
+    return totals
+
+
+def generate_archive(
+    output_dir: Path,
+    seed: int = 0,
+    num_accuracy: int = 0,
+    num_sd: int = 0,
+    num_load_tests: int = 0,
+    num_prompts: int = 100,
+    duration: str = "60s",
+    raw_output: bool = False,
+    server_metrics: bool = False,
+) -> Dict[str, int]:
+    """
+    Write a results archive laid out as the `results` folder: lm-eval results in
+    gsm8k/, run_sd results in sd_experiments/ and load tests in load_test/.
+    The same seed and counts always produce the same archive.
+    """
+    rng = np.random.default_rng(seed)
+    counts = {
+        "accuracy_files": write_accuracy_results(
+            output_dir / "gsm8k", num_accuracy, rng
+        ),
+        "sd_files": num_sd,
+        "sd_request_rows": write_sd_results(
+            output_dir / "sd_experiments", num_sd, rng, num_prompts
+        ),
+        "load_tests": num_load_tests,
+    }
+    load_test_counts = write_load_tests(
+        output_dir / "load_test",
+        num_load_tests,
+        rng,
+        duration,
+        raw_output,
+        server_metrics,
+    )
+    counts.update({f"load_test_{k}": v for k, v in load_test_counts.items()})
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic results archive for scale testing"
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        required=True,
+        help="Folder for the archive (gsm8k/, sd_experiments/, load_test/)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--num_accuracy", type=int, default=0, help="Number of lm-eval result files"
+    )
+    parser.add_argument(
+        "--num_sd", type=int, default=0, help="Number of run_sd result files"
+    )
+    parser.add_argument(
+        "--num_load_tests", type=int, default=0, help="Number of load test folders"
+    )
+    parser.add_argument(
+        "--num_prompts",
+        type=int,
+        default=100,
+        help="Prompts per run_sd result, i.e. per-request acceptance rows",
+    )
+    parser.add_argument(
+        "--duration", type=str, default="60s", help="Duration of every load test"
+    )
+    parser.add_argument(
+        "--raw_output",
+        action="store_true",
+        help="Write per-request k6 samples (raw.json.gz) for every load test",
+    )
+    parser.add_argument(
+        "--server_metrics",
+        action="store_true",
+        help="Write server log and /metrics time series for every load test",
+    )
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+    counts = generate_archive(
+        Path(args.output_dir),
+        args.seed,
+        args.num_accuracy,
+        args.num_sd,
+        args.num_load_tests,
+        args.num_prompts,
+        args.duration,
+        args.raw_output,
+        args.server_metrics,
+    )
+    for name, value in counts.items():
+        print(f"{name}: {value}")
+    print(f"Written to {args.output_dir} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from itertools import chain
+from pathlib import Path
+from typing import Sequence, Tuple
+
+import numpy as np
+
+TOKEN_DTYPE = np.int32
+
+
+def save_token_store(
+    prompt_token_ids: Sequence[Sequence[int]],
+    output_token_ids: Sequence[Sequence[int]],
+    tokens_path: Path,
+    offsets_path: Path,
+) -> None:
+    """
+    Save the prompt and output token ids of every request as one int32 buffer,
+    request after request, with the prompt followed by the output. The offsets
+    file holds a (requests, 3) array of buffer start, prompt length and output
+    length.
+    """
+    prompt_lengths = np.array([len(ids) for ids in prompt_token_ids], dtype=np.int64)
+    output_lengths = np.array([len(ids) for ids in output_token_ids], dtype=np.int64)
+    lengths = prompt_lengths + output_lengths
+    starts = np.cumsum(lengths) - lengths
+    tokens = np.fromiter(
+        chain.from_iterable(
+            chain(prompt, output)
+            for prompt, output in zip(prompt_token_ids, output_token_ids)
+        ),
+        dtype=TOKEN_DTYPE,
+        count=int(lengths.sum()),
+    )
+    np.save(tokens_path, tokens)
+    np.save(offsets_path, np.stack([starts, prompt_lengths, output_lengths], axis=1))
+
+
+def load_token_store(
+    tokens_path: Path | str, offsets_path: Path | str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Memory-map the token buffer and load its offsets"""
+    return np.load(tokens_path, mmap_mode="r"), np.load(offsets_path)
+
+
+def request_tokens(
+    tokens: np.ndarray, offsets: np.ndarray, index: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Prompt and output token ids of a request"""
+    start, prompt_length, output_length = offsets[index]
+    output_start = start + prompt_length
+    return (
+        tokens[start:output_start],
+        tokens[output_start : output_start + output_length],
+    )
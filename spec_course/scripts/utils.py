@@ -1,33 +1,128 @@
+import atexit
+import hashlib
+import json
 import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Iterator, Union
 
 import yaml
 
 LOG_PATH = Path(".logs")
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(pathname)s:%(lineno)d - %(message)s"
+# Log files are appended to and rotated at this size
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# `json` for JSON-lines records, and the level of every logger
+LOG_FORMAT_ENV = "SPEC_COURSE_LOG_FORMAT"
+LOG_LEVEL_ENV = "SPEC_COURSE_LOG_LEVEL"
+# Tells apart the records of concurrent runs appending to the same files
+RUN_ID = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+# Attributes of every log record, the others come from `extra` or the context
+LOG_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+_listeners: Dict[str, QueueListener] = {}
+_listeners_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Add fields such as a setup ID to the records logged in the block"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Attach the run ID and `log_context` fields before the record is queued"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = RUN_ID
+        for name, value in _log_context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record, with the `extra` and context fields. Tracebacks
+    are part of the message, as the queue handler formats them in.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.pathname}:{record.lineno}",
+            "message": record.getMessage(),
+            **{
+                name: value
+                for name, value in vars(record).items()
+                if name not in LOG_RECORD_ATTRIBUTES
+            },
+        }
+        return json.dumps(entry, default=str)
 
 
 def setup_logger(
-    output_dir: Union[str, Path] = LOG_PATH, log_name: str = "test"
+    output_dir: Union[str, Path] = LOG_PATH,
+    log_name: str = "test",
+    json_format: bool | None = None,
+    max_bytes: int = LOG_MAX_BYTES,
+    backup_count: int = LOG_BACKUP_COUNT,
 ) -> logging.Logger:
-    if isinstance(output_dir, str):
-        output_dir = Path(output_dir)
+    """
+    Logger writing to the console and to `<output_dir>/<log_name>.log`, which is
+    appended to and rotated. Records are queued and formatted and written by a
+    background thread, so logging calls never wait for I/O. `json_format`
+    (default: SPEC_COURSE_LOG_FORMAT=json) writes JSON lines with the run ID and
+    the `log_context` fields. Later calls with the same name return the logger
+    as it is.
+    """
+    logger = logging.getLogger(log_name)
+    with _listeners_lock:
+        if log_name in _listeners:
+            return logger
 
-    output_dir.mkdir(parents=True, exist_ok=True)
-    log_file = Path(output_dir) / f"{log_name}.log"
-    formatter = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(pathname)s:%(lineno)d - %(message)s"
-    )
-    file_handler = logging.FileHandler(log_file, mode="w")
-    file_handler.setFormatter(formatter)
+        if isinstance(output_dir, str):
+            output_dir = Path(output_dir)
+        if json_format is None:
+            json_format = os.environ.get(LOG_FORMAT_ENV, "text") == "json"
 
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        log_file = Path(output_dir) / f"{log_name}.log"
+        formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+        file_handler = RotatingFileHandler(
+            log_file, mode="a", maxBytes=max_bytes, backupCount=backup_count
+        )
+        file_handler.setFormatter(formatter)
 
-    logger = logging.getLogger(log_name)
-    logger.setLevel(logging.INFO)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        listener = QueueListener(log_queue, file_handler, console_handler)
+        listener.start()
+        # Write the records still queued when the process exits
+        atexit.register(listener.stop)
+        _listeners[log_name] = listener
+
+        logger.setLevel(os.environ.get(LOG_LEVEL_ENV, "INFO").upper())
+        logger.addHandler(queue_handler)
 
     return logger
 
@@ -35,3 +130,18 @@ def setup_logger(
 def load_config(config_path):
     with open(config_path, "r") as f:
         return yaml.safe_load(f)
+
+
+def parse_duration(duration: str) -> float:
+    """Parse a k6 style duration such as `500ms`, `60s`, `2m` or `1h` into seconds"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|s|m|h)", duration.strip())
+    if not match:
+        raise ValueError(f"Invalid duration: {duration}")
+    value, unit = float(match.group(1)), match.group(2)
+    return value * {"ms": 1e-3, "s": 1, "m": 60, "h": 3600}[unit]
+
+
+def config_hash(config: Any) -> str:
+    """Hash a JSON-serializable config independently of its key order"""
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
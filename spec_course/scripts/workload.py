@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+SCHEDULE_FILE = "schedule.json"
+REQUESTS_FILE = "requests.json"
+
+
+class JsonArrayWriter:
+    """Write a JSON array item by item without keeping it in memory"""
+
+    def __init__(self, file_path: Path | str):
+        self.file_path = file_path
+        self.count = 0
+
+    def __enter__(self) -> "JsonArrayWriter":
+        self.file = open(self.file_path, "w")
+        self.file.write("[")
+        return self
+
+    def write(self, item: Any) -> None:
+        if self.count:
+            self.file.write(",\n")
+        self.file.write(json.dumps(item, separators=(",", ":")))
+        self.count += 1
+
+    def __exit__(self, *exc) -> None:
+        self.file.write("]\n")
+        self.file.close()
+
+
+def iter_trace(trace_path: Path | str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream requests from a JSONL trace. Every line has `timestamp_offset` (seconds),
+    `max_tokens` and either `messages` or `prompt_len` (in tokens).
+    """
+    with open(trace_path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "timestamp_offset" not in record or "max_tokens" not in record:
+                raise ValueError(
+                    f"Trace line {line_number} must have timestamp_offset and max_tokens"
+                )
+            if "messages" not in record and "prompt_len" not in record:
+                raise ValueError(
+                    f"Trace line {line_number} must have messages or prompt_len"
+                )
+            yield record
+
+
+def write_schedule(
+    results_dir: Path,
+    requests: Iterable[Tuple[float, Dict[str, Any]]],
+    duration: float | None = None,
+) -> Dict[str, float]:
+    """
+    Write (offset, request) pairs as the schedule and request files read by k6.
+    Without a known duration offsets are shifted so that the first request starts
+    at zero and the schedule lasts until the last request.
+    """
+    first_offset = 0.0 if duration is not None else None
+    offset = 0.0
+    with JsonArrayWriter(results_dir / SCHEDULE_FILE) as schedule:
+        with JsonArrayWriter(results_dir / REQUESTS_FILE) as payloads:
+            for offset, request in requests:
+                if first_offset is None:
+                    first_offset = offset
+                offset -= first_offset
+                schedule.write(round(offset, 6))
+                payloads.write(request)
+
+    if schedule.count == 0:
+        raise ValueError("The request schedule is empty")
+    schedule_seconds = duration if duration is not None else max(offset, 1e-3)
+    return {"num_requests": schedule.count, "schedule_seconds": schedule_seconds}
+
+
+def trace_requests(
+    trace_path: Path | str, time_scale: float = 1.0
+) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """
+    Convert trace records into (offset, request) pairs.
+    Inter-arrival gaps are multiplied by `time_scale`.
+    """
+    if time_scale <= 0:
+        raise ValueError(f"Time scale must be positive, got {time_scale}")
+    previous_offset = None
+    for record in iter_trace(trace_path):
+        offset = float(record["timestamp_offset"])
+        if previous_offset is not None and offset < previous_offset:
+            raise ValueError("Trace must be sorted by timestamp_offset")
+        previous_offset = offset
+        request = {"max_tokens": int(record["max_tokens"])}
+        if "messages" in record:
+            request["messages"] = record["messages"]
+        else:
+            request["prompt_len"] = int(record["prompt_len"])
+        yield offset * time_scale, request
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from spec_course.scripts.arrivals import build_arrival_offsets, parse_stages
+
+
+def test_poisson_mean_rate():
+    offsets = build_arrival_offsets("poisson", rate=20, duration=500, seed=0)
+    assert len(offsets) / 500 == pytest.approx(20, rel=0.05)
+    assert np.all(np.diff(offsets) >= 0)
+    assert offsets[-1] < 500
+
+
+def test_poisson_is_seeded():
+    first = build_arrival_offsets("poisson", rate=5, duration=60, seed=1)
+    second = build_arrival_offsets("poisson", rate=5, duration=60, seed=1)
+    np.testing.assert_array_equal(first, second)
+
+
+@pytest.mark.parametrize("cv", [0.5, 1.0, 3.0])
+def test_gamma_rate_and_cv(cv):
+    offsets = build_arrival_offsets("gamma", rate=10, duration=2000, seed=0, cv=cv)
+    gaps = np.diff(offsets)
+    assert len(offsets) / 2000 == pytest.approx(10, rel=0.1)
+    assert gaps.std() / gaps.mean() == pytest.approx(cv, rel=0.1)
+
+
+def test_ramp_follows_stages():
+    stages = parse_stages("20:100s,20:100s")
+    offsets = build_arrival_offsets("ramp", rate=0, duration=0, seed=0, stages=stages)
+    counts, _ = np.histogram(offsets, bins=4, range=(0, 200))
+    # Ramping from 0 to 20 rps over 100s gives a quarter and three quarters of
+    # the 2000 requests of the first stage, then 1000 per half of the plateau
+    assert counts == pytest.approx([250, 750, 1000, 1000], rel=0.15)
+
+
+def test_on_off_is_silent_off_period():
+    offsets = build_arrival_offsets(
+        "on-off", rate=50, duration=100, seed=0, on_seconds=5, off_seconds=15
+    )
+    assert np.all(offsets % 20 < 5)
+    assert len(offsets) / 25 == pytest.approx(50, rel=0.1)
+
+
+@pytest.mark.parametrize(
+    "kwargs, parameter",
+    [
+        ({"process": "poisson", "rate": 0}, "rate"),
+        ({"process": "gamma", "rate": -1}, "rate"),
+        ({"process": "gamma", "cv": 0}, "cv"),
+        ({"process": "poisson", "duration": 0}, "duration"),
+        ({"process": "on-off", "rate": 0, "on_seconds": 1}, "rate"),
+        ({"process": "on-off"}, "on period"),
+        ({"process": "ramp", "stages": [(-1, 10)]}, "rate"),
+        ({"process": "ramp", "stages": [(5, 0)]}, "duration"),
+        ({"process": "ramp", "stages": [(0, 10)]}, "positive rate"),
+        ({"process": "bursty"}, "process"),
+    ],
+)
+def test_invalid_parameters(kwargs, parameter):
+    kwargs = {"rate": 5, "duration": 10, "seed": 0, **kwargs}
+    with pytest.raises(ValueError, match=parameter):
+        build_arrival_offsets(**kwargs)
@@ -0,0 +1,71 @@
+import argparse
+
+import numpy as np
+
+from spec_course.database.check import (
+    SD_GROUP_COLUMNS,
+    SD_METRICS,
+    check_runs,
+    group_runs,
+    setup_name,
+)
+
+ARGS = argparse.Namespace(
+    min_baseline_runs=2, tolerance=0.05, alpha=0.05, bootstrap_samples=2000
+)
+
+
+def sd_run(run_id, run_rank, tokens_per_second, backend="vllm"):
+    return {
+        "sd_performance_id": run_id,
+        "sd_setup_id": 1,
+        "target_model": "target",
+        "target_quantization": "FP16",
+        "draft_model": "draft",
+        "draft_quantization": "FP16",
+        "dataset_type": "chat",
+        "num_spec_tokens": 4,
+        "backend": backend,
+        "sampling": "head",
+        "num_prompts": 100,
+        "run_rank": run_rank,
+        "date": f"2025-01-0{7 - run_rank}",
+        "tokens_per_second": tokens_per_second,
+        "mean_acceptance_length": 3.0,
+    }
+
+
+def check(rows):
+    return check_runs(
+        group_runs(rows, SD_GROUP_COLUMNS),
+        SD_METRICS,
+        "sd_performance_id",
+        {},
+        ARGS,
+        np.random.default_rng(0),
+    )
+
+
+def test_slower_run_is_a_regression():
+    rows = [sd_run(6, 1, 80.0)] + [
+        sd_run(i, 7 - i, value)
+        for i, value in enumerate([100.0, 101.0, 99.0, 100.5, 99.5], 1)
+    ]
+    results = {row["metric"]: row for row in check(rows)}
+    assert results["tokens_per_second"]["regression"]
+    assert not results["mean_acceptance_length"]["regression"]
+
+
+def test_runs_of_another_backend_are_not_a_baseline():
+    # A slower backend starts its own history instead of regressing vLLM runs
+    rows = [sd_run(6, 1, 20.0, backend="hf")] + [
+        sd_run(i, 7 - i, value)
+        for i, value in enumerate([100.0, 101.0, 99.0, 100.5, 99.5], 1)
+    ]
+    assert not any(row["regression"] for row in check(rows))
+
+
+def test_setup_name_of_run_without_draft():
+    run = {**sd_run(1, 1, 100.0), "draft_model": "", "draft_quantization": ""}
+    run["num_spec_tokens"] = 0
+    assert setup_name(run) == "target (FP16) chat vllm 100 prompts (head)"
@@ -0,0 +1,232 @@
+import asyncio
+import json
+
+from spec_course.scripts.balancer import LoadBalancer
+from spec_course.scripts.http_utils import (
+    format_response,
+    http_request,
+    read_http_message,
+)
+from spec_course.scripts.stub_server import StubServer
+
+CHAT_REQUEST = json.dumps(
+    {"messages": [{"role": "user", "content": "hello"}], "max_tokens": 4}
+).encode()
+
+
+def parse(data: bytes, read_to_eof: bool = False):
+    async def _parse():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_http_message(reader, read_to_eof)
+
+    return asyncio.run(_parse())
+
+
+def test_read_content_length_message():
+    message = parse(
+        b"POST /v1/chat/completions HTTP/1.1\r\n"
+        b"Content-Length: 5\r\nConnection: close\r\n\r\nhello"
+    )
+    assert message.method == "POST"
+    assert message.path == "/v1/chat/completions"
+    assert message.body == b"hello"
+    assert not message.keep_alive
+
+
+def test_read_chunked_and_eof_delimited_responses():
+    chunked = parse(
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"3\r\nabc\r\n2;ext=1\r\nde\r\n0\r\n\r\n"
+    )
+    assert chunked.status == 200
+    assert chunked.body == b"abcde"
+    assert parse(b"HTTP/1.1 200 OK\r\n\r\nrest", read_to_eof=True).body == b"rest"
+    assert parse(b"") is None
+
+
+def test_format_response_of_non_standard_status():
+    response = parse(format_response(599, b"{}"))
+    assert response.status == 599
+    assert response.body == b"{}"
+
+
+def test_stub_server_completion():
+    async def _run():
+        stub = StubServer()
+        port = await stub.start()
+        try:
+            return await http_request(
+                "127.0.0.1", port, "POST", "/v1/chat/completions", CHAT_REQUEST
+            )
+        finally:
+            await stub.stop()
+
+    response = asyncio.run(_run())
+    assert response.status == 200
+    assert json.loads(response.body)["usage"]["completion_tokens"] == 4
+
+
+async def start_custom_server(status: int) -> asyncio.AbstractServer:
+    async def handle(reader, writer):
+        await read_http_message(reader)
+        writer.write(format_response(status, b"{}", keep_alive=False))
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_balancer_round_robin_over_stubs():
+    async def _run():
+        stubs = [StubServer(), StubServer()]
+        ports = [await stub.start() for stub in stubs]
+        balancer = LoadBalancer(
+            [f"http://127.0.0.1:{port}" for port in ports], "round_robin"
+        )
+        port = await balancer.start()
+        try:
+            for _ in range(4):
+                response = await http_request(
+                    "127.0.0.1", port, "POST", "/v1/chat/completions", CHAT_REQUEST
+                )
+                assert response.status == 200
+            return balancer.stats(), [stub.num_requests for stub in stubs]
+        finally:
+            await balancer.stop()
+            for stub in stubs:
+                await stub.stop()
+
+    stats, stub_requests = asyncio.run(_run())
+    assert stub_requests == [2, 2]
+    assert [replica["num_requests"] for replica in stats] == [2, 2]
+    assert all(replica["num_errors"] == 0 for replica in stats)
+
+
+def test_balancer_passes_through_errors():
+    async def _run():
+        server = await start_custom_server(599)
+        error_port = server.sockets[0].getsockname()[1]
+        # Nothing listens on the port of the closed server
+        closed = await start_custom_server(200)
+        closed_port = closed.sockets[0].getsockname()[1]
+        closed.close()
+        await closed.wait_closed()
+
+        responses = []
+        for replica_port in [error_port, closed_port]:
+            balancer = LoadBalancer([f"http://127.0.0.1:{replica_port}"])
+            port = await balancer.start()
+            try:
+                responses.append(
+                    await http_request(
+                        "127.0.0.1", port, "POST", "/v1/chat/completions", b"{}"
+                    )
+                )
+            finally:
+                await balancer.stop()
+        server.close()
+        await server.wait_closed()
+        return responses
+
+    non_standard, unavailable = asyncio.run(_run())
+    assert non_standard.status == 599
+    assert unavailable.status == 502
+
+
+def chat_request(max_tokens: int) -> bytes:
+    return json.dumps(
+        {"messages": [{"role": "user", "content": "hello"}], "max_tokens": max_tokens}
+    ).encode()
+
+
+async def post_later(port: int, body: bytes, delay: float):
+    await asyncio.sleep(delay)
+    return await http_request("127.0.0.1", port, "POST", "/v1/chat/completions", body)
+
+
+def test_balancer_least_outstanding_avoids_busy_replica():
+    async def _run():
+        stubs = [StubServer(base_latency=0.5), StubServer()]
+        ports = [await stub.start() for stub in stubs]
+        balancer = LoadBalancer(
+            [f"http://127.0.0.1:{port}" for port in ports], "least_outstanding"
+        )
+        port = await balancer.start()
+        try:
+            # The first request keeps the slow replica busy while the others
+            # arrive one after another
+            slow = asyncio.create_task(post_later(port, CHAT_REQUEST, 0))
+            for _ in range(3):
+                response = await post_later(port, CHAT_REQUEST, 0.05)
+                assert response.status == 200
+            assert (await slow).status == 200
+            return [stub.num_requests for stub in stubs]
+        finally:
+            await balancer.stop()
+            for stub in stubs:
+                await stub.stop()
+
+    assert asyncio.run(_run()) == [1, 3]
+
+
+def test_balancer_token_aware_weighs_request_length_by_speed():
+    async def _run():
+        stubs = [StubServer(token_latency=0.001), StubServer(token_latency=0.01)]
+        ports = [await stub.start() for stub in stubs]
+        balancer = LoadBalancer(
+            [f"http://127.0.0.1:{port}" for port in ports], "token_aware"
+        )
+        # Speeds as learned from previous responses
+        balancer.replicas[0].tokens_per_second = 1000.0
+        balancer.replicas[1].tokens_per_second = 100.0
+        port = await balancer.start()
+        try:
+            # A long request keeps the fast replica busy, a short one is done
+            # sooner on the idle slow replica, but another long one is not
+            first = asyncio.create_task(post_later(port, chat_request(300), 0))
+            short = await post_later(port, chat_request(4), 0.05)
+            second = await post_later(port, chat_request(300), 0)
+            assert all(
+                response.status == 200 for response in [await first, short, second]
+            )
+            return [stub.num_requests for stub in stubs]
+        finally:
+            await balancer.stop()
+            for stub in stubs:
+                await stub.stop()
+
+    assert asyncio.run(_run()) == [2, 1]
+
+
+def test_balancer_rejects_malformed_requests():
+    async def _run():
+        stub = StubServer()
+        stub_port = await stub.start()
+        balancer = LoadBalancer([f"http://127.0.0.1:{stub_port}"])
+        port = await balancer.start()
+        responses = []
+        try:
+            for request in [
+                b"POST /v1/chat/completions HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+                b"POST /v1/chat/completions HTTP/1.1\r\n"
+                b"Transfer-Encoding: chunked\r\n\r\nxyz\r\n",
+            ]:
+                for server_port in [port, stub_port]:
+                    reader, writer = await asyncio.open_connection(
+                        "127.0.0.1", server_port
+                    )
+                    writer.write(request)
+                    await writer.drain()
+                    responses.append(await read_http_message(reader))
+                    writer.close()
+            return responses, stub.num_requests
+        finally:
+            await balancer.stop()
+            await stub.stop()
+
+    responses, stub_requests = asyncio.run(_run())
+    assert [response.status for response in responses] == [400] * 4
+    assert not any(response.keep_alive for response in responses)
+    assert stub_requests == 0
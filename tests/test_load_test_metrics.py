@@ -0,0 +1,41 @@
+from spec_course.database.etl.load_test_metrics import LoadTestETL
+
+SCHEDULED_RUN = {
+    "input_params": {"rps": "1", "num_requests": 30, "schedule_seconds": 100},
+    "folder_name": "trace_2025-01-01_00:00:00",
+}
+
+
+def transform_scheduled(k6_metrics):
+    data = {**SCHEDULED_RUN, "metrics": {"metrics": k6_metrics}}
+    return LoadTestETL("unused.db")._transform(data)
+
+
+def test_scheduled_run_keeps_fractional_rate():
+    transformed = transform_scheduled({"iterations": {"count": 30}})
+    assert transformed["rps"] == 0.3
+    # A completed schedule achieves its own rate, the saturation is unknown
+    assert transformed["is_saturated"] is None
+
+
+def test_scheduled_run_saturation_follows_schedule_lag():
+    on_time = transform_scheduled(
+        {"iterations": {"count": 30}, "schedule_lag": {"p(95)": 50.0}}
+    )
+    late = transform_scheduled(
+        {"iterations": {"count": 30}, "schedule_lag": {"p(95)": 5000.0}}
+    )
+    assert on_time["is_saturated"] is False
+    assert late["is_saturated"] is True
+    assert late["achieved_rps"] == late["rps"]
+
+
+def test_constant_rate_run_with_fractional_rate():
+    data = {
+        "input_params": {"rps": "2.5", "duration": "10s"},
+        "folder_name": "run_2025-01-01_00:00:00",
+        "metrics": {"metrics": {"iterations": {"count": 25}}},
+    }
+    transformed = LoadTestETL("unused.db")._transform(data)
+    assert transformed["rps"] == 2.5
+    assert transformed["is_saturated"] is False
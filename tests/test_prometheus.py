@@ -0,0 +1,116 @@
+import pytest
+
+from spec_course.scripts.prometheus import (
+    interval_metrics,
+    parse_exposition,
+    summarize_run,
+)
+from spec_course.scripts.stub_server import STUB_ACCEPTANCE_RATE, StubServer
+
+
+def stub_sample(
+    num_requests: int,
+    generation_tokens: int,
+    latency_sum: float = 0.0,
+    num_waiting: int = 0,
+) -> str:
+    """Exposition text of a stub server that finished the given requests"""
+    stub = StubServer(base_latency=0.1)
+    stub.num_requests = num_requests + num_waiting
+    stub.num_waiting = num_waiting
+    stub.prompt_tokens = 10 * num_requests
+    stub.generation_tokens = generation_tokens
+    stub.latency_sum = latency_sum
+    stub.queue_time_sum = latency_sum / 2
+    return stub._metrics()
+
+
+def as_v0(text: str) -> str:
+    """Replace the V1 drafts counter by the V0 emitted tokens counter"""
+    samples = parse_exposition(text)
+    emitted = samples["accepted_tokens"] + samples["num_drafts"]
+    lines = [line for line in text.splitlines() if "num_drafts" not in line]
+    lines.append(
+        f'vllm:spec_decode_num_emitted_tokens_total{{model_name="stub"}} {emitted}'
+    )
+    return "\n".join(lines)
+
+
+def test_parse_stub_exposition():
+    samples = parse_exposition(stub_sample(10, 200, latency_sum=5.0, num_waiting=3))
+    assert samples["waiting"] == 3
+    assert samples["running"] == 0
+    assert samples["prompt_tokens"] == 100
+    assert samples["generation_tokens"] == 200
+    # Both finish reasons are summed
+    assert samples["requests"] == 10
+    assert samples["accepted_tokens"] == int(200 * STUB_ACCEPTANCE_RATE)
+    assert samples["e2e_latency_sum"] == 5.0
+    assert samples["e2e_latency_count"] == 10
+    assert samples["ttft_sum"] == pytest.approx(2.5 + 0.1 * 10)
+    # Buckets and metrics without a short name are skipped
+    assert not any("bucket" in name for name in samples)
+    assert "vllm:gpu_cache_usage_perc" not in samples
+
+
+def test_parse_exposition_skips_malformed_samples():
+    samples = parse_exposition(
+        "vllm:prompt_tokens_total\n"
+        "vllm:generation_tokens_total nan-ish\n"
+        "vllm:num_requests_running 2.0 1700000000\n"
+        "python_gc_objects_collected_total 7.0\n"
+    )
+    assert samples == {"running": 2.0}
+
+
+def test_interval_metrics_between_stub_scrapes():
+    previous = parse_exposition(stub_sample(10, 200, latency_sum=5.0))
+    current = parse_exposition(stub_sample(30, 600, latency_sum=25.0, num_waiting=4))
+    metrics = interval_metrics(previous, current, elapsed=2.0)
+    assert metrics["waiting"] == 4
+    assert metrics["requests_per_s"] == 10
+    assert metrics["generation_tokens_per_s"] == 200
+    assert metrics["mean_e2e_latency"] == pytest.approx(1.0)
+    assert metrics["mean_queue_time"] == pytest.approx(0.5)
+    assert metrics["draft_acceptance_rate"] == pytest.approx(STUB_ACCEPTANCE_RATE)
+
+
+def test_interval_metrics_after_restart():
+    previous = parse_exposition(stub_sample(30, 600, latency_sum=30.0))
+    # A restarted server starts its counters from zero again
+    current = parse_exposition(stub_sample(5, 100, latency_sum=10.0))
+    metrics = interval_metrics(previous, current, elapsed=1.0)
+    assert metrics["requests_per_s"] == 5
+    assert metrics["mean_e2e_latency"] == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize("convert", [lambda text: text, as_v0], ids=["v1", "v0"])
+def test_summarize_run(convert):
+    first = [
+        parse_exposition(convert(stub_sample(0, 0))),
+        parse_exposition(convert(stub_sample(10, 100, latency_sum=4.0))),
+    ]
+    last = [
+        parse_exposition(convert(stub_sample(20, 400, latency_sum=8.0))),
+        parse_exposition(convert(stub_sample(30, 500, latency_sum=12.0))),
+    ]
+    gauges = [{"waiting": 2.0, "gpu_cache_usage": 0.5}, {"waiting": 7.0}]
+    summary = summarize_run(first, last, gauges)
+    assert summary["spec_acceptance_rate"] == pytest.approx(STUB_ACCEPTANCE_RATE)
+    assert summary["mean_acceptance_length"] == pytest.approx(1 + STUB_ACCEPTANCE_RATE)
+    # 16s of latency over 40 requests, half of it queued
+    assert summary["mean_queue_time"] == pytest.approx(0.2)
+    assert summary["mean_ttft"] == pytest.approx(0.3)
+    assert summary["mean_tpot"] is None
+    assert summary["max_num_waiting"] == 7.0
+    assert summary["max_gpu_cache_usage"] == 0.5
+
+
+def test_summarize_run_without_spec_decode():
+    text = "\n".join(
+        line for line in stub_sample(10, 100).splitlines() if "spec_decode" not in line
+    )
+    summary = summarize_run([{}], [parse_exposition(text)], [])
+    assert summary["spec_acceptance_rate"] is None
+    assert summary["mean_acceptance_length"] is None
+    assert summary["max_num_waiting"] is None
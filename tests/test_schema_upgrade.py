@@ -0,0 +1,101 @@
+import sqlite3
+
+import numpy as np
+
+from spec_course.database.db import create_database, table_columns
+from spec_course.database.etl.load_test_metrics import LoadTestETL
+from spec_course.database.etl.sd_metrics import SDMetrics
+from spec_course.scripts.synthetic_results import write_load_tests, write_sd_results
+
+# Results tables as created before per-request and timing columns were added
+OLD_SCHEMA = """
+CREATE TABLE models (model_id INTEGER PRIMARY KEY AUTOINCREMENT, model_name STRING);
+CREATE TABLE quantizations (
+    quantization_id INTEGER PRIMARY KEY AUTOINCREMENT, quantization_type STRING
+);
+CREATE TABLE datasets (dataset_id INTEGER PRIMARY KEY AUTOINCREMENT, dataset_type STRING);
+CREATE TABLE sd_setups (
+    sd_setup_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target_model_id INTEGER, target_quantization_id INTEGER,
+    draft_model_id INTEGER, draft_quantization_id INTEGER, dataset_id INTEGER
+);
+CREATE TABLE accuracy (
+    date DATETIME DEFAULT CURRENT_TIMESTAMP, gsm8k_score FLOAT,
+    model_id INTEGER, quantization_id INTEGER
+);
+CREATE TABLE ld_performances (
+    date DATETIME DEFAULT CURRENT_TIMESTAMP, rps INTEGER, end_to_end_latency FLOAT,
+    num_spec_tokens INTEGER, sd_setup_id INTEGER
+);
+CREATE TABLE sd_performances (
+    date DATETIME DEFAULT CURRENT_TIMESTAMP, sd_setup_id INTEGER,
+    mean_acceptance_length FLOAT, time_taken FLOAT,
+    rate_at_1position FLOAT, rate_at_2position FLOAT, rate_at_3position FLOAT,
+    rate_at_4position FLOAT, rate_at_5position FLOAT
+);
+INSERT INTO ld_performances (rps, end_to_end_latency, num_spec_tokens, sd_setup_id)
+VALUES (4, 1200.0, 2, 1), (8, 1500.0, 2, 1);
+INSERT INTO sd_performances (sd_setup_id, mean_acceptance_length, time_taken)
+VALUES (1, 2.5, 30.0);
+"""
+
+
+def create_old_database(db_name: str) -> None:
+    conn = sqlite3.connect(db_name)
+    conn.executescript(OLD_SCHEMA)
+    conn.close()
+
+
+def test_create_database_upgrades_old_schema(tmp_path):
+    db_name = str(tmp_path / "old.db")
+    create_old_database(db_name)
+    create_database(db_name)
+
+    conn = sqlite3.connect(db_name)
+    try:
+        assert "latency_avg" in table_columns(conn, db_name, "ld_performances")
+        assert "num_repetitions" in table_columns(conn, db_name, "sd_performances")
+        assert table_columns(conn, db_name, "ld_request_buckets") is not None
+        # Old rows keep their values and are numbered in insertion order
+        rows = conn.execute(
+            "SELECT ld_performance_id, rps, end_to_end_latency FROM ld_performances"
+        ).fetchall()
+        assert rows == [(1, 4, 1200.0), (2, 8, 1500.0)]
+    finally:
+        conn.close()
+
+    # Upgrading a current database changes nothing
+    create_database(db_name)
+
+
+def test_ingest_into_old_database(tmp_path):
+    db_name = str(tmp_path / "old.db")
+    create_old_database(db_name)
+    create_database(db_name)
+    rng = np.random.default_rng(0)
+
+    load_test_dir = tmp_path / "load_tests"
+    write_load_tests(load_test_dir, 3, rng, duration="10s")
+    etl = LoadTestETL(db_name)
+    for run_dir in sorted(load_test_dir.iterdir()):
+        etl.run(run_dir)
+
+    sd_dir = tmp_path / "sd"
+    write_sd_results(sd_dir, 2, rng, num_prompts=10)
+    etl = SDMetrics(db_name)
+    for file_path in sorted(sd_dir.glob("sd_results_*.json")):
+        etl.run(file_path)
+
+    conn = sqlite3.connect(db_name)
+    try:
+        new_runs = conn.execute(
+            "SELECT COUNT(*) FROM ld_performances WHERE latency_avg IS NOT NULL"
+        ).fetchone()[0]
+        assert new_runs == 3
+        assert conn.execute("SELECT COUNT(*) FROM sd_performances").fetchone() == (3,)
+        # The per-request rows of the run with a draft follow the old run
+        assert conn.execute(
+            "SELECT COUNT(*), MIN(sd_performance_id) FROM sd_request_acceptance"
+        ).fetchone() == (10, 3)
+    finally:
+        conn.close()
@@ -0,0 +1,63 @@
+import sys
+
+from spec_course.scripts.balancer import RoundRobinPolicy, TokenAwarePolicy
+from spec_course.scripts.server_pool import (
+    ServerGroup,
+    ServerPool,
+    ServerProcess,
+    server_key,
+)
+
+
+def test_failing_listener_does_not_stop_log_streaming(tmp_path):
+    command = [sys.executable, "-c", "for i in range(1000): print(f'line {i}')"]
+    server = ServerProcess(command, {}, "http://localhost:0", tmp_path / "server.log")
+    received = []
+
+    def failing_listener(line):
+        raise ValueError("bad line")
+
+    server.listeners.extend([failing_listener, received.append])
+    server.start()
+    server.process.wait()
+    server.log_thread.join(timeout=10)
+
+    assert len(received) == 1000
+    assert server.tail[-1] == "line 999"
+    assert (tmp_path / "server.log").read_text().count("\n") == 1000
+
+
+class FakeServer:
+    def __init__(self, port):
+        self.url = f"http://127.0.0.1:{port}"
+        self.stopped = False
+
+    def is_healthy(self):
+        return True
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_setups_differing_in_policy_reuse_replicas(tmp_path, monkeypatch):
+    launches = []
+
+    def launch(self, vllm_setup, key, name):
+        launches.append(name)
+        return ServerGroup(key, [FakeServer(8001), FakeServer(8002)])
+
+    monkeypatch.setattr(ServerPool, "_launch", launch)
+    setups = [
+        {"server_args": {"model": "m"}, "replicas": 2, "balancer_policy": policy}
+        for policy in ["round_robin", "token_aware"]
+    ]
+    assert server_key(setups[0]) == server_key(setups[1])
+
+    with ServerPool(tmp_path, balancer_port=0) as pool:
+        first = pool.acquire(setups[0], "first")
+        assert isinstance(first.balancer.balancer.policy, RoundRobinPolicy)
+        second = pool.acquire(setups[1], "second")
+        assert second is first
+        assert isinstance(second.balancer.balancer.policy, TokenAwarePolicy)
+    assert launches == ["first"]
+    assert first.balancer is None and all(s.stopped for s in first.servers)
@@ -0,0 +1,144 @@
+import json
+import sqlite3
+
+import numpy as np
+
+from spec_course.database.db import create_database
+from spec_course.database.etl.load_test_metrics import LoadTestETL
+from spec_course.database.etl.raw_records import server_metric_rows
+from spec_course.database.etl.sd_metrics import SDMetrics, request_acceptance_rows
+from spec_course.database.sink import DatabaseSink
+from spec_course.scripts.acceptance import load_acceptance_matrix
+from spec_course.scripts.prometheus import PROMETHEUS_METRICS_FILE
+from spec_course.scripts.run_load_test import (
+    ingest_load_test_results,
+    put_server_metrics,
+)
+from spec_course.scripts.server_logs import SERVER_METRICS_FILE
+from spec_course.scripts.synthetic_results import write_load_tests, write_sd_results
+
+
+def fetch(db_name: str, query: str):
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+
+def test_load_test_rows_are_written_while_running(tmp_path):
+    rng = np.random.default_rng(0)
+    write_load_tests(
+        tmp_path / "runs", 1, rng, "10s", raw_output=True, server_metrics=True
+    )
+    folder = next((tmp_path / "runs").iterdir())
+    with open(folder / "input_params.json") as f:
+        input_params = json.load(f)
+    records = [
+        json.loads(line)
+        for name in [SERVER_METRICS_FILE, PROMETHEUS_METRICS_FILE]
+        for line in open(folder / name)
+    ]
+    streamed_db = str(tmp_path / "streamed.db")
+
+    with DatabaseSink(streamed_db, chunk_size=7) as sink:
+        setup = {
+            "input_params": {
+                key: input_params[key]
+                for key in ["model_name", "draft_model_name", "num_spec_tokens"]
+                + ["prompt_type", "run_id", "rps"]
+            },
+            "folder_name": folder.name,
+        }
+        key = sink.open_record("load_test_metrics", setup)
+        for record in records:
+            put_server_metrics(sink, key, record)
+        sink.flush()
+
+        # The run is open: its server metrics are in, its results not yet
+        assert fetch(
+            streamed_db,
+            "SELECT ld_performance_id, rps, achieved_rps FROM ld_performances",
+        ) == [(1, float(input_params["rps"]), None)]
+        num_rows = sum(len(server_metric_rows(record)) for record in records)
+        assert fetch(
+            streamed_db,
+            "SELECT COUNT(*), MIN(ld_performance_id) FROM ld_server_metrics",
+        ) == [(num_rows, 1)]
+
+        ingest_load_test_results(sink, folder, key)
+
+    file_db = str(tmp_path / "file.db")
+    with DatabaseSink(file_db) as sink:
+        sink.put_file("load_test_metrics", folder)
+    etl_db = str(tmp_path / "etl.db")
+    create_database(etl_db)
+    LoadTestETL(etl_db).run(folder)
+
+    # The completed run is the run ingested from its files
+    for query in [
+        "SELECT * FROM ld_performances",
+        "SELECT * FROM ld_request_buckets ORDER BY bucket_start",
+        "SELECT * FROM ld_server_metrics "
+        "ORDER BY offset_s, replica, source, metric_name",
+    ]:
+        streamed = fetch(streamed_db, query)
+        assert streamed
+        assert streamed == fetch(file_db, query)
+        assert streamed == fetch(etl_db, query)
+
+
+def test_sd_rows_are_written_while_running(tmp_path):
+    rng = np.random.default_rng(1)
+    write_sd_results(tmp_path / "runs", 3, rng, num_prompts=10)
+    results = [
+        (path, json.loads(path.read_text()))
+        for path in sorted((tmp_path / "runs").glob("sd_results_*.json"))
+    ]
+    path, result = next(
+        (path, result) for path, result in results if result["speculative_model"]
+    )
+    matrix = load_acceptance_matrix(
+        tmp_path / "runs" / result["acceptance_counts_file"]
+    )
+    streamed_db = str(tmp_path / "streamed.db")
+
+    with DatabaseSink(streamed_db) as sink:
+        setup = {
+            key: result[key]
+            for key in ["main_model", "speculative_model", "dataset_type"]
+            + ["timestamp", "sampling", "num_prompts"]
+        }
+        key = sink.open_record(
+            "sd_metrics", {**setup, "num_spec_tokens": matrix.shape[1] - 1}
+        )
+        # Acceptance of the first chunk of requests
+        sink.put_rows(
+            key, "sd_request_acceptance", request_acceptance_rows(matrix[:4], range(4))
+        )
+        sink.flush()
+        assert fetch(
+            streamed_db,
+            "SELECT num_spec_tokens, tokens_per_second FROM sd_performances",
+        ) == [(matrix.shape[1] - 1, None)]
+        assert fetch(streamed_db, "SELECT COUNT(*) FROM sd_request_acceptance") == [
+            (4,)
+        ]
+
+        sink.put_rows(
+            key,
+            "sd_request_acceptance",
+            request_acceptance_rows(matrix[4:], range(4, len(matrix))),
+        )
+        sink.put_file("sd_metrics", path, key)
+
+    etl_db = str(tmp_path / "etl.db")
+    create_database(etl_db)
+    SDMetrics(etl_db).run(path)
+    for query in [
+        "SELECT * FROM sd_performances",
+        "SELECT * FROM sd_request_acceptance ORDER BY prompt_index",
+    ]:
+        streamed = fetch(streamed_db, query)
+        assert len(streamed) == (1 if "performances" in query else len(matrix))
+        assert streamed == fetch(etl_db, query)